@@ -0,0 +1,570 @@
+# Importa os para listar, renomear e apagar os segmentos em disco
+import os
+
+# Importa math para arredondar os limites de tempo gravados nos nomes dos segmentos
+import math
+
+# Importa json para persistir a tabela de regras referenciadas pelos segmentos
+import json
+
+# Importa threading para gravar os segmentos em uma thread separada da captura
+import threading
+
+# Importa time para a rotação por tempo, a retenção e o intervalo de gravação
+import time
+
+# Importa NumPy para juntar as colunas lidas do disco e da memória
+import numpy as np
+
+# Importa pyarrow para os segmentos Arrow IPC e a compactação em Parquet
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# Importa as variáveis compartilhadas com o log de pacotes em memória
+from data import log_lock, packet_logs
+
+# Importa o esquema das colunas do log, a busca de IPs e a chave que identifica cada regra
+from logstore import LOG_COLUMNS, LOG_COLUMN_NAMES, LOG_COLUMN_DEFAULTS, ip_range, match_ip_keys
+from regras import rule_key
+
+#############################
+# CONFIGURAÇÃO DO ARQUIVO DE LOGS
+#############################
+
+# Diretório padrão dos segmentos
+ARCHIVE_DIRECTORY = "logs"
+
+# Tamanho máximo de um segmento aberto antes da rotação, em bytes
+SEGMENT_MAX_BYTES = 64 << 20
+
+# Tempo máximo de um segmento aberto antes da rotação, em segundos
+SEGMENT_MAX_SECONDS = 300
+
+# Idade (do pacote mais recente) a partir da qual os segmentos Arrow são compactados em Parquet
+COMPACT_AFTER_SECONDS = 3600
+
+# Tempo de retenção dos segmentos, em segundos (7 dias)
+RETENTION_SECONDS = 7 * 24 * 3600
+
+# Espaço máximo ocupado pelos segmentos em disco, em bytes; os mais antigos são apagados antes
+RETENTION_MAX_BYTES = 10 << 30
+
+# Intervalo, em segundos, entre as gravações dos pacotes novos do log em memória
+ARCHIVE_FLUSH_INTERVAL = 1.0
+
+# Esquema Arrow dos segmentos, igual às colunas do log em memória
+ARCHIVE_SCHEMA = pa.schema([(name, pa.from_numpy_dtype(dtype)) for name, dtype in LOG_COLUMNS])
+
+# Extensões dos segmentos: aberto (sendo gravado), Arrow IPC fechado e Parquet compactado
+OPEN_SUFFIX = ".arrow.open"
+ARROW_SUFFIX = ".arrow"
+PARQUET_SUFFIX = ".parquet"
+
+# Arquivo com a tabela de regras (uma regra em JSON por linha; o índice é a linha)
+RULES_FILE = "rules.jsonl"
+
+#############################
+# SEGMENTOS EM DISCO
+#############################
+
+def _segment_name(first, last, suffix):
+    """
+    Monta o nome de um segmento fechado a partir do intervalo de tempo (inclusivo) dos
+    seus pacotes, arredondado para fora em milissegundos.
+    """
+    return f"segment-{math.floor(first * 1000):015d}-{math.ceil(last * 1000):015d}{suffix}"
+
+def _segment_range(name):
+    """
+    Lê o intervalo de tempo (inclusivo, em segundos) do nome de um segmento fechado.
+    """
+    _, first, last = name.split(".", 1)[0].split("-")
+    return int(first) / 1000, int(last) / 1000
+
+def _conform(table):
+    """
+    Adapta uma tabela lida do disco ao esquema atual: colunas com outro tipo são
+    convertidas e colunas que não existiam quando o segmento foi gravado recebem o
+    valor padrão (ver logstore.LOG_COLUMN_DEFAULTS).
+    """
+    if table.schema.equals(ARCHIVE_SCHEMA):
+        return table
+    arrays = []
+    for (name, dtype), field in zip(LOG_COLUMNS, ARCHIVE_SCHEMA):
+        if name in table.column_names:
+            arrays.append(table[name].cast(field.type))
+        else:
+            arrays.append(pa.array(np.full(table.num_rows, LOG_COLUMN_DEFAULTS.get(name, 0), dtype=dtype)))
+    return pa.Table.from_arrays(arrays, schema=ARCHIVE_SCHEMA)
+
+class LogArchive:
+    """
+    Arquivo persistente dos logs de pacotes em segmentos rotativos no disco.
+
+    Os pacotes são acrescentados como lotes (record batches) a um segmento Arrow IPC
+    aberto, que é fechado ao atingir SEGMENT_MAX_BYTES ou SEGMENT_MAX_SECONDS. O nome
+    de cada segmento fechado guarda o intervalo de tempo dos seus pacotes, o que
+    permite ignorar segmentos fora de uma consulta sem abri-los. Segmentos antigos
+    são compactados em um único arquivo Parquet e apagados ao fim da retenção.
+
+    As consultas mapeiam os segmentos em memória (Arrow IPC e Parquet) em vez de
+    carregá-los, e apenas os pacotes do intervalo pedido são copiados.
+
+    As regras são gravadas uma única vez em RULES_FILE; os segmentos guardam apenas
+    o índice da regra nessa tabela.
+
+    Attributes:
+        directory (str): Diretório dos segmentos.
+        segment_max_bytes (int): Tamanho máximo do segmento aberto.
+        segment_max_seconds (float): Tempo máximo do segmento aberto.
+        compact_after_seconds (float): Idade a partir da qual os segmentos são compactados.
+        retention_seconds (float): Tempo de retenção dos segmentos.
+        retention_max_bytes (int): Espaço máximo ocupado pelos segmentos.
+        rules (list): Tabela de regras referenciadas pelos segmentos (rule_id é o índice).
+    """
+
+    def __init__(self, directory=ARCHIVE_DIRECTORY, segment_max_bytes=SEGMENT_MAX_BYTES,
+                 segment_max_seconds=SEGMENT_MAX_SECONDS, compact_after_seconds=COMPACT_AFTER_SECONDS,
+                 retention_seconds=RETENTION_SECONDS, retention_max_bytes=RETENTION_MAX_BYTES):
+        """
+        Raises:
+            OSError: Se o diretório não puder ser criado ou lido.
+        """
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_seconds = segment_max_seconds
+        self.compact_after_seconds = compact_after_seconds
+        self.retention_seconds = retention_seconds
+        self.retention_max_bytes = retention_max_bytes
+        self.rules = []
+        self._rule_ids = {}
+        self._lock = threading.Lock()
+        self._sink = None
+        self._writer = None
+        self._open_path = None
+        self._opened = None
+        self._first = None
+        self._last = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_rules()
+        self._recover_open_segments()
+
+    #############################
+    # TABELA DE REGRAS
+    #############################
+
+    def _load_rules(self):
+        """
+        Carrega a tabela de regras gravada por execuções anteriores.
+        """
+        path = os.path.join(self.directory, RULES_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    rule = json.loads(line)
+                    self._rule_ids[rule_key(rule)] = len(self.rules)
+                    self.rules.append(rule)
+
+    def _rule_mapping(self, rules):
+        """
+        Traduz uma tabela de regras do log em memória para os índices do arquivo,
+        gravando em RULES_FILE as regras ainda desconhecidas.
+
+        Returns:
+            ndarray: Índices no arquivo, com -1 na última posição (pacotes sem regra).
+        """
+        mapping = []
+        new_rules = []
+        for rule in rules:
+            key = rule_key(rule)
+            index = self._rule_ids.get(key)
+            if index is None:
+                index = self._rule_ids[key] = len(self.rules)
+                self.rules.append(rule)
+                new_rules.append(rule)
+            mapping.append(index)
+        if new_rules:
+            with open(os.path.join(self.directory, RULES_FILE), "a") as f:
+                for rule in new_rules:
+                    f.write(json.dumps(rule, default=str) + "\n")
+        return np.array(mapping + [-1], dtype=np.int32)
+
+    def remap_rules(self, columns, rules):
+        """
+        Traduz a coluna rule_id de colunas do log em memória para os índices do arquivo.
+
+        Args:
+            columns (dict): Colunas do log em memória (ver PacketLogStore.snapshot).
+            rules (list): Tabela de regras do log em memória.
+
+        Returns:
+            dict: As colunas, com rule_id referindo-se a LogArchive.rules.
+        """
+        with self._lock:
+            mapping = self._rule_mapping(rules)
+        columns = dict(columns)
+        columns["rule_id"] = mapping[columns["rule_id"]]
+        return columns
+
+    #############################
+    # GRAVAÇÃO E ROTAÇÃO
+    #############################
+
+    def append(self, columns, rules):
+        """
+        Acrescenta pacotes do log em memória ao segmento aberto, rotacionando-o se necessário.
+
+        Args:
+            columns (dict): Colunas dos pacotes (ver PacketLogStore.snapshot).
+            rules (list): Tabela de regras do log em memória.
+        """
+        count = len(columns["timestamp"])
+        if not count:
+            return
+        with self._lock:
+            mapping = self._rule_mapping(rules)
+            arrays = [
+                pa.array(mapping[columns[name]] if name == "rule_id" else columns[name], type=field.type)
+                for name, field in zip(LOG_COLUMN_NAMES, ARCHIVE_SCHEMA)
+            ]
+            batch = pa.RecordBatch.from_arrays(arrays, schema=ARCHIVE_SCHEMA)
+            if self._writer is None:
+                self._open_segment()
+            self._writer.write_batch(batch)
+            timestamps = columns["timestamp"]
+            first, last = float(timestamps.min()), float(timestamps.max())
+            self._first = first if self._first is None else min(self._first, first)
+            self._last = last if self._last is None else max(self._last, last)
+            if self._sink.tell() >= self.segment_max_bytes:
+                self._close_segment()
+
+    def _open_segment(self):
+        """
+        Abre um novo segmento Arrow IPC (formato de fluxo, legível mesmo se a gravação for interrompida).
+        """
+        self._open_path = os.path.join(self.directory, f"open-{time.time_ns()}{OPEN_SUFFIX}")
+        self._sink = pa.OSFile(self._open_path, "wb")
+        self._writer = pa.ipc.new_stream(self._sink, ARCHIVE_SCHEMA)
+        self._opened = time.monotonic()
+        self._first = self._last = None
+
+    def _close_segment(self):
+        """
+        Fecha o segmento aberto e o renomeia com o intervalo de tempo dos seus pacotes.
+        """
+        self._writer.close()
+        self._sink.close()
+        if self._first is None:
+            os.remove(self._open_path)
+        else:
+            os.replace(self._open_path, os.path.join(self.directory, _segment_name(self._first, self._last, ARROW_SUFFIX)))
+        self._writer = self._sink = self._open_path = None
+        self._first = self._last = None
+
+    def _recover_open_segments(self):
+        """
+        Fecha os segmentos que ficaram abertos quando o processo foi interrompido,
+        mantendo os lotes completos e descartando um último lote truncado.
+        """
+        for name in os.listdir(self.directory):
+            if not name.endswith(OPEN_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            with pa.memory_map(path, "r") as source:
+                batches = []
+                try:
+                    reader = pa.ipc.open_stream(source)
+                    while True:
+                        batches.append(reader.read_next_batch())
+                except (StopIteration, pa.ArrowInvalid):
+                    pass
+                table = _conform(pa.Table.from_batches(batches, schema=batches[0].schema if batches else ARCHIVE_SCHEMA))
+                if table.num_rows:
+                    first, last = (value.as_py() for value in pc.min_max(table["timestamp"]).values())
+                    target = os.path.join(self.directory, _segment_name(first, last, ARROW_SUFFIX))
+                    with pa.OSFile(target, "wb") as sink, pa.ipc.new_stream(sink, ARCHIVE_SCHEMA) as writer:
+                        writer.write_table(table)
+                del table, batches
+            os.remove(path)
+
+    #############################
+    # COMPACTAÇÃO E RETENÇÃO
+    #############################
+
+    def _segments(self):
+        """
+        Lista os segmentos fechados em ordem cronológica.
+
+        Returns:
+            list: Tuplas (first, last, path) com o intervalo de tempo de cada segmento.
+        """
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith("segment-") and name.endswith((ARROW_SUFFIX, PARQUET_SUFFIX)):
+                first, last = _segment_range(name)
+                segments.append((first, last, os.path.join(self.directory, name)))
+        return sorted(segments)
+
+    def maintain(self, now=None):
+        """
+        Rotaciona o segmento aberto se ele passou do tempo máximo, compacta os segmentos
+        antigos em Parquet e aplica a retenção.
+
+        Args:
+            now (float): Instante atual (segundos desde a época Unix). Se None, usa time.time().
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            if self._writer is not None and time.monotonic() - self._opened >= self.segment_max_seconds:
+                self._close_segment()
+            self._apply_retention(now)
+            self._compact(now)
+
+    def _compact(self, now):
+        """
+        Junta os segmentos Arrow mais antigos que compact_after_seconds em arquivos Parquet,
+        um por hora (pela hora do primeiro pacote), para que a retenção continue granular.
+        """
+        hours = {}
+        for segment in self._segments():
+            if segment[2].endswith(ARROW_SUFFIX) and segment[1] < now - self.compact_after_seconds:
+                hours.setdefault(int(segment[0] // 3600), []).append(segment)
+        for old in hours.values():
+            first, last = old[0][0], max(segment[1] for segment in old)
+            target = os.path.join(self.directory, _segment_name(first, last, PARQUET_SUFFIX))
+            temporary = target + ".tmp"
+            # Cada segmento vira um grupo de linhas do Parquet; só um segmento fica na memória por vez
+            with pq.ParquetWriter(temporary, ARCHIVE_SCHEMA, compression="zstd") as writer:
+                for _, _, path in old:
+                    with pa.memory_map(path, "r") as source:
+                        writer.write_table(_conform(pa.ipc.open_stream(source).read_all()))
+            os.replace(temporary, target)
+            for _, _, path in old:
+                os.remove(path)
+
+    def _apply_retention(self, now):
+        """
+        Apaga os segmentos mais antigos que a retenção ou além do espaço máximo em disco.
+        """
+        segments = self._segments()
+        sizes = [os.path.getsize(path) for _, _, path in segments]
+        total = sum(sizes)
+        for (_, last, path), size in zip(segments, sizes):
+            if last >= now - self.retention_seconds and total <= self.retention_max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    #############################
+    # CONSULTA
+    #############################
+
+    def query(self, start=None, end=None):
+        """
+        Lê os pacotes gravados com timestamp no intervalo [start, end).
+
+        Os segmentos fora do intervalo são ignorados pelo nome; os demais são mapeados
+        em memória e filtrados, e só os pacotes selecionados são copiados.
+
+        Args:
+            start (float): Início do intervalo (segundos desde a época Unix). Se None, sem limite.
+            end (float): Fim do intervalo (exclusivo). Se None, sem limite.
+
+        Returns:
+            dict: Colunas de LOG_COLUMNS (rule_id refere-se a LogArchive.rules), em ordem de timestamp.
+        """
+        start = -math.inf if start is None else start
+        end = math.inf if end is None else end
+        parts = []
+        with self._lock:
+            for first, last, path in self._segments():
+                if last < start or first >= end:
+                    continue
+                parts.append(self._read_segment(path, start, end))
+            if self._writer is not None and self._first is not None and self._last >= start and self._first < end:
+                # O segmento aberto só contém lotes completos enquanto o lock está preso
+                parts.append(self._read_segment(self._open_path, start, end))
+        if not parts:
+            return {name: np.empty(0, dtype=dtype) for name, dtype in LOG_COLUMNS}
+        columns = {name: np.concatenate([part[name] for part in parts]) for name in LOG_COLUMN_NAMES}
+        # Os segmentos guardam os lotes na ordem de chegada; ordena apenas a janela lida
+        order = np.argsort(columns["timestamp"], kind="stable")
+        return {name: column[order] for name, column in columns.items()}
+
+    @staticmethod
+    def _read_segment(path, start, end):
+        """
+        Lê de um segmento mapeado em memória as colunas dos pacotes com timestamp em [start, end).
+        """
+        if path.endswith(PARQUET_SUFFIX):
+            # As estatísticas dos grupos de linhas permitem ao Parquet pular os que estão fora do intervalo
+            filters = [("timestamp", ">=", start)] if start > -math.inf else []
+            filters += [("timestamp", "<", end)] if end < math.inf else []
+            table = _conform(pq.read_table(path, memory_map=True, filters=filters or None))
+            return {name: table[name].to_numpy() for name in LOG_COLUMN_NAMES}
+        with pa.memory_map(path, "r") as source:
+            table = _conform(pa.ipc.open_stream(source).read_all())
+            timestamps = table["timestamp"]
+            mask = pc.and_(pc.greater_equal(timestamps, start), pc.less(timestamps, end))
+            # Copia só as linhas selecionadas antes de desfazer o mapeamento
+            return {name: table[name].filter(mask).to_numpy() for name in LOG_COLUMN_NAMES}
+
+    def close(self):
+        """
+        Fecha o segmento aberto.
+        """
+        with self._lock:
+            if self._writer is not None:
+                self._close_segment()
+
+#############################
+# GRAVAÇÃO CONTÍNUA DO LOG EM MEMÓRIA
+#############################
+
+# Arquivo usado pelo processo atual (criado por start_log_archiving)
+log_archive = None
+
+# Lock que garante uma única thread de gravação por processo
+_archive_start_lock = threading.Lock()
+
+def _archive_loop(archive, interval):
+    """
+    Grava periodicamente no arquivo os pacotes novos do log em memória.
+
+    Args:
+        archive (LogArchive): Arquivo de destino.
+        interval (float): Intervalo entre as gravações, em segundos.
+    """
+    while True:
+        time.sleep(interval)
+        with log_lock:
+            columns = packet_logs.take_feed()
+        rules = list(packet_logs.rules)
+        try:
+            archive.append(columns, rules)
+            archive.maintain()
+        except (OSError, pa.ArrowException) as e:
+            print(f"Erro ao gravar o arquivo de logs: {e}")
+
+def start_log_archiving(directory=ARCHIVE_DIRECTORY, interval=ARCHIVE_FLUSH_INTERVAL, **options):
+    """
+    Inicia (uma única vez por processo) a thread que grava o log em memória em disco.
+
+    Args:
+        directory (str): Diretório dos segmentos.
+        interval (float): Intervalo entre as gravações, em segundos.
+        **options: Opções de rotação, compactação e retenção (ver LogArchive).
+
+    Returns:
+        LogArchive: O arquivo em uso, ou None se o diretório não puder ser usado.
+    """
+    global log_archive
+    with _archive_start_lock:
+        if log_archive is None:
+            try:
+                log_archive = LogArchive(directory, **options)
+            except OSError as e:
+                print(f"Erro ao abrir o arquivo de logs: {e}")
+                return None
+            with log_lock:
+                # Os pacotes novos são retirados do fluxo do log, na ordem de chegada
+                packet_logs.enable_feed()
+            threading.Thread(target=_archive_loop, args=(log_archive, interval), daemon=True).start()
+    return log_archive
+
+def query_logs(start=None, end=None):
+    """
+    Consulta os pacotes com timestamp em [start, end) no log em memória e no arquivo em disco.
+
+    Os pacotes anteriores ao mais antigo ainda guardado na memória são lidos do disco;
+    os demais vêm da memória, que também contém os ainda não gravados.
+
+    Args:
+        start (float): Início do intervalo (segundos desde a época Unix). Se None, sem limite.
+        end (float): Fim do intervalo (exclusivo). Se None, sem limite.
+
+    Returns:
+        tuple: Um par (columns, rules), com as colunas de LOG_COLUMNS em ordem de timestamp
+               e a tabela de regras referenciada por rule_id.
+    """
+    # Busca binária no log ordenado, na visão publicada (sem o log_lock): só a janela pedida é copiada
+    view = packet_logs.view()
+    columns = view.query(start, end)
+    oldest = view.oldest()
+    rules = list(packet_logs.rules)
+
+    archive = log_archive
+    if archive is None:
+        return columns, rules
+    # O disco só complementa o intervalo que já saiu da memória
+    disk_end = end if oldest is None else (oldest if end is None else min(end, oldest))
+    if start is not None and disk_end is not None and disk_end <= start:
+        return columns, rules
+    history = archive.query(start, disk_end)
+    columns = archive.remap_rules(columns, rules)
+    merged = {name: np.concatenate((history[name], columns[name])) for name in LOG_COLUMN_NAMES}
+    return merged, list(archive.rules)
+
+def search_logs(start=None, end=None, src_ip=None, dst_ip=None, protocol=None, history=True):
+    """
+    Busca os pacotes de um intervalo de tempo por IP de origem, IP de destino e protocolo.
+
+    Quando o intervalo está todo na memória, a busca usa os índices invertidos do log
+    (ver PacketLogStore.update_indexes) e só as linhas encontradas são copiadas.
+    Intervalos que chegam ao histórico em disco são lidos por query_logs e filtrados
+    coluna a coluna. Em ambos os casos, os IPs são comparados pelos valores distintos
+    (ver logstore.match_ip_keys), não pelo texto de cada pacote.
+
+    Args:
+        start (float): Início do intervalo (segundos desde a época Unix). Se None, sem limite.
+        end (float): Fim do intervalo (exclusivo). Se None, sem limite.
+        src_ip (str): Endereço, prefixo CIDR ou trecho do IP de origem (opcional).
+        dst_ip (str): Endereço, prefixo CIDR ou trecho do IP de destino (opcional).
+        protocol (int): Número do protocolo (opcional).
+        history (bool): Se False, consulta apenas a memória, mesmo sem start.
+
+    Returns:
+        tuple: Um par (columns, rules), como em query_logs.
+    """
+    oldest = packet_logs.oldest()
+    if history and log_archive is not None and (start is None or oldest is None or start < oldest):
+        # Fora da memória não há índice: filtra as colunas lidas pelos valores distintos
+        columns, rules = query_logs(start, end)
+        mask = np.ones(len(columns["timestamp"]), dtype=bool)
+        for name, text in (("src_ip", src_ip), ("dst_ip", dst_ip)):
+            if text:
+                mask &= np.isin(columns[name], match_ip_keys(np.unique(columns[name]), text))
+        if protocol is not None:
+            mask &= columns["protocol"] == protocol
+        return {name: column[mask] for name, column in columns.items()}, rules
+
+    if not src_ip and not dst_ip and protocol is None:
+        return packet_logs.query(start, end), list(packet_logs.rules)
+
+    # Atualiza os índices com as linhas novas; o log_lock só é preso para reservar o trecho
+    packet_logs.update_indexes(log_lock)
+
+    checks = {}
+    candidates = []
+    for name, text in (("src_ip", src_ip), ("dst_ip", dst_ip)):
+        if not text:
+            continue
+        bounds = ip_range(text)
+        if bounds is not None:
+            # Endereço exato ou prefixo: um único trecho contíguo em cada segmento do índice
+            checks[name] = bounds
+            candidates.append(packet_logs.postings_range(name, *bounds))
+        else:
+            # Substring: procurada só entre os IPs distintos do índice
+            checks[name] = match_ip_keys(packet_logs.index_keys(name), text)
+            candidates.append(packet_logs.postings(name, checks[name]))
+    if protocol is not None:
+        checks["protocol"] = np.array([protocol])
+        candidates.append(packet_logs.postings("protocol", checks["protocol"]))
+    # Parte da coluna com menos candidatos; as demais são conferidas em cada posição
+    positions = min(candidates, key=len)
+    return packet_logs.rows_at(positions, checks, start, end), list(packet_logs.rules)
@@ -0,0 +1,374 @@
+# Importa argparse para ler as opções de linha de comando do benchmark
+import argparse
+
+# Importa json para emitir os resultados em formato comparável entre execuções
+import json
+
+# Importa random para gerar regras e tráfego sintéticos reproduzíveis
+import random
+
+# Importa platform e time para registrar o ambiente e medir o tempo
+import platform
+import time
+
+# Importa tracemalloc para medir o pico de memória de cada configuração
+import tracemalloc
+
+# Importa as camadas da Scapy para montar pacotes sintéticos (sem captura)
+from scapy.all import Ether, IP, TCP, UDP, ICMP
+
+# Importa as variáveis compartilhadas para limpar os logs entre as medições
+from data import log_lock, packet_logs, packet_stats, recent_frames, traffic_rollup, heavy_hitters, distinct_counters
+
+# Importa sys para escrever o progresso na saída de erro (a saída padrão recebe o JSON)
+import sys
+
+# Importa redirect_stdout para manter a saída padrão só com o JSON
+from contextlib import redirect_stdout
+
+# Importa o motor de regras e o processamento de pacotes; main carrega o rules.json ao ser
+# importado, e as mensagens dessa carga (ex.: arquivo ausente) vão para a saída de erro
+import regras
+with redirect_stdout(sys.stderr):
+    from main import packet_handler, record_handler, flush_log_batch
+
+# Importa o decodificador de cabeçalhos a partir dos bytes brutos
+from decoder import decode_frame
+
+# Importa o histograma de latência para os percentis por pacote
+from metrics import LatencyHistogram
+
+# Importa as funções para interpretar endereços, prefixos e portas das regras
+from cidr import int_to_ip, parse_cidr
+from ports import parse_ports
+
+#############################
+# CONFIGURAÇÕES DO BENCHMARK
+#############################
+
+# Tamanhos padrão dos conjuntos de regras sintéticos
+DEFAULT_SIZES = (10, 1000, 100000)
+
+# Quantidade padrão de pacotes por medição
+DEFAULT_PACKETS = 20000
+
+# Configurações de motor avaliadas: (nome, motor de regras, tamanho do cache de veredictos)
+ENGINE_CONFIGS = {
+    "indexed": ("indexed", 0),
+    "indexed+cache": ("indexed", regras.DEFAULT_CACHE_SIZE),
+    "codegen": ("codegen", 0),
+    "codegen+cache": ("codegen", regras.DEFAULT_CACHE_SIZE),
+}
+
+# Cenários medidos para cada configuração
+SCENARIOS = ("apply_rules", "dissect+apply_rules", "packet_handler", "decode+apply_rules", "raw_handler")
+
+# Fração dos pacotes gerada a partir de uma regra (e portanto bloqueada)
+MATCHING_FRACTION = 0.3
+
+# Quantidade média de pacotes por fluxo no tráfego sintético
+PACKETS_PER_FLOW = 10
+
+#############################
+# GERAÇÃO DE REGRAS E TRÁFEGO SINTÉTICOS
+#############################
+
+def _random_ip(generator):
+    """
+    Retorna um endereço IPv4 aleatório, com metade dos endereços em redes privadas.
+    """
+    if generator.random() < 0.5:
+        return f"192.168.{generator.randint(0, 255)}.{generator.randint(1, 254)}"
+    return int_to_ip(generator.randint(0x01000000, 0xDFFFFFFF))
+
+def generate_rules(count, seed=0):
+    """
+    Gera um conjunto de regras de bloqueio com uma mistura realista de campos.
+
+    A mistura inclui IPs exatos, prefixos CIDR, protocolo com porta de destino,
+    listas e intervalos de portas e portas de origem.
+
+    Args:
+        count (int): Quantidade de regras.
+        seed (int): Semente do gerador aleatório.
+
+    Returns:
+        list: Lista de regras no formato do rules.json.
+    """
+    generator = random.Random(seed)
+    common_ports = [22, 25, 53, 80, 110, 123, 143, 443, 445, 993, 3306, 3389, 5432, 8080, 8443]
+    rules = []
+    for _ in range(count):
+        rule = {"action": "block"}
+        kind = generator.random()
+        if kind < 0.40:
+            # IP exato de origem ou destino, às vezes com protocolo
+            rule["src_ip" if generator.random() < 0.5 else "dst_ip"] = _random_ip(generator)
+            if generator.random() < 0.5:
+                rule["protocol"] = generator.choice(["tcp", "udp"])
+        elif kind < 0.60:
+            # Prefixo CIDR de origem
+            length = generator.choice([8, 16, 20, 24, 28])
+            rule["src_ip"] = f"{_random_ip(generator)}/{length}"
+        elif kind < 0.85:
+            # Protocolo e porta de destino
+            rule["protocol"] = generator.choice(["tcp", "udp"])
+            rule["dst_port"] = generator.choice(common_ports) if generator.random() < 0.5 else generator.randint(1, 65535)
+            if generator.random() < 0.3:
+                rule["dst_ip"] = _random_ip(generator)
+        elif kind < 0.90:
+            # Lista de portas de destino
+            rule["protocol"] = "tcp"
+            rule["dst_port"] = generator.sample(common_ports, generator.randint(2, 5))
+        elif kind < 0.95:
+            # Intervalo estreito de portas de destino para um host
+            start = generator.randint(1024, 60000)
+            rule["protocol"] = generator.choice(["tcp", "udp"])
+            rule["dst_ip"] = _random_ip(generator)
+            rule["dst_port"] = f"{start}-{start + generator.randint(10, 1000)}"
+        else:
+            # Porta de origem
+            rule["protocol"] = "udp"
+            rule["src_ip"] = _random_ip(generator)
+            rule["src_port"] = generator.randint(1, 65535)
+        rules.append(rule)
+    return rules
+
+def _packet_for_rule(rule, generator):
+    """
+    Monta os campos de um pacote que corresponde a uma regra.
+    """
+    fields = {
+        "src": _random_ip(generator),
+        "dst": _random_ip(generator),
+        "proto": rule.get("protocol", generator.choice(["tcp", "udp"])),
+        "sport": generator.randint(1024, 65535),
+        "dport": generator.choice([80, 443, 53]),
+    }
+    for field, key in (("src_ip", "src"), ("dst_ip", "dst")):
+        if field in rule:
+            network, length = parse_cidr(rule[field])
+            host = generator.randint(0, (1 << (32 - length)) - 1) if length < 32 else 0
+            fields[key] = int_to_ip(network | host)
+    for field, key in (("src_port", "sport"), ("dst_port", "dport")):
+        if field in rule:
+            start, end = generator.choice(parse_ports(rule[field]))
+            fields[key] = generator.randint(start, end)
+    return fields
+
+def generate_traffic(rules, count, seed=0):
+    """
+    Gera tráfego sintético: fluxos repetidos (como conexões TCP longas), parte deles
+    correspondendo a regras do conjunto.
+
+    Args:
+        rules (list): Conjunto de regras.
+        count (int): Quantidade de pacotes.
+        seed (int): Semente do gerador aleatório.
+
+    Returns:
+        tuple: Um par (packets, frames) com os pacotes Scapy já montados e os mesmos
+               pacotes como quadros Ethernet em bytes.
+    """
+    generator = random.Random(seed)
+    flows = []
+    for _ in range(max(1, count // PACKETS_PER_FLOW)):
+        if rules and generator.random() < MATCHING_FRACTION:
+            fields = _packet_for_rule(generator.choice(rules), generator)
+        else:
+            fields = _packet_for_rule({}, generator)
+            if generator.random() < 0.1:
+                fields["proto"] = "icmp"
+        flows.append(fields)
+
+    frames = []
+    for _ in range(count):
+        fields = generator.choice(flows)
+        packet = Ether() / IP(src=fields["src"], dst=fields["dst"])
+        if fields["proto"] == "tcp":
+            packet = packet / TCP(sport=fields["sport"], dport=fields["dport"], flags="A")
+        elif fields["proto"] == "udp":
+            packet = packet / UDP(sport=fields["sport"], dport=fields["dport"])
+        else:
+            packet = packet / ICMP()
+        frames.append(bytes(packet / (b"x" * generator.randint(0, 200))))
+
+    # Os pacotes Scapy são obtidos dissecando os quadros, como na captura real
+    packets = [Ether(frame) for frame in frames]
+    return packets, frames
+
+#############################
+# MEDIÇÕES
+#############################
+
+def _reset_shared_state():
+    """
+    Limpa os logs, séries e estatísticas compartilhados e os contadores do motor de regras.
+    """
+    with log_lock:
+        packet_logs.clear()
+        traffic_rollup.clear()
+        heavy_hitters.clear()
+        distinct_counters.clear()
+        recent_frames.clear()
+        for key in packet_stats:
+            packet_stats[key] = 0
+    regras.reset_rule_stats()
+
+def _run_scenario(scenario, packets, frames):
+    """
+    Executa um cenário sobre todos os pacotes, medindo a latência de cada um.
+
+    Returns:
+        tuple: Um par (elapsed_seconds, histogram).
+    """
+    histogram = LatencyHistogram()
+    clock = time.perf_counter_ns
+    start_total = clock()
+    if scenario == "apply_rules":
+        for packet in packets:
+            start = clock()
+            regras.apply_rules(packet)
+            histogram.record(clock() - start)
+    elif scenario == "dissect+apply_rules":
+        for frame in frames:
+            start = clock()
+            regras.apply_rules(Ether(frame))
+            histogram.record(clock() - start)
+    elif scenario == "packet_handler":
+        for packet in packets:
+            start = clock()
+            packet_handler(packet)
+            histogram.record(clock() - start)
+        # Inclui a gravação do último lote de logs no tempo total
+        flush_log_batch()
+    elif scenario == "decode+apply_rules":
+        for frame in frames:
+            start = clock()
+            record = decode_frame(frame)
+            regras.apply_rules_header(record.header, record.length)
+            histogram.record(clock() - start)
+    elif scenario == "raw_handler":
+        for frame in frames:
+            start = clock()
+            record_handler(decode_frame(frame), frame)
+            histogram.record(clock() - start)
+        flush_log_batch()
+    else:
+        raise ValueError(f"cenário desconhecido: {scenario}")
+    return (clock() - start_total) / 1e9, histogram
+
+def benchmark_ruleset(rules, packets, frames, engine_names, scenarios):
+    """
+    Mede cada configuração de motor e cada cenário para um conjunto de regras.
+
+    Args:
+        rules (list): Conjunto de regras.
+        packets (list): Pacotes Scapy.
+        frames (list): Os mesmos pacotes em bytes.
+        engine_names (list): Nomes das configurações (chaves de ENGINE_CONFIGS).
+        scenarios (list): Cenários a medir (ver SCENARIOS).
+
+    Returns:
+        list: Um dict de resultados por configuração e cenário.
+    """
+    results = []
+    for engine_name in engine_names:
+        engine, cache_size = ENGINE_CONFIGS[engine_name]
+        regras.configure_verdict_cache(cache_size)
+
+        # Troca o motor com um conjunto vazio publicado, para não recompilar as regras anteriores
+        regras.publish_rules([])
+        regras.configure_rule_engine(engine)
+
+        # Mede o tempo e o pico de memória da compilação das regras
+        tracemalloc.start()
+        start = time.perf_counter()
+        ruleset = regras.publish_rules(rules)
+        compile_seconds = time.perf_counter() - start
+        _, compile_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # O plano de avaliação é calculado fora da publicação; mede o motor já reordenado
+        ruleset.optimize()
+
+        for scenario in scenarios:
+            _reset_shared_state()
+            regras.configure_verdict_cache(cache_size)
+
+            # Aquecimento e pico de memória com uma fração dos pacotes
+            sample = max(1, len(packets) // 10)
+            tracemalloc.start()
+            _run_scenario(scenario, packets[:sample], frames[:sample])
+            _, eval_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            _reset_shared_state()
+            regras.configure_verdict_cache(cache_size)
+            elapsed, histogram = _run_scenario(scenario, packets, frames)
+            summary = histogram.summary()
+            results.append({
+                "ruleset_size": len(rules),
+                "engine_config": engine_name,
+                "effective_engine": ruleset.engine,
+                "cache_size": cache_size,
+                "scenario": scenario,
+                "packets": len(packets),
+                "packets_per_second": len(packets) / elapsed if elapsed else None,
+                "p50_us": summary["p50_us"],
+                "p99_us": summary["p99_us"],
+                "max_us": summary["max_us"],
+                "compile_seconds": compile_seconds,
+                "compile_peak_memory_bytes": compile_peak,
+                "eval_peak_memory_bytes": eval_peak,
+                "cache": regras.get_cache_stats(),
+            })
+            print(
+                f"{len(rules):>7} regras | {engine_name:<14} | {scenario:<20} | "
+                f"{results[-1]['packets_per_second']:>10.0f} pps | p50 {summary['p50_us']:.1f} µs | p99 {summary['p99_us']:.1f} µs"
+            , file=sys.stderr, flush=True)
+    return results
+
+#############################
+# EXECUÇÃO
+#############################
+
+def main():
+    """
+    Lê as opções de linha de comando, executa o benchmark e grava os resultados em JSON.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark do motor de regras do firewall")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Tamanhos dos conjuntos de regras")
+    parser.add_argument("--packets", type=int, default=DEFAULT_PACKETS, help="Pacotes por medição")
+    parser.add_argument("--engines", nargs="+", default=list(ENGINE_CONFIGS), choices=list(ENGINE_CONFIGS), help="Configurações de motor")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS), help="Cenários medidos")
+    parser.add_argument("--seed", type=int, default=0, help="Semente do gerador aleatório")
+    parser.add_argument("--output", default="-", help="Arquivo JSON de saída ('-' para a saída padrão)")
+    args = parser.parse_args()
+
+    results = []
+    # Mensagens do motor de regras durante as medições também vão para a saída de erro
+    with redirect_stdout(sys.stderr):
+        for size in args.sizes:
+            rules = generate_rules(size, args.seed)
+            packets, frames = generate_traffic(rules, args.packets, args.seed)
+            results.extend(benchmark_ruleset(rules, packets, frames, args.engines, args.scenarios))
+
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "packets": args.packets,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(output)
+    else:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+if __name__ == "__main__":
+    main()
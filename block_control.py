@@ -7,6 +7,9 @@ from pydantic import BaseModel
 import uvicorn
 import json
 import os
+from itertools import product
+from cidr import format_cidr
+from ports import iptables_port_options
 
 app = FastAPI()
 
@@ -44,34 +47,38 @@ def apply_iptables_blocking():
         if rule.get("action") != "block":
             continue
 
-        cmd_input = ["iptables", "-A", "INPUT"]
-        cmd_output = ["iptables", "-A", "OUTPUT"]
+        match_args = []
 
         if "protocol" in rule:
-            cmd_input.extend(["-p", rule["protocol"]])
-            cmd_output.extend(["-p", rule["protocol"]])
-        if "src_ip" in rule:
-            cmd_input.extend(["-s", rule["src_ip"]])
-            cmd_output.extend(["-s", rule["src_ip"]])
-        if "dst_ip" in rule:
-            cmd_input.extend(["-d", rule["dst_ip"]])
-            cmd_output.extend(["-d", rule["dst_ip"]])
-        if "src_port" in rule:
-            cmd_input.extend(["--sport", str(rule["src_port"])])
-            cmd_output.extend(["--sport", str(rule["src_port"])])
-        if "dst_port" in rule:
-            cmd_input.extend(["--dport", str(rule["dst_port"])])
-            cmd_output.extend(["--dport", str(rule["dst_port"])])
-        cmd_input.extend(["-j", "DROP"])
-        cmd_output.extend(["-j", "DROP"])
-
+            match_args.extend(["-p", rule["protocol"]])
+        # Endereços aceitam notação CIDR (ex.: 10.0.0.0/8), normalizada para o iptables
+        try:
+            if "src_ip" in rule:
+                match_args.extend(["-s", format_cidr(rule["src_ip"])])
+            if "dst_ip" in rule:
+                match_args.extend(["-d", format_cidr(rule["dst_ip"])])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Endereço inválido na regra {rule}: {e}")
+        # Portas aceitam número, intervalo (--dport a:b) ou lista (-m multiport); listas
+        # longas podem gerar mais de uma regra do iptables
         try:
-            subprocess.run(cmd_input, check=True, capture_output=True, text=True)
-            subprocess.run(cmd_output, check=True, capture_output=True, text=True)
-            iptables_commands.append(("INPUT", cmd_input[2:]))
-            iptables_commands.append(("OUTPUT", cmd_output[2:]))
-        except subprocess.CalledProcessError as e:
-            raise HTTPException(status_code=500, detail=f"Erro ao aplicar regra: {e.stderr}")
+            src_port_options = iptables_port_options(rule["src_port"], "src") if "src_port" in rule else [[]]
+            dst_port_options = iptables_port_options(rule["dst_port"], "dst") if "dst_port" in rule else [[]]
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Porta inválida na regra {rule}: {e}")
+
+        for src_port_args, dst_port_args in product(src_port_options, dst_port_options):
+            rule_args = match_args + src_port_args + dst_port_args + ["-j", "DROP"]
+            cmd_input = ["iptables", "-A", "INPUT"] + rule_args
+            cmd_output = ["iptables", "-A", "OUTPUT"] + rule_args
+
+            try:
+                subprocess.run(cmd_input, check=True, capture_output=True, text=True)
+                subprocess.run(cmd_output, check=True, capture_output=True, text=True)
+                iptables_commands.append(("INPUT", cmd_input[2:]))
+                iptables_commands.append(("OUTPUT", cmd_output[2:]))
+            except subprocess.CalledProcessError as e:
+                raise HTTPException(status_code=500, detail=f"Erro ao aplicar regra: {e.stderr}")
 
     return True
 
@@ -0,0 +1,244 @@
+# Importa socket para abrir o socket AF_PACKET da captura
+import socket
+
+# Importa mmap para mapear o anel de recepção do kernel na memória do processo
+import mmap
+
+# Importa select para esperar blocos prontos sem ocupar a CPU
+import select
+
+# Importa struct para ler os descritores de bloco e de pacote do anel
+import struct
+
+#############################
+# CONSTANTES DO KERNEL (linux/if_packet.h)
+#############################
+
+# Nível das opções de socket AF_PACKET
+SOL_PACKET = 263
+
+# Opções de socket usadas
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+PACKET_FANOUT = 18
+
+# Modo de distribuição do grupo de fanout: hash simétrico do fluxo (ida e volta no mesmo socket)
+PACKET_FANOUT_HASH = 0
+
+# Remonta fragmentos IP antes do hash, para que todos caiam no mesmo socket do fluxo
+PACKET_FANOUT_FLAG_DEFRAG = 0x8000
+
+# Versão do anel com blocos de tamanho variável
+TPACKET_V3 = 2
+
+# Estados de um bloco do anel
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+
+# Protocolo ETH_P_ALL: recebe quadros de todos os protocolos
+ETH_P_ALL = 0x0003
+
+# struct tpacket_req3: block_size, block_nr, frame_size, frame_nr, retire_blk_tov, sizeof_priv, feature_req_word
+_TPACKET_REQ3 = struct.Struct("IIIIIII")
+
+# struct tpacket_stats_v3: tp_packets, tp_drops, tp_freeze_q_cnt
+_TPACKET_STATS_V3 = struct.Struct("III")
+
+# struct tpacket_stats (sockets sem anel): tp_packets, tp_drops
+_TPACKET_STATS = struct.Struct("II")
+
+# Campos de struct tpacket_hdr_v1 no início de cada bloco: block_status, num_pkts, offset_to_first_pkt
+_BLOCK_HEADER = struct.Struct("III")
+_BLOCK_HEADER_OFFSET = 8
+
+# Campos de struct tpacket3_hdr no início de cada pacote:
+# tp_next_offset, tp_sec, tp_nsec, tp_snaplen, tp_len, tp_status, tp_mac, tp_net
+_PACKET_HEADER = struct.Struct("IIIIIIHH")
+
+#############################
+# CONFIGURAÇÃO PADRÃO DO ANEL
+#############################
+
+# Tamanho de cada bloco do anel em bytes (múltiplo do tamanho de página)
+RING_BLOCK_SIZE = 1 << 20
+
+# Quantidade de blocos do anel (memória total = RING_BLOCK_SIZE * RING_BLOCK_COUNT)
+RING_BLOCK_COUNT = 64
+
+# Tamanho máximo de um quadro dentro de um bloco
+RING_FRAME_SIZE = 1 << 16
+
+# Tempo máximo, em milissegundos, para o kernel entregar um bloco parcialmente cheio
+RING_BLOCK_TIMEOUT_MS = 100
+
+#############################
+# CONTADORES DO KERNEL
+#############################
+
+def socket_statistics(sock):
+    """
+    Lê os contadores do kernel (PACKET_STATISTICS) de um socket AF_PACKET sem anel.
+
+    O kernel zera os contadores a cada leitura.
+
+    Args:
+        sock (socket): Socket AF_PACKET.
+
+    Returns:
+        tuple: Um par (received, dropped) desde a última leitura.
+    """
+    return _TPACKET_STATS.unpack(sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, _TPACKET_STATS.size))
+
+#############################
+# ANEL DE RECEPÇÃO TPACKET_V3
+#############################
+
+class PacketRing:
+    """
+    Socket AF_PACKET com anel de recepção TPACKET_V3 mapeado em memória.
+
+    O kernel escreve os quadros diretamente em blocos do anel compartilhado; cada
+    despertar entrega um bloco inteiro, cujos quadros são percorridos sem chamadas
+    de sistema nem cópias (os quadros são memoryviews sobre o próprio anel). O bloco
+    é devolvido ao kernel depois que todos os seus quadros foram processados.
+
+    Attributes:
+        block_size (int): Tamanho de cada bloco em bytes.
+        block_count (int): Quantidade de blocos do anel.
+        block_timeout_ms (int): Tempo máximo para o kernel entregar um bloco parcial.
+        received (int): Total de quadros entregues pelo kernel (PACKET_STATISTICS).
+        dropped (int): Total de quadros descartados pelo kernel por falta de espaço no anel.
+        block_frames (int): Quantidade de quadros do bloco percorrido por read_block.
+    """
+
+    def __init__(self, interface=None, block_size=RING_BLOCK_SIZE, block_count=RING_BLOCK_COUNT,
+                 block_timeout_ms=RING_BLOCK_TIMEOUT_MS, frame_size=RING_FRAME_SIZE, fanout_group=None):
+        """
+        Args:
+            interface (str): Interface de rede a ser capturada. Se None, captura todas.
+            block_size (int): Tamanho de cada bloco (múltiplo do tamanho de página e de frame_size).
+            block_count (int): Quantidade de blocos do anel.
+            block_timeout_ms (int): Tempo máximo para o kernel entregar um bloco parcial.
+            frame_size (int): Tamanho máximo de um quadro.
+            fanout_group (int): Identificador (0 a 65535) de um grupo PACKET_FANOUT. Sockets do
+                                mesmo grupo dividem o tráfego por hash do fluxo, de modo que
+                                cada fluxo é sempre entregue ao mesmo socket. Se None, não usa fanout.
+
+        Raises:
+            ValueError: Se os tamanhos do anel forem inválidos.
+            OSError: Se o socket ou o anel não puderem ser criados (ex.: sem permissão).
+        """
+        if block_size % mmap.PAGESIZE or block_size % frame_size or block_count < 1:
+            raise ValueError(
+                f"tamanho de bloco inválido: {block_size} (deve ser múltiplo de {mmap.PAGESIZE} e de {frame_size})"
+            )
+        self.block_size = block_size
+        self.block_count = block_count
+        self.block_timeout_ms = block_timeout_ms
+        self.received = 0
+        self.dropped = 0
+        self.block_frames = 0
+
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        try:
+            self.sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+            frame_count = block_size // frame_size * block_count
+            request = _TPACKET_REQ3.pack(block_size, block_count, frame_size, frame_count, block_timeout_ms, 0, 0)
+            self.sock.setsockopt(SOL_PACKET, PACKET_RX_RING, request)
+            if interface is not None:
+                self.sock.bind((interface, ETH_P_ALL))
+            if fanout_group is not None:
+                fanout = (fanout_group & 0xFFFF) | ((PACKET_FANOUT_HASH | PACKET_FANOUT_FLAG_DEFRAG) << 16)
+                self.sock.setsockopt(SOL_PACKET, PACKET_FANOUT, struct.pack("I", fanout))
+            self.ring = mmap.mmap(self.sock.fileno(), block_size * block_count, mmap.MAP_SHARED,
+                                  mmap.PROT_READ | mmap.PROT_WRITE)
+        except OSError:
+            self.sock.close()
+            raise
+        self.view = memoryview(self.ring)
+        self.poller = select.poll()
+        self.poller.register(self.sock.fileno(), select.POLLIN | select.POLLERR)
+        self.next_block = 0
+
+    def wait(self, timeout_ms=None):
+        """
+        Espera até que o próximo bloco do anel esteja pronto para leitura.
+
+        Args:
+            timeout_ms (int): Tempo máximo de espera. Se None, usa o block_timeout_ms do anel.
+
+        Returns:
+            bool: True se o próximo bloco estiver pronto.
+        """
+        if self._block_ready(self.next_block):
+            return True
+        self.poller.poll(self.block_timeout_ms if timeout_ms is None else timeout_ms)
+        return self._block_ready(self.next_block)
+
+    def _block_ready(self, block):
+        """
+        Indica se um bloco foi entregue pelo kernel ao processo.
+        """
+        offset = block * self.block_size + _BLOCK_HEADER_OFFSET
+        return _BLOCK_HEADER.unpack_from(self.ring, offset)[0] & TP_STATUS_USER
+
+    def read_block(self):
+        """
+        Percorre os quadros do próximo bloco pronto e o devolve ao kernel em seguida.
+
+        Os memoryviews produzidos apontam para o anel e são liberados quando o próximo
+        quadro é pedido; quem precisar guardar um quadro deve copiá-lo (bytes(frame)).
+
+        Yields:
+            tuple: Pares (timestamp, frame), com o timestamp de captura do kernel
+                   (segundos desde a época Unix) e o quadro como memoryview.
+        """
+        block = self.next_block
+        base = block * self.block_size
+        if not self._block_ready(block):
+            return
+        _, packet_count, offset = _BLOCK_HEADER.unpack_from(self.ring, base + _BLOCK_HEADER_OFFSET)
+        self.block_frames = packet_count
+        view = self.view
+        try:
+            position = base + offset
+            for _ in range(packet_count):
+                next_offset, sec, nsec, snaplen, _, _, mac, _ = _PACKET_HEADER.unpack_from(self.ring, position)
+                start = position + mac
+                frame = view[start:start + snaplen]
+                try:
+                    yield sec + nsec * 1e-9, frame
+                finally:
+                    # Invalida o quadro para que o anel possa ser fechado depois
+                    frame.release()
+                position += next_offset
+        finally:
+            # Devolve o bloco ao kernel, mesmo se o processamento for interrompido
+            struct.pack_into("I", self.ring, base + _BLOCK_HEADER_OFFSET, TP_STATUS_KERNEL)
+            self.next_block = (block + 1) % self.block_count
+
+    def update_statistics(self):
+        """
+        Lê os contadores do kernel (PACKET_STATISTICS) e os acumula no anel.
+
+        O kernel zera os contadores a cada leitura, então o valor retornado é o que
+        mudou desde a leitura anterior.
+
+        Returns:
+            tuple: Um par (received, dropped) com os quadros recebidos e descartados desde a última leitura.
+        """
+        packets, drops, _ = _TPACKET_STATS_V3.unpack(
+            self.sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, _TPACKET_STATS_V3.size)
+        )
+        self.received += packets
+        self.dropped += drops
+        return packets, drops
+
+    def close(self):
+        """
+        Libera o mapeamento do anel e fecha o socket.
+        """
+        self.view.release()
+        self.ring.close()
+        self.sock.close()
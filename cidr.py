@@ -0,0 +1,150 @@
+# Importa ipaddress para validar e normalizar endereços e prefixos CIDR
+import ipaddress
+
+# Importa socket para converter endereços IPv4 em inteiros rapidamente
+import socket
+
+#############################
+# CONVERSÃO DE ENDEREÇOS
+#############################
+
+# Máscaras de rede pré-calculadas para cada tamanho de prefixo (0 a 32)
+PREFIX_MASKS = tuple((0xFFFFFFFF << (32 - length)) & 0xFFFFFFFF for length in range(33))
+
+def ip_to_int(address):
+    """
+    Converte um endereço IPv4 em notação decimal (ex.: "192.168.0.1") para um inteiro de 32 bits.
+
+    Args:
+        address (str): Endereço IPv4.
+
+    Returns:
+        int: O endereço como inteiro sem sinal.
+
+    Raises:
+        OSError: Se o endereço não for um IPv4 válido.
+    """
+    return int.from_bytes(socket.inet_aton(address), "big")
+
+def int_to_ip(value):
+    """
+    Converte um inteiro de 32 bits para um endereço IPv4 em notação decimal.
+
+    Args:
+        value (int): O endereço como inteiro sem sinal.
+
+    Returns:
+        str: Endereço IPv4 (ex.: "192.168.0.1").
+    """
+    return socket.inet_ntoa(value.to_bytes(4, "big"))
+
+def parse_cidr(value):
+    """
+    Interpreta um endereço IPv4 ou prefixo CIDR (ex.: "10.0.0.0/8").
+
+    Um endereço sem "/" equivale a um prefixo /32. Bits de host além do prefixo
+    são descartados (ex.: "10.1.2.3/16" equivale a "10.1.0.0/16"), como faz o iptables.
+
+    Args:
+        value (str): Endereço ou prefixo CIDR.
+
+    Returns:
+        tuple: Um par (network, length) com a rede como inteiro e o tamanho do prefixo.
+
+    Raises:
+        ValueError: Se o valor não for um endereço ou prefixo IPv4 válido.
+    """
+    network = ipaddress.IPv4Network(str(value).strip(), strict=False)
+    return int(network.network_address), network.prefixlen
+
+def format_cidr(value):
+    """
+    Normaliza um endereço ou prefixo CIDR para a notação aceita pelo iptables.
+
+    Args:
+        value (str): Endereço ou prefixo CIDR.
+
+    Returns:
+        str: O endereço (para prefixos /32) ou a rede normalizada (ex.: "10.1.0.0/16").
+
+    Raises:
+        ValueError: Se o valor não for um endereço ou prefixo IPv4 válido.
+    """
+    network, length = parse_cidr(value)
+    if length == 32:
+        return int_to_ip(network)
+    return f"{int_to_ip(network)}/{length}"
+
+#############################
+# ÁRVORE DE PREFIXOS (TRIE)
+#############################
+
+class PrefixTrie:
+    """
+    Árvore binária de prefixos sobre endereços IPv4 inteiros.
+
+    Cada nó é uma lista [filho_0, filho_1, terminal], onde terminal indica que um
+    prefixo termina naquele nó. Uma consulta percorre no máximo 32 bits do endereço,
+    independentemente da quantidade de prefixos inseridos.
+    """
+
+    def __init__(self):
+        self.root = [None, None, False]
+        self.size = 0
+
+    def insert(self, network, length):
+        """
+        Insere um prefixo na árvore.
+
+        Args:
+            network (int): Endereço de rede como inteiro.
+            length (int): Tamanho do prefixo (0 a 32).
+        """
+        node = self.root
+        for bit_index in range(length):
+            bit = (network >> (31 - bit_index)) & 1
+            child = node[bit]
+            if child is None:
+                child = node[bit] = [None, None, False]
+            node = child
+        if not node[2]:
+            node[2] = True
+            self.size += 1
+
+    def lookup(self, address):
+        """
+        Retorna todos os prefixos inseridos que contêm o endereço.
+
+        Args:
+            address (int): Endereço IPv4 como inteiro.
+
+        Returns:
+            dict: Mapeia o tamanho de cada prefixo correspondente para o endereço de rede.
+        """
+        matches = {}
+        node = self.root
+        length = 0
+        while node is not None:
+            if node[2]:
+                matches[length] = address & PREFIX_MASKS[length]
+            if length == 32:
+                break
+            node = node[(address >> (31 - length)) & 1]
+            length += 1
+        return matches
+
+    def longest_match(self, address):
+        """
+        Retorna o prefixo mais longo que contém o endereço.
+
+        Args:
+            address (int): Endereço IPv4 como inteiro.
+
+        Returns:
+            tuple: Um par (network, length), ou None se nenhum prefixo corresponder.
+        """
+        matches = self.lookup(address)
+        if not matches:
+            return None
+        length = max(matches)
+        return matches[length], length
@@ -1,22 +1,63 @@
 # Importa a biblioteca threading para gerenciar sincronização entre threads
 import threading
 
-# Cria um lock (trava) para garantir que apenas uma thread acesse os logs por vez
+# Importa deque para guardar os quadros brutos mais recentes com tamanho limitado
+from collections import deque
+
+# Importa o log de pacotes em colunas com capacidade fixa
+from logstore import DEFAULT_LOG_CAPACITY, PacketLogStore
+
+# Importa as séries agregadas de tráfego usadas pelos gráficos do dashboard
+from rollup import TrafficRollup
+
+# Importa os sketches dos maiores emissores e destinos e dos valores distintos, consultados pelo dashboard
+from sketches import DistinctCounters, HeavyHitters
+
+# Cria um lock (trava) para garantir que apenas uma thread grave nos logs por vez
+# (as leituras do log de pacotes usam a sua visão publicada, sem o lock)
 log_lock = threading.Lock()
 
-# Lista compartilhada para armazenar os logs dos pacotes capturados
-packet_logs = []
+# Quantidade máxima de pacotes mantidos no log; os mais antigos são descartados
+PACKET_LOG_CAPACITY = DEFAULT_LOG_CAPACITY
+
+# Log compartilhado dos pacotes capturados, em colunas tipadas com capacidade fixa
+packet_logs = PacketLogStore(PACKET_LOG_CAPACITY)
+
+# Contadores de pacotes e bytes por intervalo de tempo (1 s, 10 s, 1 min e 1 h), por
+# direção, protocolo, ação e regra, atualizados a cada lote gravado no log
+traffic_rollup = TrafficRollup()
+
+# IPs de origem, IPs de destino, portas de destino e origens bloqueadas mais frequentes,
+# em janelas deslizantes de até 1 h, com memória fixa (ver sketches.HeavyHitters)
+heavy_hitters = HeavyHitters()
+
+# Quantidade de IPs de origem, IPs de destino e portas de destino distintos por minuto e
+# direção, em contadores HyperLogLog de tamanho fixo (ver sketches.DistinctCounters)
+distinct_counters = DistinctCounters()
+
+# Quantidade de quadros brutos mantidos para a visualização detalhada sob demanda
+RECENT_FRAMES_LIMIT = 1000
+
+# Quadros brutos mais recentes da captura rápida, como tuplas (timestamp, linktype, bytes);
+# só são dissecados pela Scapy quando o usuário pede os detalhes de um pacote
+recent_frames = deque(maxlen=RECENT_FRAMES_LIMIT)
 
 # Variáveis compartilhadas para rastrear pacotes enviados, recebidos e perdidos
 packet_stats = {
     "sent": 0,  # Total de pacotes enviados
     "received": 0,  # Total de pacotes recebidos
-    "lost": 0  # Total de pacotes perdidos
+    "lost": 0,  # Total de pacotes perdidos (soma das perdas de todas as etapas)
+    "lost_kernel": 0,  # Pacotes descartados pelo kernel na captura
+    "lost_queue": 0  # Pacotes descartados pela fila entre a captura e a avaliação
 }
 """
 packet_stats:
     - Um dicionário que armazena estatísticas sobre os pacotes capturados.
     - "sent": Total de pacotes enviados pela rede local.
     - "received": Total de pacotes recebidos pela rede local.
-    - "lost": Total de pacotes perdidos (enviados sem resposta).
-"""
\ No newline at end of file
+    - "lost": Total de pacotes perdidos em qualquer etapa ("lost_kernel" + "lost_queue").
+    - "lost_kernel": Pacotes descartados pelo kernel por falta de espaço no anel de captura
+      ou no buffer do socket (PACKET_STATISTICS; contados nos modos de captura "ring" e "raw").
+    - "lost_queue": Pacotes descartados pela política de transbordo da fila de avaliação
+      (ver pipeline.PacketQueue).
+"""
@@ -0,0 +1,128 @@
+# Importa struct para ler os cabeçalhos diretamente dos bytes do quadro
+import struct
+
+# Importa namedtuple para o registro compacto de cada pacote decodificado
+from collections import namedtuple
+
+#############################
+# REGISTRO COMPACTO DE PACOTE
+#############################
+
+# Registro produzido pelo decodificador, sem dissecar o pacote com a Scapy:
+# - header: (src_ip, dst_ip, protocol, src_port, dst_port), no formato de regras.HEADER_FIELDS
+#   (IPs como inteiros; portas None se o pacote não for TCP/UDP)
+# - length: tamanho do pacote IP em bytes (campo "total length")
+# - tcp_flags: flags TCP como inteiro (None se o pacote não for TCP)
+PacketRecord = namedtuple("PacketRecord", ["header", "length", "tcp_flags"])
+
+#############################
+# CONSTANTES DOS CABEÇALHOS
+#############################
+
+# Tipos de enlace (linktype da libpcap) suportados
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_LINUX_SLL2 = 276
+
+# EtherTypes relevantes
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = (0x8100, 0x88A8, 0x9100)
+
+# Números de protocolo com portas
+PROTO_TCP = 6
+PROTO_UDP = 17
+
+# Formatos struct dos cabeçalhos (ordem de bytes da rede)
+_ETHERTYPE = struct.Struct("!H")
+_IPV4 = struct.Struct("!BBHHHBBHII")
+_PORTS = struct.Struct("!HH")
+
+#############################
+# DECODIFICAÇÃO
+#############################
+
+def _ip_offset(frame, linktype):
+    """
+    Retorna a posição do cabeçalho IPv4 no quadro, ou None se o quadro não for IPv4.
+    """
+    if linktype == LINKTYPE_ETHERNET:
+        offset = 12
+        if len(frame) < offset + 2:
+            return None
+        (ethertype,) = _ETHERTYPE.unpack_from(frame, offset)
+        # Pula etiquetas VLAN (802.1Q/802.1ad), inclusive empilhadas
+        while ethertype in ETHERTYPE_VLAN:
+            offset += 4
+            if len(frame) < offset + 2:
+                return None
+            (ethertype,) = _ETHERTYPE.unpack_from(frame, offset)
+        return offset + 2 if ethertype == ETHERTYPE_IPV4 else None
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4):
+        return 0
+    if linktype == LINKTYPE_LINUX_SLL:
+        if len(frame) < 16:
+            return None
+        return 16 if _ETHERTYPE.unpack_from(frame, 14)[0] == ETHERTYPE_IPV4 else None
+    if linktype == LINKTYPE_LINUX_SLL2:
+        if len(frame) < 20:
+            return None
+        return 20 if _ETHERTYPE.unpack_from(frame, 0)[0] == ETHERTYPE_IPV4 else None
+    return None
+
+def decode_frame(frame, linktype=LINKTYPE_ETHERNET):
+    """
+    Extrai a 5-tupla, o tamanho e as flags TCP de um quadro, lendo os bytes com struct.
+
+    Apenas os campos usados pelas regras e pelos logs são lidos; o pacote não é
+    dissecado em camadas. Fragmentos IP que não são o primeiro não têm cabeçalho
+    de transporte, então suas portas ficam None.
+
+    Args:
+        frame: Quadro como bytes, bytearray ou memoryview (não é copiado).
+        linktype (int): Tipo de enlace do quadro (ex.: LINKTYPE_ETHERNET).
+
+    Returns:
+        PacketRecord: O registro do pacote, ou None se o quadro não for IPv4 ou estiver truncado.
+    """
+    offset = _ip_offset(frame, linktype)
+    if offset is None or len(frame) < offset + 20:
+        return None
+
+    version_ihl, _, total_length, _, fragment, _, proto, _, src_ip, dst_ip = _IPV4.unpack_from(frame, offset)
+    if version_ihl >> 4 != 4:
+        return None
+
+    src_port = dst_port = tcp_flags = None
+    transport = offset + (version_ihl & 0x0F) * 4
+    # Só o primeiro fragmento (offset 0) contém o cabeçalho de transporte
+    if fragment & 0x1FFF == 0 and proto in (PROTO_TCP, PROTO_UDP) and len(frame) >= transport + 4:
+        src_port, dst_port = _PORTS.unpack_from(frame, transport)
+        if proto == PROTO_TCP and len(frame) > transport + 13:
+            tcp_flags = frame[transport + 13]
+
+    return PacketRecord((src_ip, dst_ip, proto, src_port, dst_port), total_length, tcp_flags)
+
+def dissect_frame(frame, linktype=LINKTYPE_ETHERNET):
+    """
+    Disseca um quadro com a Scapy, para a visualização detalhada sob demanda.
+
+    Args:
+        frame (bytes): Quadro capturado.
+        linktype (int): Tipo de enlace do quadro.
+
+    Returns:
+        Packet: O pacote dissecado pela Scapy.
+    """
+    # A Scapy só é importada quando um detalhe é pedido
+    from scapy.all import Ether, IP
+    from scapy.layers.l2 import CookedLinux, CookedLinuxV2
+
+    if linktype == LINKTYPE_ETHERNET:
+        return Ether(bytes(frame))
+    if linktype == LINKTYPE_LINUX_SLL:
+        return CookedLinux(bytes(frame))
+    if linktype == LINKTYPE_LINUX_SLL2:
+        return CookedLinuxV2(bytes(frame))
+    return IP(bytes(frame))
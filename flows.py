@@ -0,0 +1,199 @@
+# Importa math para o relógio ainda não iniciado (-inf)
+import math
+
+# Importa as posições das colunas nas linhas de log, usadas para ler e montar os registros
+from logstore import LOG_COLUMN_NAMES
+
+#############################
+# CONFIGURAÇÃO DOS FLUXOS
+#############################
+
+# Tempo, em segundos, sem pacotes depois do qual um fluxo é encerrado e gravado
+DEFAULT_FLOW_IDLE_TIMEOUT = 15.0
+
+# Duração máxima, em segundos, de um fluxo ativo antes de ser gravado (os pacotes
+# seguintes abrem um novo registro), para que fluxos longos apareçam no dashboard
+DEFAULT_FLOW_ACTIVE_TIMEOUT = 60.0
+
+# Duração de cada posição da roda de temporizadores, em segundos
+FLOW_WHEEL_TICK = 1.0
+
+# Quantidade de posições da roda; prazos além de uma volta são reagendados ao passar
+FLOW_WHEEL_SLOTS = 64
+
+# Maior contagem de bytes de um registro (coluna "length" do log); ao passar dela, o fluxo é gravado
+FLOW_MAX_BYTES = 0xFFFFFFFF
+
+# Posições dos campos nas linhas de log (ver logstore.LOG_COLUMNS)
+_TIMESTAMP, _SRC_IP, _DST_IP, _SRC_PORT, _DST_PORT, _PROTOCOL, _LENGTH, _TCP_FLAGS, _ACTION, _DIRECTION, _RULE_ID = (
+    LOG_COLUMN_NAMES.index(name) for name in (
+        "timestamp", "src_ip", "dst_ip", "src_port", "dst_port", "protocol",
+        "length", "tcp_flags", "action", "direction", "rule_id",
+    )
+)
+
+# Campos de um fluxo em aberto (listas, atualizadas no lugar a cada pacote)
+_FIRST, _LAST, _PACKETS, _BYTES, _FLAGS, _ACTION_CODE, _DIRECTION_CODE, _RULE = range(8)
+
+#############################
+# TABELA DE FLUXOS
+#############################
+
+class FlowTable:
+    """
+    Tabela de fluxos no estilo NetFlow: junta os pacotes de cada 5-tupla (IPs, portas
+    e protocolo, em um sentido) em um único registro, com primeiro e último instante,
+    pacotes, bytes, veredicto, regra e a união das flags TCP vistas.
+
+    Os fluxos são encerrados por inatividade (idle_timeout) ou por duração
+    (active_timeout), e também quando o veredicto ou a regra do pacote mudam (ex.: após
+    uma nova publicação de regras). Os prazos ficam em uma roda de temporizadores:
+    cada fluxo é agendado na posição do seu prazo quando é criado, e ao passar por essa
+    posição o prazo é recalculado a partir do último pacote; um fluxo ainda ativo é
+    reagendado em vez de encerrado. Assim, um pacote de um fluxo existente só atualiza
+    contadores, e o avanço do relógio percorre apenas as posições vencidas.
+
+    O relógio é o timestamp dos pacotes (capturas reproduzidas usam o tempo do arquivo),
+    avançado também por advance quando não há tráfego.
+
+    Attributes:
+        idle_timeout (float): Tempo sem pacotes que encerra um fluxo, em segundos.
+        active_timeout (float): Duração máxima de um registro, em segundos.
+        flows (dict): Fluxos em aberto, por 5-tupla (src_ip, dst_ip, src_port, dst_port, protocol)
+                      -> [first, last, packets, bytes, flags, action, direction, rule_id].
+        wheel (list): Para cada posição da roda, os pares (chave, fluxo) agendados nela.
+        tick (int): Última posição da roda já processada (em unidades de FLOW_WHEEL_TICK).
+        expired (int): Total de fluxos encerrados.
+    """
+
+    def __init__(self, idle_timeout=DEFAULT_FLOW_IDLE_TIMEOUT, active_timeout=DEFAULT_FLOW_ACTIVE_TIMEOUT,
+                 tick=FLOW_WHEEL_TICK, slots=FLOW_WHEEL_SLOTS):
+        """
+        Args:
+            idle_timeout (float): Tempo sem pacotes que encerra um fluxo, em segundos.
+            active_timeout (float): Duração máxima de um registro, em segundos.
+            tick (float): Duração de cada posição da roda, em segundos.
+            slots (int): Quantidade de posições da roda.
+
+        Raises:
+            ValueError: Se algum dos valores for inválido.
+        """
+        if idle_timeout <= 0 or active_timeout <= 0 or tick <= 0 or slots < 1:
+            raise ValueError(
+                f"configuração de fluxos inválida: idle {idle_timeout} s, active {active_timeout} s, "
+                f"tick {tick} s, {slots} posições"
+            )
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.tick_seconds = tick
+        self.wheel = [[] for _ in range(slots)]
+        self.flows = {}
+        self.tick = None
+        self.expired = 0
+        # Instante em que a próxima posição da roda vence (o primeiro pacote inicia o relógio)
+        self._next_tick = -math.inf
+
+    def __len__(self):
+        return len(self.flows)
+
+    def add(self, row):
+        """
+        Soma um pacote ao seu fluxo, abrindo um novo se necessário, e avança o relógio.
+
+        Args:
+            row (tuple): Linha de log do pacote, na ordem de logstore.LOG_COLUMN_NAMES.
+
+        Returns:
+            sequence: Linhas de log dos fluxos encerrados por este pacote (em geral, uma tupla vazia).
+        """
+        timestamp = row[_TIMESTAMP]
+        expired = self.advance(timestamp) if timestamp >= self._next_tick else ()
+        key = row[_SRC_IP:_PROTOCOL + 1]
+        flow = self.flows.get(key)
+        length = row[_LENGTH]
+        # O prazo exato é conferido a cada pacote; a roda, com resolução de um tick, só
+        # encerra os fluxos que não recebem mais pacotes
+        if (flow is not None and flow[_ACTION_CODE] == row[_ACTION] and flow[_RULE] == row[_RULE_ID]
+                and flow[_BYTES] + length <= FLOW_MAX_BYTES
+                and timestamp - flow[_LAST] < self.idle_timeout and timestamp - flow[_FIRST] < self.active_timeout):
+            if timestamp > flow[_LAST]:
+                flow[_LAST] = timestamp
+            flow[_PACKETS] += 1
+            flow[_BYTES] += length
+            flow[_FLAGS] |= row[_TCP_FLAGS]
+            return expired
+
+        # Veredicto ou regra diferentes, prazo vencido ou contador de bytes cheio: encerra o registro anterior
+        if flow is not None:
+            expired = [*expired, self._expire(key)]
+        flow = self.flows[key] = [
+            timestamp, timestamp, 1, length, row[_TCP_FLAGS], row[_ACTION], row[_DIRECTION], row[_RULE_ID],
+        ]
+        self._schedule(key, flow, timestamp + min(self.idle_timeout, self.active_timeout))
+        return expired
+
+    def _schedule(self, key, flow, deadline):
+        """
+        Agenda um fluxo na posição da roda do seu prazo (ou na última posição da volta atual).
+        """
+        tick = min(max(int(deadline // self.tick_seconds) + 1, self.tick + 1), self.tick + len(self.wheel))
+        self.wheel[tick % len(self.wheel)].append((key, flow))
+
+    def _expire(self, key):
+        """
+        Retira um fluxo da tabela e monta a sua linha de log.
+        """
+        first, last, packets, size, flags, action, direction, rule_id = self.flows.pop(key)
+        self.expired += 1
+        # Mesma ordem de logstore.LOG_COLUMNS: o timestamp é o primeiro pacote, e as colunas
+        # packets e duration completam o registro
+        return (first, *key, size, flags, action, direction, rule_id, packets, last - first)
+
+    def advance(self, now):
+        """
+        Avança o relógio até now, encerrando os fluxos cujo prazo venceu.
+
+        Args:
+            now (float): Instante atual (segundos desde a época Unix).
+
+        Returns:
+            list: Linhas de log dos fluxos encerrados.
+        """
+        current = int(now // self.tick_seconds)
+        if self.tick is None:
+            self.tick = current
+            self._next_tick = (current + 1) * self.tick_seconds
+            return []
+        expired = []
+        if current <= self.tick:
+            return expired
+        self._next_tick = (current + 1) * self.tick_seconds
+        slots = len(self.wheel)
+        # Depois de mais de uma volta sem avanço, cada posição é processada uma única vez
+        first = max(self.tick + 1, current - slots + 1)
+        self.tick = current
+        for tick in range(first, current + 1):
+            scheduled = self.wheel[tick % slots]
+            if not scheduled:
+                continue
+            self.wheel[tick % slots] = []
+            for key, flow in scheduled:
+                if self.flows.get(key) is not flow:
+                    continue  # O fluxo já foi encerrado (ex.: o veredicto mudou)
+                deadline = min(flow[_LAST] + self.idle_timeout, flow[_FIRST] + self.active_timeout)
+                if deadline <= now:
+                    expired.append(self._expire(key))
+                else:
+                    self._schedule(key, flow, deadline)
+        return expired
+
+    def expire_all(self):
+        """
+        Encerra todos os fluxos em aberto (ex.: ao fim da captura ou da reprodução).
+
+        Returns:
+            list: Linhas de log dos fluxos encerrados.
+        """
+        expired = [self._expire(key) for key in list(self.flows)]
+        self.wheel = [[] for _ in self.wheel]
+        return expired
@@ -1,5 +1,5 @@
 # Importa variáveis compartilhadas e o lock para sincronização de threads
-from data import log_lock, packet_logs, packet_stats
+from data import distinct_counters, heavy_hitters, log_lock, packet_logs, packet_stats, recent_frames, traffic_rollup
 
 # Importa a biblioteca Streamlit para criar a interface gráfica
 import streamlit as st
@@ -17,7 +17,7 @@ import plotly.graph_objects as go
 import threading
 
 # Importa a função sniff_packets para capturar pacotes de rede
-from main import sniff_packets
+from main import sniff_packets, get_lock_wait_stats
 
 # Importa time para controlar o intervalo de atualização
 import time
@@ -29,7 +29,40 @@ from datetime import datetime, timedelta
 import pytz
 
 # Importa funções para gerenciar regras
-from regras import get_rules, save_rules
+from regras import get_rules, save_rules, get_rule_stats, get_latency_stats, optimize_rules
+
+# Importa funções para interpretar e formatar intervalos e listas de portas
+from ports import format_ports, parse_ports
+
+# Importa a dissecação sob demanda dos quadros brutos capturados
+from decoder import dissect_frame
+
+# Importa o arquivo persistente dos logs e a busca que junta memória e disco
+from archive import start_log_archiving, search_logs
+
+# Importa a conversão de IPs inteiros para texto, usada nos rankings de tráfego
+from logstore import ip_strings
+
+# Importa as janelas dos rankings de IPs e portas mais ativos e a duração dos intervalos de distintos
+from sketches import HEAVY_HITTER_WINDOWS, DISTINCT_BUCKET_SECONDS
+
+# Opções do filtro de tempo e a janela de cada uma, em minutos; as janelas mais longas
+# que o log em memória são completadas pelo histórico em disco
+TIME_FILTERS = {
+    "Últimos 5 minutos": 5,
+    "Últimos 15 minutos": 15,
+    "Últimos 30 minutos": 30,
+    "Última hora": 60,
+    "Últimas 24 horas": 24 * 60,
+    "Últimos 7 dias": 7 * 24 * 60,
+}
+
+# Alertas por quantidade de valores distintos em um minuto: (dimensão, limite, mensagem).
+# Muitas origens distintas sugerem um DDoS; muitas portas de destino distintas, uma varredura
+DISTINCT_ALERTS = (
+    ("src_ip", 500, "🌊 Possível DDoS às {time}: {count} IPs de origem distintos em 1 minuto"),
+    ("dst_port", 100, "🔍 Possível varredura de portas às {time}: {count} portas de destino distintas em 1 minuto"),
+)
 
 #############################
 # INICIALIZAÇÃO DO SESSION_STATE
@@ -91,6 +124,10 @@ if "search_protocol" not in st.session_state:
 if "traffic_interval" not in st.session_state:
     st.session_state["traffic_interval"] = "10s"
 
+# Persiste a janela dos rankings de IPs e portas mais ativos
+if "hitter_window" not in st.session_state:
+    st.session_state["hitter_window"] = "Últimos 5 minutos"
+
 # Persiste o filtro de tempo
 if "time_filter" not in st.session_state:
     st.session_state["time_filter"] = "Todos"
@@ -108,6 +145,9 @@ if "notifications" not in st.session_state:
     st.session_state["notifications"] = []
 if "last_notification_check" not in st.session_state:
     st.session_state["last_notification_check"] = 0
+# Último minuto já alertado de cada alerta de valores distintos
+if "distinct_alerted" not in st.session_state:
+    st.session_state["distinct_alerted"] = {}
 
 # Índice do pacote selecionado para visualização detalhada
 if "selected_packet_index" not in st.session_state:
@@ -123,6 +163,12 @@ if "rule_form_action" not in st.session_state:
 if "rule_form_index" not in st.session_state:
     st.session_state["rule_form_index"] = None
 
+# Resultado da otimização de regras sob demanda
+if "optimized_rules" not in st.session_state:
+    st.session_state["optimized_rules"] = None
+if "optimization_report" not in st.session_state:
+    st.session_state["optimization_report"] = None
+
 # Dicionário para armazenar os valores do formulário de regras
 if "rule_form_values" not in st.session_state:
     st.session_state["rule_form_values"] = {
@@ -154,10 +200,10 @@ def toggle_export():
     """
     st.session_state["export_clicked"] = True
     st.session_state["export_timestamp"] = time.time()
-    with log_lock:
-        logs = packet_logs.copy()
-    if logs:
-        df_logs = pd.DataFrame(logs)
+    # A cópia é feita da visão publicada do log, sem o log_lock
+    columns = packet_logs.snapshot()
+    if len(columns["timestamp"]):
+        df_logs = packet_logs.to_dataframe(columns)
         csv = df_logs.to_csv(index=False)
         st.session_state["export_data"] = csv
     else:
@@ -184,6 +230,8 @@ def start_sniffing_thread():
     if not st.session_state["sniffing_thread_started"]:
         sniffing_thread = threading.Thread(target=sniff_packets, daemon=True)
         sniffing_thread.start()
+        # Grava os logs em disco para que o histórico sobreviva a reinícios do dashboard
+        start_log_archiving()
         st.session_state["sniffing_thread_started"] = True
 
 # Função para atualizar os dados manualmente
@@ -224,7 +272,7 @@ def check_notifications(df, last_check):
     if not new_packets.empty:
         time_window = 10
         time_bins = new_packets["timestamp"].apply(lambda x: int(x // time_window) * time_window)
-        traffic_counts = time_bins.value_counts()
+        traffic_counts = new_packets["packets"].groupby(time_bins).sum()
         for time_bin, count in traffic_counts.items():
             if count > 50:
                 timestamp = pd.to_datetime(time_bin, unit="s").tz_localize('UTC').tz_convert('America/Sao_Paulo').strftime("%H:%M:%S")
@@ -236,6 +284,47 @@ def check_notifications(df, last_check):
     
     return notifications
 
+# Função para verificar os alertas de valores distintos por minuto
+def check_distinct_alerts():
+    """
+    Verifica se algum minuto passou dos limites de valores distintos (ver DISTINCT_ALERTS).
+
+    Lê os contadores HyperLogLog, sem percorrer os pacotes; cada minuto gera no
+    máximo um alerta por dimensão, mesmo que ainda esteja em andamento.
+    """
+    notifications = []
+    alerted = st.session_state["distinct_alerted"]
+    for dimension, limit, message in DISTINCT_ALERTS:
+        last = alerted.get(dimension, 0)
+        with log_lock:
+            series = distinct_counters.series(dimension, start=last + DISTINCT_BUCKET_SECONDS)
+        for minute, count in series:
+            if count > limit:
+                timestamp = pd.to_datetime(minute, unit="s").tz_localize('UTC').tz_convert('America/Sao_Paulo').strftime("%H:%M")
+                notifications.append(message.format(time=timestamp, count=count))
+                alerted[dimension] = minute
+    return notifications
+
+# Função para ler os valores mais ativos de uma dimensão dos sketches
+def top_hitters(dimension, window_seconds, k=5):
+    """
+    Lê dos sketches os valores mais frequentes de uma dimensão na janela que termina agora.
+
+    Args:
+        dimension (str): Dimensão (ver sketches.HEAVY_HITTER_DIMENSIONS).
+        window_seconds (int): Tamanho da janela, em segundos.
+        k (int): Quantidade de valores.
+
+    Returns:
+        pd.Series: Contagem de pacotes por valor (IPs como texto), da maior para a menor.
+    """
+    with log_lock:
+        top, _ = heavy_hitters.top(dimension, window_seconds, k, now=time.time())
+    keys = [key for key, _, _ in top]
+    if dimension != "dst_port":
+        keys = list(ip_strings(keys))
+    return pd.Series([count for _, count, _ in top], index=pd.Index(keys, dtype=object), dtype="int64")
+
 # Função para atualizar o índice do pacote selecionado
 def update_selected_packet_index():
     """
@@ -247,6 +336,7 @@ def update_selected_packet_index():
 def add_rule(new_rule):
     """
     Adiciona uma nova regra à lista de regras e atualiza o rules.json.
+    A edição é feita em uma cópia das regras; save_rules publica um novo snapshot.
     """
     rules = get_rules()
     rules.append(new_rule)
@@ -256,6 +346,7 @@ def add_rule(new_rule):
 def update_rule(index, updated_rule):
     """
     Atualiza uma regra existente na lista de regras e atualiza o rules.json.
+    A edição é feita em uma cópia das regras; save_rules publica um novo snapshot.
     """
     rules = get_rules()
     if 0 <= index < len(rules):
@@ -268,6 +359,7 @@ def update_rule(index, updated_rule):
 def delete_rule(index):
     """
     Remove uma regra da lista de regras e atualiza o rules.json.
+    A edição é feita em uma cópia das regras; save_rules publica um novo snapshot.
     """
     rules = get_rules()
     if 0 <= index < len(rules):
@@ -292,6 +384,30 @@ def reset_rule_form():
         "dst_port": ""
     }
 
+def format_port_field(spec):
+    """
+    Formata a porta de uma regra (número, intervalo ou lista) para o campo de texto do formulário.
+    """
+    if spec is None or spec == "":
+        return ""
+    try:
+        return format_ports(spec)
+    except ValueError:
+        return str(spec)
+
+def parse_port_field(value):
+    """
+    Converte o texto do formulário em uma porta de regra.
+    Uma porta única vira inteiro; intervalos e listas são mantidos como texto (ex.: "1024-65535", "80,443").
+
+    Raises:
+        ValueError: Se a especificação de portas for inválida.
+    """
+    intervals = parse_ports(value)
+    if len(intervals) == 1 and intervals[0][0] == intervals[0][1]:
+        return intervals[0][0]
+    return format_ports(intervals)
+
 def prepare_edit_rule(index):
     """
     Prepara o formulário para editar uma regra existente.
@@ -306,10 +422,43 @@ def prepare_edit_rule(index):
             "protocol": selected_rule.get("protocol", ""),
             "src_ip": selected_rule.get("src_ip", ""),
             "dst_ip": selected_rule.get("dst_ip", ""),
-            "src_port": str(selected_rule.get("src_port", "")) if selected_rule.get("src_port") else "",
-            "dst_port": str(selected_rule.get("dst_port", "")) if selected_rule.get("dst_port") else ""
+            "src_port": format_port_field(selected_rule.get("src_port")),
+            "dst_port": format_port_field(selected_rule.get("dst_port"))
         }
 
+def display_optimization_report(report):
+    """
+    Exibe o relatório da otimização de regras: regras removidas, redundantes, movidas e o custo medido.
+    """
+    st.markdown("### Relatório de Otimização")
+    if "skipped" in report:
+        st.info(f"ℹ️ Otimização não realizada: {report['skipped']}.")
+        return
+    if report["removed"]:
+        st.markdown("**Regras sombreadas (removidas):**")
+        for item in report["removed"]:
+            st.markdown(f"- Regra {item['index']} {item['rule']} é coberta pela regra {item['covered_by']}")
+    if report["redundant"]:
+        st.markdown("**Regras redundantes (mantidas; cobertas por uma regra posterior):**")
+        for item in report["redundant"]:
+            st.markdown(f"- Regra {item['index']} {item['rule']} é coberta pela regra {item['covered_by']}")
+    if report["moved"]:
+        st.markdown("**Regras movidas:**")
+        for item in report["moved"]:
+            st.markdown(f"- Regra {item['index']} ({item['hits']} acertos): posição {item['from']} → {item['to']}")
+    if not (report["removed"] or report["redundant"] or report["moved"]):
+        st.info("ℹ️ As regras já estão otimizadas.")
+
+    # Custo de avaliação antes e depois
+    before, after = report["cost_before"], report["cost_after"]
+    col_before, col_after = st.columns(2)
+    with col_before:
+        st.metric("Regras testadas por pacote (antes)", f"{before['rules_per_packet']:.2f}" if before["rules_per_packet"] is not None else "-")
+        st.metric("Custo por pacote (antes, ns)", f"{before['ns_per_packet']:.0f}" if before["ns_per_packet"] is not None else "-")
+    with col_after:
+        st.metric("Regras testadas por pacote (depois)", f"{after['rules_per_packet']:.2f}" if after["rules_per_packet"] is not None else "-")
+        st.metric("Custo por pacote (depois, ns)", f"{after['ns_per_packet']:.0f}" if after["ns_per_packet"] is not None else "-")
+
 #############################
 # FUNÇÃO PRINCIPAL DO DASHBOARD
 #############################
@@ -401,9 +550,54 @@ def display_dashboard():
     rules = get_rules()
     if rules:
         rules_df = pd.DataFrame(rules)
+
+        # Adiciona as estatísticas de cada regra (acertos, último acerto, bytes e latência)
+        rule_stats = get_rule_stats(rules)
+        rules_df["Acertos"] = [stats["hits"] for stats in rule_stats]
+        rules_df["Último Acerto"] = [
+            pd.to_datetime(stats["last_hit"], unit="s").tz_localize('UTC').tz_convert('America/Sao_Paulo').strftime("%H:%M:%S")
+            if stats["last_hit"] is not None else "-"
+            for stats in rule_stats
+        ]
+        rules_df["Bytes"] = [stats["bytes"] for stats in rule_stats]
+        rules_df["Latência Média (µs)"] = [
+            round(stats["mean_latency_us"], 2) if stats["mean_latency_us"] is not None else None
+            for stats in rule_stats
+        ]
         rules_df["Ações"] = [f"Editar | Deletar" for _ in range(len(rules))]
         st.dataframe(rules_df, key="rules_table", use_container_width=True)
 
+        # Exibe a distribuição de latência da avaliação das regras
+        latency = get_latency_stats()
+        col_p50, col_p99, col_max, col_count = st.columns(4)
+        with col_p50:
+            st.metric("Latência p50 (µs)", f"{latency['p50_us']:.1f}")
+        with col_p99:
+            st.metric("Latência p99 (µs)", f"{latency['p99_us']:.1f}")
+        with col_max:
+            st.metric("Latência Máxima (µs)", f"{latency['max_us']:.1f}")
+        with col_count:
+            st.metric("Pacotes Avaliados", latency["count"])
+
+        # Otimização sob demanda: remove regras sombreadas e reordena por frequência de acertos
+        if st.button("Otimizar Regras", key="optimize_rules", help="Remove regras sombreadas e reordena as regras pelos acertos, sem mudar o veredicto"):
+            st.session_state["optimized_rules"], st.session_state["optimization_report"] = optimize_rules(rules)
+        if st.session_state["optimization_report"] is not None:
+            display_optimization_report(st.session_state["optimization_report"])
+            col_apply, col_discard = st.columns(2)
+            with col_apply:
+                if st.button("Salvar Regras Otimizadas", key="apply_optimization"):
+                    save_rules(st.session_state["optimized_rules"])
+                    st.session_state["optimized_rules"] = None
+                    st.session_state["optimization_report"] = None
+                    reset_rule_form()
+                    st.rerun()
+            with col_discard:
+                if st.button("Descartar Otimização", key="discard_optimization"):
+                    st.session_state["optimized_rules"] = None
+                    st.session_state["optimization_report"] = None
+                    st.rerun()
+
         # Adiciona botões de ação para cada regra
         for index, rule in enumerate(rules):
             col_edit, col_delete = st.columns(2)
@@ -437,22 +631,22 @@ def display_dashboard():
         src_ip = st.text_input(
             "IP de Origem",
             value=form_values["src_ip"],
-            placeholder="Ex.: 192.168.0.100 (deixe vazio para qualquer IP)"
+            placeholder="Ex.: 192.168.0.100 ou 192.168.0.0/16 (deixe vazio para qualquer IP)"
         )
         dst_ip = st.text_input(
             "IP de Destino",
             value=form_values["dst_ip"],
-            placeholder="Ex.: 8.8.8.8 (deixe vazio para qualquer IP)"
+            placeholder="Ex.: 8.8.8.8 ou 8.8.0.0/16 (deixe vazio para qualquer IP)"
         )
         src_port = st.text_input(
             "Porta de Origem",
             value=form_values["src_port"],
-            placeholder="Ex.: 12345 (deixe vazio para qualquer porta)"
+            placeholder="Ex.: 12345, 6000-7000 ou 80,443 (deixe vazio para qualquer porta)"
         )
         dst_port = st.text_input(
             "Porta de Destino",
             value=form_values["dst_port"],
-            placeholder="Ex.: 80 (deixe vazio para qualquer porta)"
+            placeholder="Ex.: 80, 1024-65535 ou 80,443,8080 (deixe vazio para qualquer porta)"
         )
 
         col_submit, col_cancel = st.columns(2)
@@ -475,15 +669,15 @@ def display_dashboard():
                 new_rule["dst_ip"] = dst_ip
             if src_port:
                 try:
-                    new_rule["src_port"] = int(src_port)
+                    new_rule["src_port"] = parse_port_field(src_port)
                 except ValueError:
-                    st.error("❌ Porta de origem deve ser um número inteiro!")
+                    st.error("❌ Porta de origem deve ser um número, intervalo (ex.: 6000-7000) ou lista (ex.: 80,443)!")
                     st.stop()
             if dst_port:
                 try:
-                    new_rule["dst_port"] = int(dst_port)
+                    new_rule["dst_port"] = parse_port_field(dst_port)
                 except ValueError:
-                    st.error("❌ Porta de destino deve ser um número inteiro!")
+                    st.error("❌ Porta de destino deve ser um número, intervalo (ex.: 6000-7000) ou lista (ex.: 80,443)!")
                     st.stop()
 
             # Adiciona ou atualiza a regra
@@ -504,18 +698,18 @@ def display_dashboard():
     # PROCESSAMENTO DOS DADOS
     #############################
 
-    # Copia os logs e estatísticas de forma thread-safe
+    # Pega a visão publicada do log (sem o log_lock e sem copiar os pacotes) e copia as
+    # estatísticas de forma thread-safe; a tabela copia só a janela filtrada (ver search_logs)
+    view = packet_logs.view()
     with log_lock:
-        logs = packet_logs.copy()
         stats = packet_stats.copy()
 
-    # Converte os logs em um DataFrame do pandas
-    df = pd.DataFrame(logs)
-
-    # Verifica notificações de pacotes suspeitos
-    if not df.empty:
-        new_notifications = check_notifications(df, st.session_state["last_notification_check"])
+    # Verifica notificações de pacotes suspeitos, consultando só os pacotes desde a última verificação
+    new_columns = view.query(st.session_state["last_notification_check"])
+    if len(new_columns["timestamp"]):
+        new_notifications = check_notifications(packet_logs.to_dataframe(new_columns), st.session_state["last_notification_check"])
         st.session_state["notifications"].extend(new_notifications)
+    st.session_state["notifications"].extend(check_distinct_alerts())
 
     # Exibe notificações
     if st.session_state["notifications"]:
@@ -535,58 +729,115 @@ def display_dashboard():
     col3, col4 = st.columns(2)
 
     with col1:
-        st.metric("Total de Pacotes", len(df))
+        # Cada linha do log pode ser um fluxo com vários pacotes (ver main.configure_flow_logging)
+        st.metric("Total de Pacotes", view.sum("packets"))
     with col2:
         st.metric("Pacotes Enviados", stats["sent"])
     with col3:
         st.metric("Pacotes Recebidos", stats["received"])
     with col4:
-        st.metric("Perda de Pacotes", stats["lost"])
+        st.metric(
+            "Perda de Pacotes",
+            stats["lost"],
+            help=f"Kernel: {stats['lost_kernel']} | Fila de avaliação: {stats['lost_queue']}"
+        )
+
+    # Exibe a espera da captura pelo lock dos logs (uma aquisição por lote gravado)
+    lock_wait = get_lock_wait_stats()
+    col5, col6 = st.columns(2)
+    with col5:
+        st.metric("Espera pelo Lock dos Logs p99 (µs)", f"{lock_wait['p99_us']:.1f}")
+    with col6:
+        st.metric("Lotes de Logs Gravados", lock_wait["count"])
+
+    # Exibe os IPs e portas distintos do último minuto completo, comparados ao minuto anterior
+    minute = int(time.time()) // DISTINCT_BUCKET_SECONDS * DISTINCT_BUCKET_SECONDS - DISTINCT_BUCKET_SECONDS
+    col7, col8, col9 = st.columns(3)
+    for column, dimension, label in (
+        (col7, "src_ip", "IPs de Origem Distintos/min"),
+        (col8, "dst_ip", "IPs de Destino Distintos/min"),
+        (col9, "dst_port", "Portas de Destino Distintas/min"),
+    ):
+        with log_lock:
+            current = distinct_counters.distinct(dimension, minute, minute)
+            previous = distinct_counters.distinct(dimension, minute - DISTINCT_BUCKET_SECONDS, minute - DISTINCT_BUCKET_SECONDS)
+        with column:
+            st.metric(label, current, delta=current - previous, help="Estimativa HyperLogLog (erro típico de 1,6%)")
 
     #############################
     # EXIBIÇÃO DOS GRÁFICOS
     #############################
 
-    # Se o DataFrame não estiver vazio, processa os dados para os gráficos
-    if not df.empty:
-        # Classifica os IPs como LAN ou WAN
-        df["ip_type"] = df["src_ip"].apply(
-            lambda ip: "LAN" if isinstance(ip, str) and ip.startswith(("192.168.", "10.", "172.16.", "172.31.")) else "WAN"
+    # Se houver pacotes no log, processa os dados para os gráficos
+    if len(view):
+        # Dropdown para selecionar a janela dos rankings
+        st.selectbox(
+            "Janela dos Rankings",
+            options=list(HEAVY_HITTER_WINDOWS),
+            index=list(HEAVY_HITTER_WINDOWS).index(st.session_state["hitter_window"]),
+            key="hitter_window"
         )
-        df = df.sort_values(by="ip_type")
+        window_seconds = HEAVY_HITTER_WINDOWS[st.session_state["hitter_window"]]
 
-        # Calcula os 5 IPs de origem mais ativos
-        src_ip_counts = df["src_ip"].value_counts().head(5)
+        # Lê os 5 IPs de origem mais ativos da janela dos sketches, sem percorrer os pacotes
+        src_ip_counts = top_hitters("src_ip", window_seconds)
 
-        # Cria um gráfico de barras com os IPs de origem mais ativos
+        # Cria um gráfico de barras com os IPs de origem mais ativos (a partir de um DataFrame,
+        # que o plotly aceita mesmo vazio, ex.: sem pacotes na janela)
         fig_ip = px.bar(
-            x=src_ip_counts.index,
-            y=src_ip_counts.values,
-            color=src_ip_counts.index.map(
-                lambda ip: "LAN" if isinstance(ip, str) and ip.startswith(("192.168.", "10.", "172.16.", "172.31.")) else "WAN"
-            ),
-            title="Top 5 IPs de Origem",
-            labels={"x": "IPs de Origem", "y": "Quantidade de Pacotes", "color": "Tipo de Rede"}
+            pd.DataFrame({
+                "IPs de Origem": src_ip_counts.index,
+                "Quantidade de Pacotes": src_ip_counts.values,
+                "Tipo de Rede": src_ip_counts.index.map(
+                    lambda ip: "LAN" if isinstance(ip, str) and ip.startswith(("192.168.", "10.", "172.16.", "172.31.")) else "WAN"
+                ),
+            }),
+            x="IPs de Origem",
+            y="Quantidade de Pacotes",
+            color="Tipo de Rede",
+            title="Top 5 IPs de Origem"
         )
 
-        # Calcula a contagem de pacotes por protocolo
-        protocol_counts = df["protocol"].value_counts()
+        # Cria os gráficos dos IPs de destino, portas de destino e origens bloqueadas mais ativos
+        hitter_charts = []
+        for dimension, title, label in (
+            ("dst_ip", "Top 5 IPs de Destino", "IPs de Destino"),
+            ("dst_port", "Top 5 Portas de Destino", "Portas de Destino"),
+            ("blocked_src", "Top 5 Origens Bloqueadas", "IPs de Origem"),
+        ):
+            counts = top_hitters(dimension, window_seconds)
+            hitter_charts.append(px.bar(
+                pd.DataFrame({label: counts.index.astype(str), "Quantidade de Pacotes": counts.values}),
+                x=label,
+                y="Quantidade de Pacotes",
+                title=title
+            ))
+
+        # Lê a contagem de pacotes por protocolo das séries agregadas (toda a retenção do nível de 1 h)
+        with log_lock:
+            protocol_totals = traffic_rollup.totals("protocol")
+        protocol_counts = pd.Series(
+            {protocol: total[0] for protocol, total in protocol_totals.items()}, dtype="int64"
+        ).sort_values(ascending=False)
 
         # Mapeia os números dos protocolos para nomes legíveis (ex.: 6 = TCP, 17 = UDP)
         protocol_names = {6: "TCP", 17: "UDP", 1: "ICMP"}
         protocol_labels = protocol_counts.index.map(lambda x: protocol_names.get(x, f"Protocol {x}"))
 
-        # Cria um gráfico de barras para os protocolos mais usados
+        # Cria um gráfico de barras para os protocolos mais usados (a partir de um DataFrame,
+        # que o plotly aceita mesmo vazio, ex.: antes de o primeiro lote chegar às séries)
         fig_protocols = px.bar(
-            x=protocol_counts.values,
-            y=protocol_labels,
+            pd.DataFrame({"Quantidade de Pacotes": protocol_counts.values, "Protocolo": protocol_labels}),
+            x="Quantidade de Pacotes",
+            y="Protocolo",
             orientation="h",
-            title="Protocolos Mais Usados",
-            labels={"x": "Quantidade de Pacotes", "y": "Protocolo"}
+            title="Protocolos Mais Usados"
         )
 
         # Exibe os gráficos
         st.plotly_chart(fig_ip, key=f"chart_{st.session_state['iteration']}")
+        for position, fig_hitters in enumerate(hitter_charts):
+            st.plotly_chart(fig_hitters, key=f"hitter_chart_{position}_{st.session_state['iteration']}")
         st.plotly_chart(fig_protocols, key=f"protocol_chart_{st.session_state['iteration']}")
 
         # Gráfico de linha: Tráfego ao longo do tempo
@@ -599,20 +850,16 @@ def display_dashboard():
             key="traffic_interval"
         )
 
-        # Converte o timestamp para datetime, ajustando para o horário de Brasília (GMT-3)
-        df["timestamp_dt"] = pd.to_datetime(df["timestamp"], unit="s").dt.tz_localize('UTC').dt.tz_convert('America/Sao_Paulo')
-
-        # Filtra apenas os últimos 5 minutos para tornar o gráfico mais legível
+        # Lê os últimos 5 minutos das séries agregadas, já no intervalo selecionado, para tornar o gráfico mais legível
         current_time = pd.Timestamp.now(tz='America/Sao_Paulo')
         time_threshold = current_time - timedelta(minutes=5)
-        df = df[df["timestamp_dt"] >= time_threshold]
-
-        # Arredonda os timestamps para o intervalo selecionado
         interval = st.session_state["traffic_interval"]
-        df["time_bin"] = df["timestamp_dt"].dt.floor(interval)
+        with log_lock:
+            points = traffic_rollup.series(time_threshold.timestamp(), step=int(interval[:-1]))
 
-        # Conta o número de pacotes por intervalo de tempo
-        traffic_over_time = df.groupby("time_bin").size().reset_index(name="packet_count")
+        # Converte o início de cada intervalo para datetime, ajustando para o horário de Brasília (GMT-3)
+        traffic_over_time = pd.DataFrame(points, columns=["time_bin", "packet_count", "bytes"])
+        traffic_over_time["time_bin"] = pd.to_datetime(traffic_over_time["time_bin"], unit="s").dt.tz_localize('UTC').dt.tz_convert('America/Sao_Paulo')
 
         # Cria o gráfico de linha
         fig_traffic = go.Figure()
@@ -671,61 +918,38 @@ def display_dashboard():
     with col_search4:
         st.selectbox(
             "Filtrar por Tempo",
-            options=["Todos", "Últimos 5 minutos", "Últimos 15 minutos", "Últimos 30 minutos"],
-            index=["Todos", "Últimos 5 minutos", "Últimos 15 minutos", "Últimos 30 minutos"].index(st.session_state["time_filter"]),
+            options=["Todos"] + list(TIME_FILTERS),
+            index=(["Todos"] + list(TIME_FILTERS)).index(st.session_state["time_filter"]),
             key="time_filter"
         )
     with col_clear:
         st.button("Limpar Filtros", key="clear_filters", on_click=clear_filters)
 
-    # Se o DataFrame não estiver vazio, aplica os filtros e exibe a tabela
-    if not df.empty:
-        # Aplica os filtros de pesquisa
-        filtered_df = df.copy()
-
-        # Filtro por IP de Origem
-        if st.session_state["search_src_ip"]:
-            try:
-                filtered_df = filtered_df[
-                    filtered_df["src_ip"].str.contains(
-                        st.session_state["search_src_ip"], case=False, na=False, regex=False
-                    )
-                ]
-            except Exception as e:
-                st.warning(f"⚠️ Erro no filtro de IP de Origem: {e}. Verifique o formato do IP.")
-
-        # Filtro por IP de Destino
-        if st.session_state["search_dst_ip"]:
-            try:
-                filtered_df = filtered_df[
-                    filtered_df["dst_ip"].str.contains(
-                        st.session_state["search_dst_ip"], case=False, na=False, regex=False
-                    )
-                ]
-            except Exception as e:
-                st.warning(f"⚠️ Erro no filtro de IP de Destino: {e}. Verifique o formato do IP.")
-
-        # Filtro por Protocolo
-        if st.session_state["search_protocol"]:
-            protocol_map = {"TCP": 6, "UDP": 17, "ICMP": 1}
-            search_protocol = st.session_state["search_protocol"].upper()
-            protocol_num = protocol_map.get(search_protocol, None)
-            if protocol_num is not None:
-                filtered_df = filtered_df[filtered_df["protocol"] == protocol_num]
-            else:
-                st.warning(f"⚠️ Protocolo '{st.session_state['search_protocol']}' inválido. Use TCP, UDP ou ICMP.")
-
-        # Filtro por Tempo
-        if st.session_state["time_filter"] != "Todos":
-            current_time = pd.Timestamp.now(tz='America/Sao_Paulo')
-            if st.session_state["time_filter"] == "Últimos 5 minutos":
-                time_threshold = current_time - timedelta(minutes=5)
-            elif st.session_state["time_filter"] == "Últimos 15 minutos":
-                time_threshold = current_time - timedelta(minutes=15)
-            elif st.session_state["time_filter"] == "Últimos 30 minutos":
-                time_threshold = current_time - timedelta(minutes=30)
-            filtered_df["timestamp_dt"] = pd.to_datetime(filtered_df["timestamp"], unit="s").dt.tz_localize('UTC').dt.tz_convert('America/Sao_Paulo')
-            filtered_df = filtered_df[filtered_df["timestamp_dt"] >= time_threshold]
+    # Filtro por Protocolo: converte o nome no número do protocolo
+    protocol_num = None
+    if st.session_state["search_protocol"]:
+        protocol_map = {"TCP": 6, "UDP": 17, "ICMP": 1}
+        search_protocol = st.session_state["search_protocol"].upper()
+        protocol_num = protocol_map.get(search_protocol, None)
+        if protocol_num is None:
+            st.warning(f"⚠️ Protocolo '{st.session_state['search_protocol']}' inválido. Use TCP, UDP ou ICMP.")
+
+    # Filtro por Tempo: janela consultada no log ordenado (e no histórico em disco,
+    # para as janelas mais antigas que a memória), sem percorrer o log inteiro
+    window_minutes = TIME_FILTERS.get(st.session_state["time_filter"])
+
+    # Se houver pacotes (ou uma janela a consultar no histórico), aplica os filtros e exibe a tabela
+    if len(view) or window_minutes is not None:
+        # Aplica os filtros de pesquisa: IPs exatos e prefixos CIDR usam os índices invertidos
+        # do log; outros textos são procurados como substring dos IPs distintos
+        columns, rules = search_logs(
+            start=time.time() - window_minutes * 60 if window_minutes is not None else None,
+            src_ip=st.session_state["search_src_ip"],
+            dst_ip=st.session_state["search_dst_ip"],
+            protocol=protocol_num,
+            history=window_minutes is not None
+        )
+        filtered_df = packet_logs.to_dataframe(columns, rules)
 
         # Aplica o filtro de pacotes bloqueados
         st.subheader("Logs de Pacotes")
@@ -805,6 +1029,14 @@ def display_dashboard():
                         st.markdown("### Detalhes do Pacote")
                         for key, value in packet.items():
                             st.markdown(f"**{key}:** {value}")
+
+                        # Disseca o quadro bruto com a Scapy apenas agora, se ele ainda estiver guardado
+                        with log_lock:
+                            frames = list(recent_frames)
+                        frame = next((item for item in frames if item[0] == packet["timestamp"]), None)
+                        if frame is not None:
+                            with st.expander("Dissecação Completa (Scapy)"):
+                                st.code(dissect_frame(frame[2], frame[1]).show(dump=True))
                     else:
                         st.error("❌ Índice fora do intervalo da tabela.")
                 except Exception as e:
@@ -812,7 +1044,7 @@ def display_dashboard():
 
             # Exibe a tabela
             st.dataframe(
-                filtered_df[["timestamp", "src_ip", "dst_ip", "src_port", "dst_port", "protocol", "action", "rule"]],
+                filtered_df[["timestamp", "src_ip", "dst_ip", "src_port", "dst_port", "protocol", "packets", "action", "rule"]],
                 key=f"table_{st.session_state['iteration']}"
             )
         else:
@@ -0,0 +1,826 @@
+# Importa NumPy para as colunas tipadas pré-alocadas do log
+import numpy as np
+
+# Importa pandas para montar o DataFrame do dashboard a partir das colunas
+import pandas as pd
+
+# Importa threading para serializar o registro de novas regras na tabela de regras
+import threading
+
+# Importa a chave de estatísticas das regras, usada para identificar regras iguais
+from regras import rule_key
+
+# Importa a interpretação de endereços e prefixos usada nas buscas por IP
+from cidr import parse_cidr, PREFIX_MASKS
+
+#############################
+# ESQUEMA DAS COLUNAS
+#############################
+
+# Colunas do log e seus tipos; cada linha ocupa 40 bytes, independentemente do conteúdo.
+# Uma linha é um pacote ou, no modo de fluxos (ver flows.FlowTable), um fluxo inteiro
+LOG_COLUMNS = (
+    ("timestamp", np.float64),  # Instante de captura (segundos desde a época Unix)
+    ("src_ip", np.uint32),  # IP de origem como inteiro
+    ("dst_ip", np.uint32),  # IP de destino como inteiro
+    ("src_port", np.uint16),  # Porta de origem (0 se o protocolo não tiver portas)
+    ("dst_port", np.uint16),  # Porta de destino (0 se o protocolo não tiver portas)
+    ("protocol", np.uint8),  # Número do protocolo IP
+    ("length", np.uint32),  # Tamanho do pacote IP em bytes (no fluxo, a soma dos pacotes)
+    ("tcp_flags", np.uint8),  # Flags TCP (0 se não for TCP; no fluxo, a união das flags vistas)
+    ("action", np.uint8),  # Código da ação (ver ACTIONS)
+    ("direction", np.uint8),  # Código da direção (ver DIRECTIONS)
+    ("rule_id", np.int32),  # Índice da regra em PacketLogStore.rules (-1 se nenhuma)
+    ("packets", np.uint32),  # Pacotes da linha (1 por pacote; no fluxo, o total)
+    ("duration", np.float32),  # Segundos entre o primeiro e o último pacote da linha (0 por pacote)
+)
+
+# Nomes das colunas, na ordem das tuplas aceitas por PacketLogStore.append
+LOG_COLUMN_NAMES = tuple(name for name, _ in LOG_COLUMNS)
+
+# Valores das colunas ausentes em logs gravados antes delas (o padrão das demais é 0)
+LOG_COLUMN_DEFAULTS = {"packets": 1}
+
+# Ações e direções codificadas (o código é o índice na tupla)
+ACTIONS = ("allowed", "blocked")
+DIRECTIONS = (None, "sent", "received")
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+DIRECTION_CODES = {direction: code for code, direction in enumerate(DIRECTIONS)}
+
+# Protocolos cujas colunas de porta são válidas (TCP e UDP)
+PORT_PROTOCOLS = (6, 17)
+
+# Capacidade padrão do log, em pacotes (cerca de 40 MB)
+DEFAULT_LOG_CAPACITY = 1_000_000
+
+# Linhas de cada bloco do log (cerca de 640 KB); o bloco mais antigo é descartado inteiro
+# quando sai da capacidade, e as linhas já publicadas de um bloco nunca são alteradas
+LOG_CHUNK_ROWS = 16384
+
+# Tipo de cada coluna, por nome
+LOG_COLUMN_TYPES = dict(LOG_COLUMNS)
+
+# Colunas com índice invertido (valor -> posições dos pacotes)
+INDEXED_COLUMNS = ("src_ip", "dst_ip", "src_port", "dst_port", "protocol")
+
+# Os índices são reconstruídos quando acumulam entradas para mais pacotes que
+# INDEX_REBUILD_FACTOR vezes a capacidade (as posições descartadas ou reescritas viram entradas obsoletas)
+INDEX_REBUILD_FACTOR = 2
+
+# Quantidade de segmentos de um índice a partir da qual eles são juntados em um só
+INDEX_MAX_SEGMENTS = 16
+
+# Representação decimal de cada octeto, para converter IPs inteiros em texto em lote
+_OCTETS = np.array([str(value) for value in range(256)], dtype=object)
+
+def ip_range(text):
+    """
+    Interpreta o texto de uma busca por IP como um endereço ou prefixo CIDR.
+
+    Args:
+        text (str): Texto da busca (ex.: "10.0.0.1" ou "10.0.0.0/8").
+
+    Returns:
+        tuple: O intervalo (low, high), inclusivo, dos IPs selecionados, ou None se o
+               texto não for um endereço completo nem um prefixo.
+    """
+    text = text.strip()
+    if text.count(".") != 3 and "/" not in text:
+        return None
+    try:
+        network, length = parse_cidr(text)
+    except ValueError:
+        return None
+    return network, network | (~PREFIX_MASKS[length] & 0xFFFFFFFF)
+
+def match_ip_keys(keys, text):
+    """
+    Seleciona, entre IPs distintos, os que atendem ao texto de uma busca.
+
+    Um endereço completo (ex.: "10.0.0.1") seleciona exatamente esse IP e um prefixo
+    CIDR (ex.: "10.0.0.0/8") seleciona os IPs da rede; qualquer outro texto é
+    procurado como substring da notação decimal, como no filtro original do dashboard.
+
+    Args:
+        keys (ndarray): IPs distintos como uint32.
+        text (str): Texto da busca.
+
+    Returns:
+        ndarray: Os IPs selecionados.
+    """
+    keys = np.asarray(keys, dtype=np.uint32)
+    bounds = ip_range(text)
+    if bounds is not None:
+        return keys[(keys >= bounds[0]) & (keys <= bounds[1])]
+    text = text.strip().lower()
+    return keys[np.fromiter((text in address for address in ip_strings(keys)), dtype=bool, count=len(keys))]
+
+def ip_strings(column):
+    """
+    Converte uma coluna de IPs inteiros em endereços na notação decimal.
+
+    Args:
+        column (ndarray): IPs como uint32.
+
+    Returns:
+        ndarray: Array de objetos com os endereços (ex.: "192.168.0.1").
+    """
+    column = np.asarray(column, dtype=np.uint32)
+    dot = "."
+    return (_OCTETS[column >> 24] + dot + _OCTETS[(column >> 16) & 255] + dot
+            + _OCTETS[(column >> 8) & 255] + dot + _OCTETS[column & 255])
+
+def _index_segment(values, positions):
+    """
+    Monta um segmento de índice invertido: as posições ordenadas pelo valor da coluna.
+
+    Returns:
+        tuple: (values, positions, distinct), com os valores ordenados, as posições na
+               mesma ordem e os valores distintos do segmento.
+    """
+    order = np.argsort(values, kind="stable")
+    values = values[order]
+    distinct = values[np.r_[True, values[1:] != values[:-1]]] if len(values) else values
+    return values, positions[order], distinct
+
+#############################
+# VISÃO IMUTÁVEL DO LOG
+#############################
+
+class LogView:
+    """
+    Visão imutável do log, publicada pelo escritor a cada lote gravado (ver PacketLogStore.view).
+
+    Guarda apenas referências (a marca d'água total e a cadeia de blocos daquele
+    instante), então é obtida em O(1) e lida sem o log_lock, enquanto o escritor
+    continua gravando. As linhas anteriores à marca d'água nunca mudam nos blocos
+    referenciados: o escritor só acrescenta linhas depois delas e, antes de reescrever
+    linhas já publicadas (intercalação de lotes fora de ordem), copia o bloco
+    (copy-on-write); blocos descartados continuam válidos para quem ainda os lê.
+
+    Attributes:
+        total (int): Total de pacotes gravados até a publicação (marca d'água).
+        capacity (int): Quantidade máxima de pacotes guardados.
+        chunk_rows (int): Linhas de cada bloco; o bloco k guarda as posições [k * chunk_rows, (k + 1) * chunk_rows).
+        first_chunk (int): Número do primeiro bloco da cadeia.
+        chunks (tuple): Blocos, cada um um dict com um array de chunk_rows posições por coluna.
+    """
+
+    __slots__ = ("total", "capacity", "chunk_rows", "first_chunk", "chunks")
+
+    def __init__(self, total, capacity, chunk_rows, first_chunk, chunks):
+        self.total = total
+        self.capacity = capacity
+        self.chunk_rows = chunk_rows
+        self.first_chunk = first_chunk
+        self.chunks = chunks
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def _slices(self, begin, end):
+        """
+        Percorre os trechos contíguos dos blocos entre duas posições de total.
+
+        Yields:
+            tuple: (bloco, início, fim), com o trecho [início, fim) do bloco.
+        """
+        rows = self.chunk_rows
+        while begin < end:
+            number, offset = divmod(begin, rows)
+            stop = min(rows, offset + end - begin)
+            yield self.chunks[number - self.first_chunk], offset, stop
+            begin += stop - offset
+
+    def timestamp_at(self, position):
+        """
+        Retorna o timestamp da linha em uma posição de total.
+        """
+        number, offset = divmod(position, self.chunk_rows)
+        return self.chunks[number - self.first_chunk]["timestamp"][offset]
+
+    def search(self, timestamp, side="left"):
+        """
+        Busca binária de um timestamp no log ordenado.
+
+        Os blocos são percorridos pelo último timestamp de cada um, e a busca binária é
+        feita só no bloco que contém a posição, sem cópia.
+
+        Returns:
+            int: A posição de inserção (ver numpy.searchsorted), relativa ao pacote mais antigo guardado.
+        """
+        index = 0
+        for chunk, start, stop in self._slices(self.total - len(self), self.total):
+            column = chunk["timestamp"]
+            last = column[stop - 1]
+            if last < timestamp or (side == "right" and last == timestamp):
+                index += stop - start
+                continue
+            return index + int(np.searchsorted(column[start:stop], timestamp, side))
+        return index
+
+    def range(self, begin, end, names=LOG_COLUMN_NAMES):
+        """
+        Copia as colunas (todas ou apenas names) dos pacotes entre duas posições
+        relativas ao mais antigo guardado.
+        """
+        oldest = self.total - len(self)
+        pieces = list(self._slices(oldest + begin, oldest + max(begin, end)))
+        if not pieces:
+            return {name: np.empty(0, dtype=LOG_COLUMN_TYPES[name]) for name in names}
+        return {name: np.concatenate([chunk[name][start:stop] for chunk, start, stop in pieces]) for name in names}
+
+    def take(self, positions, names=LOG_COLUMN_NAMES):
+        """
+        Copia as colunas (todas ou apenas names) das linhas em posições de total, em ordem crescente.
+        """
+        numbers, offsets = np.divmod(positions, self.chunk_rows)
+        result = {name: np.empty(len(positions), dtype=LOG_COLUMN_TYPES[name]) for name in names}
+        # Cada bloco é lido uma vez, para o trecho de posições que cai nele
+        edges = [0, *(np.flatnonzero(numbers[1:] != numbers[:-1]) + 1).tolist(), len(positions)]
+        for low, high in zip(edges, edges[1:]):
+            if low == high:
+                continue
+            chunk = self.chunks[int(numbers[low]) - self.first_chunk]
+            for name in names:
+                result[name][low:high] = chunk[name][offsets[low:high]]
+        return result
+
+    def sum(self, name):
+        """
+        Soma uma coluna de todos os pacotes da visão, sem copiá-la.
+
+        Returns:
+            int: A soma (ex.: "packets" dá o total de pacotes, mesmo no modo de fluxos).
+        """
+        return sum(int(chunk[name][start:stop].sum()) for chunk, start, stop in self._slices(self.total - len(self), self.total))
+
+    def snapshot(self, since=0):
+        """
+        Copia as colunas dos pacotes da visão, em ordem de timestamp (ver PacketLogStore.snapshot).
+        """
+        size = len(self)
+        return self.range(size - max(0, min(size, self.total - since)), size)
+
+    def query(self, start=None, end=None):
+        """
+        Copia as colunas dos pacotes da visão com timestamp em [start, end) (ver PacketLogStore.query).
+        """
+        begin = 0 if start is None else self.search(start)
+        stop = len(self) if end is None else self.search(end)
+        return self.range(begin, stop)
+
+    def oldest(self):
+        """
+        Retorna o timestamp do pacote mais antigo da visão, ou None se ela estiver vazia.
+        """
+        if not self.total:
+            return None
+        return float(self.timestamp_at(self.total - len(self)))
+
+#############################
+# LOG EM BLOCOS COM COLUNAS TIPADAS
+#############################
+
+class PacketLogStore:
+    """
+    Log de pacotes com capacidade fixa, guardado em blocos de colunas NumPy.
+
+    A memória ocupada é limitada: os pacotes são acrescentados ao último bloco da
+    cadeia e, quando passam da capacidade, o bloco mais antigo é descartado inteiro.
+    O log é mantido ordenado por timestamp, de modo que a própria coluna de
+    timestamps serve de índice para as consultas por intervalo (ver query). As regras
+    não são guardadas por pacote; cada regra distinta entra uma única vez na tabela
+    rules e os pacotes guardam apenas o seu índice (rule_id).
+
+    Quem escreve deve segurar data.log_lock. Cada gravação publica uma LogView
+    imutável, então as leituras (view, snapshot, query e oldest) não precisam do lock:
+    o leitor nunca atrasa o escritor, nem é atrasado por ele.
+
+    Attributes:
+        capacity (int): Quantidade máxima de pacotes guardados.
+        chunk_rows (int): Linhas de cada bloco (LOG_CHUNK_ROWS, ou a capacidade, se menor).
+        total (int): Total de pacotes já gravados (inclusive os descartados).
+        rules (list): Tabela de regras referenciadas pelos pacotes (rule_id é o índice).
+        feed (list): Lotes gravados ainda não retirados por take_feed (None se desativado).
+        feed_dropped (int): Pacotes descartados do fluxo por falta de leitura.
+    """
+
+    def __init__(self, capacity=DEFAULT_LOG_CAPACITY):
+        if capacity < 1:
+            raise ValueError(f"capacidade do log inválida: {capacity}")
+        self.capacity = capacity
+        self.chunk_rows = min(LOG_CHUNK_ROWS, capacity)
+        self.total = 0
+        self._chunks = []
+        self._first_chunk = 0
+        self._view = LogView(0, capacity, self.chunk_rows, 0, ())
+        self.rules = []
+        self.feed = None
+        self.feed_dropped = 0
+        self._feed_count = 0
+        self._indexes = {name: [] for name in INDEXED_COLUMNS}
+        self._indexed = 0
+        self._rewritten = None
+        self._index_entries = 0
+        self._index_lock = threading.Lock()
+        self._rule_ids = {}
+        self._rule_objects = {}
+        self._rule_generation = None
+        self._rules_lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def rule_id(self, rule, generation=None):
+        """
+        Retorna o índice de uma regra na tabela de regras, registrando-a se for nova.
+
+        Regras são identificadas pelo conteúdo (ver regras.rule_key); para não
+        serializar a regra a cada pacote, o índice também é guardado pela identidade
+        do objeto, que é o mesmo para todos os pacotes de um snapshot. Esse cache é
+        descartado quando a geração das regras muda, para não manter vivas as regras
+        dos snapshots antigos.
+
+        Args:
+            rule (dict): A regra, ou None.
+            generation (int): Geração do snapshot de regras em uso (ver regras.get_snapshot).
+
+        Returns:
+            int: O índice da regra, ou -1 se rule for None.
+        """
+        if rule is None:
+            return -1
+        if generation != self._rule_generation:
+            with self._rules_lock:
+                self._rule_objects = {}
+                self._rule_generation = generation
+        cached = self._rule_objects.get(id(rule))
+        if cached is not None:
+            return cached[1]
+        with self._rules_lock:
+            index = self._register_rule(rule)
+            # Guarda a referência ao objeto para que o id não seja reaproveitado por outro
+            self._rule_objects[id(rule)] = (rule, index)
+        return index
+
+    def _register_rule(self, rule):
+        """
+        Retorna o índice de uma regra pelo conteúdo, acrescentando-a à tabela se for nova.
+        """
+        key = rule_key(rule)
+        index = self._rule_ids.get(key)
+        if index is None:
+            index = self._rule_ids[key] = len(self.rules)
+            self.rules.append(rule)
+        return index
+
+    def append(self, rows):
+        """
+        Grava um lote de pacotes no log, descartando os mais antigos se necessário.
+
+        Args:
+            rows (list): Tuplas com os campos na ordem de LOG_COLUMN_NAMES.
+        """
+        if not rows:
+            return
+        self.append_columns(dict(zip(LOG_COLUMN_NAMES, zip(*rows))), len(rows))
+
+    def append_columns(self, columns, count):
+        """
+        Grava um lote de pacotes já organizado em colunas, mantendo o log ordenado por timestamp.
+
+        Lotes que chegam fora de ordem (ex.: de outro processo de captura ou de outra
+        thread) são intercalados apenas com a cauda do log que é mais recente que eles.
+
+        Args:
+            columns (dict): Sequência (ou array) de valores para cada coluna de LOG_COLUMNS.
+            count (int): Quantidade de pacotes do lote.
+        """
+        if not count:
+            return
+        columns = {name: np.asarray(columns[name], dtype=dtype) for name, dtype in LOG_COLUMNS}
+        timestamps = columns["timestamp"]
+        if count > 1 and (timestamps[1:] < timestamps[:-1]).any():
+            order = np.argsort(timestamps, kind="stable")
+            columns = {name: values[order] for name, values in columns.items()}
+        if self.feed is not None:
+            self._feed_append(columns, count)
+
+        size = len(self)
+        if size == self.capacity and columns["timestamp"][0] < self.oldest():
+            # Com o log cheio, pacotes mais antigos que todos os guardados seriam descartados em seguida
+            keep = int(np.searchsorted(columns["timestamp"], self.oldest()))
+            columns = {name: values[keep:] for name, values in columns.items()}
+            count -= keep
+            if not count:
+                return
+        if size and columns["timestamp"][0] < self._view.timestamp_at(self.total - 1):
+            # Reescreve a cauda a partir do primeiro pacote mais recente que o lote, já intercalada
+            position = self.total - size + self._view.search(columns["timestamp"][0], "right")
+            tail = self.snapshot(since=position)
+            merged = {name: np.concatenate((tail[name], columns[name])) for name in columns}
+            order = np.argsort(merged["timestamp"], kind="stable")
+            columns = {name: values[order] for name, values in merged.items()}
+            count = len(order)
+            self._unshare(position)
+            self.total = position
+            # A cauda reescrita precisa ser indexada de novo (ver update_indexes)
+            self._rewritten = position if self._rewritten is None else min(self._rewritten, position)
+        self._write(columns, count)
+
+    def _write(self, columns, count):
+        """
+        Copia as colunas de um lote para os blocos, a partir da posição total, descarta os
+        blocos que saíram da capacidade e publica a nova visão.
+        """
+        if count > self.capacity:
+            # Só os pacotes mais recentes cabem no log
+            skip = count - self.capacity
+            columns = {name: values[skip:] for name, values in columns.items()}
+            self.total += skip
+            count = self.capacity
+            # O lote substitui o log inteiro
+            self._chunks = []
+        rows = self.chunk_rows
+        if not self._chunks:
+            self._first_chunk = self.total // rows
+        written = 0
+        while written < count:
+            number, offset = divmod(self.total, rows)
+            if number - self._first_chunk == len(self._chunks):
+                self._chunks.append({name: np.empty(rows, dtype=dtype) for name, dtype in LOG_COLUMNS})
+            chunk = self._chunks[number - self._first_chunk]
+            length = min(count - written, rows - offset)
+            for name, values in columns.items():
+                chunk[name][offset:offset + length] = values[written:written + length]
+            written += length
+            self.total += length
+        # Descarta os blocos cujas linhas já saíram todas da capacidade
+        oldest = self.total - len(self)
+        while (self._first_chunk + 1) * rows <= oldest:
+            self._chunks.pop(0)
+            self._first_chunk += 1
+        self._publish()
+
+    def _unshare(self, position):
+        """
+        Copia os blocos com linhas já publicadas a partir de position, antes de reescrevê-las
+        (copy-on-write); as visões publicadas continuam com os blocos originais.
+        """
+        rows = self.chunk_rows
+        for number in range(position // rows, (self._view.total - 1) // rows + 1):
+            index = number - self._first_chunk
+            self._chunks[index] = {name: column.copy() for name, column in self._chunks[index].items()}
+
+    def _publish(self):
+        """
+        Publica a visão do estado atual; a troca do atributo é atômica para os leitores.
+        """
+        self._view = LogView(self.total, self.capacity, self.chunk_rows, self._first_chunk, tuple(self._chunks))
+
+    def _reset(self):
+        """
+        Descarta todos os pacotes guardados e publica a visão vazia.
+        """
+        self.total = 0
+        self._chunks = []
+        self._first_chunk = 0
+        # As posições recomeçam do zero e precisam ser indexadas de novo
+        self._rewritten = 0
+        self._publish()
+
+    def view(self):
+        """
+        Retorna a visão imutável do log publicada na última gravação, em O(1) e sem o log_lock.
+
+        Returns:
+            LogView: A visão, que pode ser lida a qualquer momento sem mudar.
+        """
+        return self._view
+
+    def snapshot(self, since=0):
+        """
+        Copia as colunas dos pacotes guardados, em ordem de timestamp.
+
+        Lê a visão publicada (ver view), então não precisa do log_lock; a cópia é feita
+        coluna a coluna (cópias de memória contíguas, sem objetos por pacote).
+
+        Args:
+            since (int): Copia apenas os pacotes a partir desta posição de total.
+
+        Returns:
+            dict: Arrays de cada coluna de LOG_COLUMNS.
+        """
+        return self._view.snapshot(since)
+
+    def query(self, start=None, end=None):
+        """
+        Copia as colunas dos pacotes com timestamp no intervalo [start, end).
+
+        Como o log é mantido ordenado, a consulta é uma busca binária em cada ponta
+        seguida da cópia do trecho, proporcional ao tamanho da janela e não do log.
+        Lê a visão publicada (ver view), então não precisa do log_lock.
+
+        Args:
+            start (float): Início do intervalo (segundos desde a época Unix). Se None, sem limite.
+            end (float): Fim do intervalo (exclusivo). Se None, sem limite.
+
+        Returns:
+            dict: Arrays de cada coluna de LOG_COLUMNS, em ordem de timestamp.
+        """
+        return self._view.query(start, end)
+
+    def oldest(self):
+        """
+        Retorna o timestamp do pacote mais antigo guardado, ou None se o log estiver vazio.
+        """
+        return self._view.oldest()
+
+    #############################
+    # FLUXO DE PACOTES NOVOS
+    #############################
+
+    def enable_feed(self):
+        """
+        Passa a guardar, na ordem de chegada, os lotes gravados desde a última leitura de take_feed.
+
+        Usado por quem precisa de todos os pacotes novos exatamente uma vez (ex.: o arquivo
+        em disco), já que a intercalação de lotes fora de ordem reescreve a cauda do log.
+        """
+        if self.feed is None:
+            self.feed = []
+            self._feed_count = 0
+
+    def _feed_append(self, columns, count):
+        """
+        Guarda um lote no fluxo de pacotes novos, descartando os mais antigos além da capacidade.
+        """
+        self.feed.append(columns)
+        self._feed_count += count
+        while self._feed_count > self.capacity and len(self.feed) > 1:
+            dropped = self.feed.pop(0)
+            self._feed_count -= len(dropped["timestamp"])
+            self.feed_dropped += len(dropped["timestamp"])
+
+    def take_feed(self):
+        """
+        Retira os pacotes gravados desde a última chamada (ver enable_feed).
+
+        Returns:
+            dict: Arrays de cada coluna de LOG_COLUMNS, na ordem de chegada dos lotes.
+        """
+        batches = self.feed or []
+        if self.feed is not None:
+            self.feed = []
+            self._feed_count = 0
+        if not batches:
+            return {name: np.empty(0, dtype=dtype) for name, dtype in LOG_COLUMNS}
+        return {name: np.concatenate([batch[name] for batch in batches]) for name in LOG_COLUMN_NAMES}
+
+    #############################
+    # ÍNDICES INVERTIDOS
+    #############################
+
+    # Cada índice é uma lista de segmentos (values, positions): as posições (de total) de
+    # um lote de pacotes ordenadas pelo valor da coluna, de modo que as posições de um
+    # valor (ou de um intervalo de valores, como um prefixo de IP) são um trecho
+    # contíguo achado por busca binária. Os índices são atualizados de forma incremental
+    # por quem consulta, e nunca pelo caminho de captura: update_indexes segura o
+    # log_lock só para pegar a visão publicada e a menor posição reescrita desde a última
+    # indexação, copia e indexa as linhas novas da visão sem o lock, e só então avança a
+    # marca das linhas já indexadas. rows_at confere, na visão publicada, se as posições
+    # encontradas ainda guardam o valor buscado (o log pode ter descartado ou reordenado
+    # as linhas nesse meio tempo).
+
+    def update_indexes(self, lock):
+        """
+        Indexa as linhas gravadas (ou reescritas) desde a última indexação.
+
+        As indexações são serializadas por um lock próprio, então uma consulta que chega
+        durante a indexação de outra espera por ela em vez de usar índices incompletos.
+
+        Args:
+            lock (threading.Lock): Lock dos escritores do log (data.log_lock), preso apenas
+                                   para reservar o trecho a indexar.
+        """
+        with self._index_lock:
+            with lock:
+                view = self._view
+                rewritten = self._rewritten
+                self._rewritten = None
+            size = len(view)
+            oldest = view.total - size
+            indexed = self._indexed if rewritten is None else min(self._indexed, rewritten)
+            rebuild = self._index_entries + view.total - indexed > INDEX_REBUILD_FACTOR * self.capacity
+            base = oldest if rebuild else min(max(indexed, oldest), view.total)
+            # A visão é imutável: as linhas são copiadas e indexadas sem o log_lock
+            self._index_rows(base, view.range(base - oldest, size, INDEXED_COLUMNS), rebuild)
+            self._indexed = view.total
+
+    def _index_rows(self, base, columns, rebuild=False):
+        """
+        Acrescenta aos índices as linhas copiadas por update_indexes (com _index_lock preso).
+
+        Args:
+            base (int): Posição da primeira linha.
+            columns (dict): Colunas de INDEXED_COLUMNS.
+            rebuild (bool): Descarta os índices atuais antes de indexar.
+        """
+        count = len(columns["protocol"])
+        positions = np.arange(base, base + count, dtype=np.int64)
+        if rebuild:
+            self._indexes = {name: [] for name in INDEXED_COLUMNS}
+            self._index_entries = 0
+        if not count:
+            return
+        for name in INDEXED_COLUMNS:
+            segments = self._indexes[name]
+            segments.append(_index_segment(columns[name], positions))
+            if len(segments) > INDEX_MAX_SEGMENTS:
+                # Junta os segmentos para manter a busca em poucas buscas binárias
+                self._indexes[name] = [_index_segment(
+                    np.concatenate([segment[0] for segment in segments]),
+                    np.concatenate([segment[1] for segment in segments]),
+                )]
+        self._index_entries += count
+
+    def index_keys(self, name):
+        """
+        Retorna os valores distintos presentes no índice de uma coluna.
+
+        Returns:
+            ndarray: Os valores, ordenados (podem incluir valores que já saíram do log).
+        """
+        with self._index_lock:
+            segments = list(self._indexes[name])
+        if not segments:
+            return np.empty(0, dtype=LOG_COLUMN_TYPES[name])
+        return np.unique(np.concatenate([segment[2] for segment in segments]))
+
+    def postings(self, name, keys):
+        """
+        Retorna as posições candidatas dos pacotes com um dos valores em uma coluna indexada.
+
+        Args:
+            name (str): Coluna de INDEXED_COLUMNS.
+            keys (ndarray): Valores procurados.
+
+        Returns:
+            ndarray: Posições (podem incluir entradas obsoletas; ver rows_at).
+        """
+        keys = np.asarray(keys, dtype=LOG_COLUMN_TYPES[name])
+        return self._postings(name, keys, keys)
+
+    def postings_range(self, name, low, high):
+        """
+        Retorna as posições candidatas dos pacotes com valor em [low, high] em uma coluna
+        indexada (ex.: os IPs de um prefixo), com uma busca binária por segmento.
+
+        Returns:
+            ndarray: Posições (podem incluir entradas obsoletas; ver rows_at).
+        """
+        dtype = LOG_COLUMN_TYPES[name]
+        return self._postings(name, np.array([low], dtype=dtype), np.array([high], dtype=dtype))
+
+    def _postings(self, name, lows, highs):
+        """
+        Junta, de todos os segmentos do índice, as posições com valor em cada intervalo [lows[i], highs[i]].
+        """
+        with self._index_lock:
+            segments = list(self._indexes[name])
+        groups = []
+        for values, positions, _ in segments:
+            # Trecho [left, right) de cada intervalo procurado no segmento ordenado
+            left = np.searchsorted(values, lows, "left")
+            right = np.searchsorted(values, highs, "right")
+            lengths = right - left
+            found = lengths > 0
+            if not found.any():
+                continue
+            left, lengths = left[found], lengths[found]
+            # Expande os trechos em índices sem laço por valor
+            offsets = np.repeat(left - np.cumsum(lengths) + lengths, lengths)
+            groups.append(positions[offsets + np.arange(lengths.sum())])
+        return np.concatenate(groups) if groups else np.empty(0, dtype=np.int64)
+
+    def rows_at(self, positions, checks, start=None, end=None):
+        """
+        Copia as linhas de posições encontradas nos índices, descartando as obsoletas.
+
+        Lê a visão publicada (ver view), então não precisa do log_lock.
+
+        Args:
+            positions (ndarray): Posições candidatas (ver postings).
+            checks (dict): Valores aceitos por coluna, conferidos em cada posição: um array
+                           de valores ou uma tupla (low, high) com um intervalo inclusivo.
+            start (float): Início do intervalo de tempo. Se None, sem limite.
+            end (float): Fim do intervalo (exclusivo). Se None, sem limite.
+
+        Returns:
+            dict: Arrays de cada coluna de LOG_COLUMNS, em ordem de timestamp.
+        """
+        view = self._view
+        size = len(view)
+        oldest = view.total - size
+        first = oldest + (0 if start is None else view.search(start))
+        last = oldest + (size if end is None else view.search(end))
+        positions = np.unique(positions)
+        positions = positions[(positions >= first) & (positions < last)]
+        for name, keys in checks.items():
+            values = view.take(positions, (name,))[name]
+            if isinstance(keys, tuple):
+                positions = positions[(values >= keys[0]) & (values <= keys[1])]
+            else:
+                positions = positions[np.isin(values, keys)]
+        return view.take(positions)
+
+    def drain(self):
+        """
+        Retira todos os pacotes guardados, devolvendo as colunas e as regras referenciadas.
+
+        Usado pelos processos de captura para enviar os logs ao processo principal.
+
+        Returns:
+            tuple: Um par (columns, rules), com as colunas (ver snapshot) e a tabela de regras.
+        """
+        columns = self.snapshot()
+        self._reset()
+        return columns, list(self.rules)
+
+    def extend(self, columns, rules):
+        """
+        Grava pacotes vindos de outro log (ver drain), traduzindo os índices das regras.
+
+        Args:
+            columns (dict): Colunas dos pacotes.
+            rules (list): Tabela de regras do log de origem.
+        """
+        count = len(columns["timestamp"])
+        if not count:
+            return
+        columns = dict(columns)
+        columns["rule_id"] = self.rule_mapping(rules)[columns["rule_id"]]
+        self.append_columns(columns, count)
+
+    def rule_mapping(self, rules):
+        """
+        Registra a tabela de regras de outro log e retorna a tradução dos seus índices.
+
+        As regras chegam como cópias novas a cada lote, então não entram no cache por identidade.
+
+        Args:
+            rules (list): Tabela de regras do log de origem.
+
+        Returns:
+            ndarray: O índice nesta tabela de cada regra de origem, seguido de -1 (assim,
+                     o índice -1 de origem continua -1).
+        """
+        with self._rules_lock:
+            return np.array([self._register_rule(rule) for rule in rules] + [-1], dtype=np.int32)
+
+    def clear(self):
+        """
+        Descarta todos os pacotes guardados (a tabela de regras é mantida).
+        """
+        self._reset()
+
+    def to_dataframe(self, columns, rules=None):
+        """
+        Monta o DataFrame do dashboard a partir das colunas de um snapshot.
+
+        As colunas numéricas entram no DataFrame sem cópia; apenas os IPs são
+        convertidos para texto (usado nos filtros e gráficos), as ações e direções
+        viram categorias e rule_id é resolvido para a regra correspondente.
+
+        Args:
+            columns (dict): Colunas retornadas por snapshot.
+            rules (list): Tabela de regras referenciada por rule_id. Se None, usa a deste log.
+
+        Returns:
+            DataFrame: Uma linha por pacote (ou fluxo), com as colunas timestamp, src_ip, dst_ip,
+                       protocol, src_port, dst_port, length, tcp_flags, action, direction, rule,
+                       packets e duration.
+        """
+        protocol = columns["protocol"]
+        has_ports = np.isin(protocol, PORT_PROTOCOLS)
+        rules = self.rules if rules is None else rules
+        rule_table = np.empty(len(rules) + 1, dtype=object)
+        rule_table[:-1] = rules
+        rule_table[-1] = None
+        return pd.DataFrame({
+            "timestamp": columns["timestamp"],
+            "src_ip": ip_strings(columns["src_ip"]),
+            "dst_ip": ip_strings(columns["dst_ip"]),
+            "protocol": protocol,
+            # Portas só existem para TCP/UDP; nos demais protocolos ficam vazias
+            "src_port": pd.arrays.IntegerArray(columns["src_port"], ~has_ports),
+            "dst_port": pd.arrays.IntegerArray(columns["dst_port"], ~has_ports),
+            "length": columns["length"],
+            "tcp_flags": pd.arrays.IntegerArray(columns["tcp_flags"], protocol != 6),
+            "action": pd.Categorical.from_codes(columns["action"], ACTIONS),
+            "direction": pd.Categorical.from_codes(columns["direction"].astype(np.int8) - 1, DIRECTIONS[1:]),
+            "rule": rule_table[columns["rule_id"]],
+            "packets": columns["packets"],
+            "duration": columns["duration"],
+        }, copy=False)
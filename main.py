@@ -1,15 +1,60 @@
 # Importa as variáveis compartilhadas e o lock para sincronização de threads
-from data import log_lock, packet_logs, packet_stats
+from data import distinct_counters, heavy_hitters, log_lock, packet_logs, packet_stats, recent_frames, traffic_rollup
+
+# Importa os códigos de ação e direção usados nas colunas do log
+from logstore import ACTION_CODES, DIRECTION_CODES
+
+# Importa a agregação dos lotes de log nas séries de tráfego por segundo
+from rollup import rollup_counts
+
+# Importa a contagem dos lotes de log para os sketches dos IPs e portas mais ativos e distintos
+from sketches import batch_columns, distinct_counts, heavy_hitter_counts
+
+# Importa a tabela de fluxos usada no modo de fluxos dos logs
+from flows import FlowTable, DEFAULT_FLOW_IDLE_TIMEOUT, DEFAULT_FLOW_ACTIVE_TIMEOUT
 
 # Importa as funções para carregar e aplicar regras do firewall
-from regras import load_rules, apply_rules, get_rules
+from regras import load_rules, apply_rules_header, extract_header, packet_length
+
+# Importa o módulo de regras para publicar as regras e trocar os contadores nos processos de captura
+import regras
+
+# Importa o decodificador de cabeçalhos a partir dos bytes brutos dos quadros
+from decoder import PacketRecord, decode_frame, LINKTYPE_ETHERNET
+
+# Importa as máscaras de prefixo usadas para identificar os endereços da LAN
+from cidr import PREFIX_MASKS
 
 # Importa as funções principais da biblioteca Scapy para captura e manipulação de pacotes
-from scapy.all import sniff, IP, TCP, UDP
+from scapy.all import sniff, TCP
+
+# Importa o anel de recepção TPACKET_V3 (captura por blocos mapeados em memória)
+from capture import PacketRing, socket_statistics, ETH_P_ALL, RING_BLOCK_SIZE, RING_BLOCK_COUNT, RING_BLOCK_TIMEOUT_MS
+
+# Importa socket para a captura de quadros brutos (AF_PACKET)
+import socket
 
 # Importa a biblioteca time para registrar timestamps
 import time
 
+# Importa multiprocessing para distribuir a captura entre vários processos
+import multiprocessing
+
+# Importa os para obter o PID usado como identificador do grupo de fanout
+import os
+
+# Importa queue para a exceção de fila vazia
+import queue
+
+# Importa threading para manter um lote de logs por thread de captura
+import threading
+
+# Importa o histograma para medir a espera pelo log_lock
+from metrics import LatencyHistogram
+
+# Importa a fila limitada entre a etapa de captura e a de avaliação
+from pipeline import PacketQueue, DEFAULT_QUEUE_SIZE, DEFAULT_POLICY, DEFAULT_SAMPLE_RATE
+
 #############################
 # CARREGAMENTO INICIAL DAS REGRAS DO FIREWALL
 #############################
@@ -18,79 +63,743 @@ import time
 load_rules()
 
 #############################
-# FUNÇÃO PARA PROCESSAR PACOTES
+# CONFIGURAÇÃO DA CAPTURA
 #############################
 
-def packet_handler(packet):
-    """
-    Processa um pacote capturado, aplica as regras do firewall e registra o resultado nos logs.
+# Modos de captura disponíveis:
+# - "ring": percorre blocos de quadros de um anel TPACKET_V3 mapeado em memória (Linux)
+# - "raw": lê quadros brutos de um socket AF_PACKET, um recv por quadro (Linux)
+# - "scapy": usa o sniff da Scapy, que disseca cada pacote por completo
+# Nos modos "ring" e "raw", apenas os cabeçalhos são decodificados (decoder.decode_frame)
+CAPTURE_MODES = ("ring", "raw", "scapy")
 
-    Args:
-        packet: O pacote capturado pela Scapy.
+# Modo de captura padrão: o anel mapeado em memória, quando o sistema oferece AF_PACKET
+CAPTURE_MODE = "ring" if hasattr(socket, "AF_PACKET") else "scapy"
+
+# Quantidade de processos de captura no modo "ring". Com mais de um, os processos
+# formam um grupo PACKET_FANOUT e o kernel distribui os fluxos entre eles por hash;
+# cada processo avalia as regras sozinho, sem disputar o GIL com os demais
+CAPTURE_WORKERS = 1
+
+# Intervalo, em segundos, com que cada processo envia seus logs e contadores ao processo principal
+WORKER_FLUSH_INTERVAL = 0.25
+
+# Quantidade máxima de pacotes acumulados no lote de uma thread antes de gravá-lo nos logs
+LOG_BATCH_SIZE = 256
+
+# Tempo máximo, em milissegundos, que um pacote espera no lote antes de aparecer nos logs
+LOG_BATCH_LATENCY_MS = 50
+
+# Grava nos logs um registro por fluxo (5-tupla) em vez de um por pacote (ver flows.FlowTable)
+FLOW_LOGGING = False
+
+# Tempos que encerram um fluxo no modo de fluxos: inatividade e duração máxima, em segundos
+FLOW_IDLE_TIMEOUT = DEFAULT_FLOW_IDLE_TIMEOUT
+FLOW_ACTIVE_TIMEOUT = DEFAULT_FLOW_ACTIVE_TIMEOUT
+
+# Capacidade da fila entre a captura e a avaliação, em pacotes (0 avalia cada pacote
+# na própria thread de captura, sem fila)
+EVALUATION_QUEUE_SIZE = DEFAULT_QUEUE_SIZE
+
+# Política de transbordo da fila de avaliação (ver pipeline.OVERFLOW_POLICIES)
+EVALUATION_QUEUE_POLICY = DEFAULT_POLICY
+
+# Taxa de amostragem da política "sample"
+EVALUATION_QUEUE_SAMPLE_RATE = DEFAULT_SAMPLE_RATE
+
+# Tamanho do buffer de recepção (maior que qualquer quadro, inclusive com offload de segmentação)
+RECV_BUFFER_SIZE = 65536
+
+# No modo "raw", os descartes do kernel são lidos a cada RAW_STATISTICS_INTERVAL quadros
+RAW_STATISTICS_INTERVAL = 1024
+
+# Redes consideradas LAN na determinação da direção, como pares (rede, tamanho do prefixo)
+# (equivalem aos prefixos "192.168.", "10.", "172.16." e "172.31.")
+LAN_NETWORKS = (
+    (0xC0A80000, 16),
+    (0x0A000000, 8),
+    (0xAC100000, 16),
+    (0xAC1F0000, 16),
+)
+
+#############################
+# LOTES DE LOGS POR THREAD
+#############################
+
+# Histograma da espera pelo log_lock em cada gravação de lote, em nanossegundos
+lock_wait_histogram = LatencyHistogram()
+
+# Lotes de cada thread de captura (ver LogBatch)
+_batches = threading.local()
+
+class LogBatch:
     """
-    # Aplica as regras do firewall ao pacote capturado usando as regras mais recentes
-    action, rule = apply_rules(packet)
+    Lote de entradas de log e contadores de uma thread de captura.
 
-    #############################
-    # DETERMINAÇÃO DA DIREÇÃO DO PACOTE
-    #############################
+    As entradas são acumuladas sem lock e gravadas nos logs compartilhados (data.py)
+    com uma única aquisição do log_lock, quando o lote atinge LOG_BATCH_SIZE pacotes
+    ou quando o pacote mais antigo espera LOG_BATCH_LATENCY_MS, o que vier primeiro.
 
-    # Verifica se o pacote contém o protocolo IP
-    if IP in packet:
-        # Determina se o pacote foi enviado ou recebido com base no endereço IP de origem
-        if packet[IP].src.startswith(("192.168.", "10.", "172.16.", "172.31.")):
-            direction = "sent"  # Pacote enviado pela LAN (rede local)
-        else:
-            direction = "received"  # Pacote recebido pela WAN (rede externa)
-    else:
-        direction = None  # Caso o pacote não contenha IP, a direção é indefinida
+    No modo de fluxos (ver configure_flow_logging), os pacotes são somados à tabela de
+    fluxos da thread e só os fluxos encerrados viram linhas de log; as séries de
+    tráfego e as estatísticas continuam contando cada pacote.
 
-    #############################
-    # ATUALIZAÇÃO DAS ESTATÍSTICAS DE PACOTES
-    #############################
+    Attributes:
+        packets (list): Linhas de log dos pacotes pendentes (ver logstore.LOG_COLUMNS).
+        logs (list): Linhas de log pendentes: os próprios pacotes, ou os fluxos encerrados no modo de fluxos.
+        flows (FlowTable): Tabela de fluxos da thread, ou None no modo por pacote.
+        frames (list): Quadros brutos pendentes, como tuplas (timestamp, linktype, bytes).
+        sent (int): Pacotes enviados pendentes.
+        received (int): Pacotes recebidos pendentes.
+        drops (dict): Descartes pendentes por etapa ("kernel", "queue").
+        started (float): Instante (time.monotonic) da entrada mais antiga pendente.
+        flushes (int): Quantidade de gravações feitas por este lote.
+    """
 
-    # Usa o log_lock para garantir que a atualização das estatísticas seja thread-safe
-    with log_lock:
+    def __init__(self, flows=None):
+        self.flows = flows
+        self.packets = []
+        self.logs = self.packets if flows is None else []
+        self.frames = []
+        self.sent = 0
+        self.received = 0
+        self.drops = {}
+        self.started = None
+        self.flushes = 0
+
+    def add(self, log_entry, direction, frame=None, linktype=LINKTYPE_ETHERNET):
+        """
+        Acrescenta uma linha de log ao lote.
+
+        Args:
+            log_entry (tuple): Linha de log do pacote, com o timestamp na primeira posição.
+            direction (str): Direção do pacote ("sent", "received" ou None).
+            frame (bytes): Quadro bruto, guardado para a visualização detalhada (opcional).
+            linktype (int): Tipo de enlace do quadro bruto.
+        """
+        if self.started is None:
+            self.started = time.monotonic()
+        self.packets.append(log_entry)
+        if self.flows is not None:
+            expired = self.flows.add(log_entry)
+            if expired:
+                self.logs.extend(expired)
         if direction == "sent":
-            packet_stats["sent"] += 1  # Incrementa o contador de pacotes enviados
+            self.sent += 1
         elif direction == "received":
-            packet_stats["received"] += 1  # Incrementa o contador de pacotes recebidos
+            self.received += 1
+        if frame is not None:
+            self.frames.append((log_entry[0], linktype, frame))
+
+    def add_drops(self, stage, count):
+        """
+        Acrescenta ao lote os pacotes descartados em uma etapa do processamento.
+
+        Args:
+            stage (str): Etapa do descarte ("kernel" ou "queue").
+            count (int): Quantidade de pacotes descartados.
+        """
+        if self.started is None:
+            self.started = time.monotonic()
+        self.drops[stage] = self.drops.get(stage, 0) + count
+
+    def expire_flows(self, now=None):
+        """
+        Acrescenta ao lote os fluxos encerrados pela tabela de fluxos até now.
+
+        Args:
+            now (float): Instante atual. Se None, encerra todos os fluxos em aberto
+                         (ex.: ao fim da captura).
+        """
+        if self.flows is None:
+            return
+        expired = self.flows.expire_all() if now is None else self.flows.advance(now)
+        if expired:
+            if self.started is None:
+                self.started = time.monotonic()
+            self.logs.extend(expired)
+
+    def due(self):
+        """
+        Indica se o lote atingiu o tamanho ou a espera máxima configurados.
+
+        Returns:
+            bool: True se o lote deve ser gravado.
+        """
+        if self.started is None:
+            return False
+        return (len(self.packets) >= LOG_BATCH_SIZE
+                or (time.monotonic() - self.started) * 1000 >= LOG_BATCH_LATENCY_MS)
+
+    def flush(self):
+        """
+        Grava o lote nos logs, séries de tráfego e estatísticas compartilhados, com uma
+        única aquisição do log_lock, e registra o tempo de espera pelo lock em lock_wait_histogram.
+        """
+        if self.started is None:
+            return
+        # Agrega os pacotes por segundo e conta os valores dos sketches antes de pegar o lock;
+        # sob o lock só os contadores são somados
+        counts = rollup_counts(self.packets)
+        columns = batch_columns(self.packets)
+        hitters = heavy_hitter_counts(columns)
+        distinct = distinct_counts(columns)
+        start = time.perf_counter_ns()
+        with log_lock:
+            lock_wait_histogram.record(time.perf_counter_ns() - start)
+            packet_stats["sent"] += self.sent  # Soma os pacotes enviados do lote
+            packet_stats["received"] += self.received  # Soma os pacotes recebidos do lote
+            packet_logs.append(self.logs)  # Grava as linhas do lote nas colunas do log compartilhado
+            traffic_rollup.update(counts)  # Soma o lote às séries de tráfego do dashboard
+            heavy_hitters.update(hitters)  # Soma o lote aos sketches dos maiores emissores e destinos
+            distinct_counters.update(distinct)  # Une o lote às contagens de IPs e portas distintos
+            recent_frames.extend(self.frames)
+            for stage, count in self.drops.items():
+                packet_stats[f"lost_{stage}"] += count  # Descartes por etapa
+                packet_stats["lost"] += count  # Total de pacotes perdidos
+        self.packets = []
+        self.logs = self.packets if self.flows is None else []
+        self.frames = []
+        self.sent = self.received = 0
+        self.drops = {}
+        self.started = None
+        self.flushes += 1
+
+def _thread_batch():
+    """
+    Retorna o lote da thread atual, criando-o na primeira chamada.
+    """
+    batch = getattr(_batches, "batch", None)
+    if batch is None:
+        flows = FlowTable(FLOW_IDLE_TIMEOUT, FLOW_ACTIVE_TIMEOUT) if FLOW_LOGGING else None
+        batch = _batches.batch = LogBatch(flows)
+    return batch
+
+def flush_log_batch(force=True):
+    """
+    Grava o lote de logs pendente da thread atual.
+
+    No modo de fluxos, também encerra os fluxos vencidos (ou todos, se force for True,
+    como ao fim da captura), mesmo quando não chegam pacotes.
+
+    Args:
+        force (bool): Se False, grava apenas se o lote já atingiu o tamanho ou a espera máxima.
+    """
+    batch = _thread_batch()
+    batch.expire_flows(None if force else time.time())
+    if force or batch.due():
+        batch.flush()
+
+def configure_log_batching(max_packets=LOG_BATCH_SIZE, max_latency_ms=LOG_BATCH_LATENCY_MS):
+    """
+    Ajusta o tamanho e a espera máxima dos lotes de logs.
+
+    Args:
+        max_packets (int): Pacotes por lote (1 grava cada pacote imediatamente).
+        max_latency_ms (float): Espera máxima de um pacote no lote, em milissegundos.
+
+    Raises:
+        ValueError: Se algum dos valores for inválido.
+    """
+    global LOG_BATCH_SIZE, LOG_BATCH_LATENCY_MS
+    if max_packets < 1 or max_latency_ms < 0:
+        raise ValueError(f"configuração de lote inválida: {max_packets} pacotes, {max_latency_ms} ms")
+    LOG_BATCH_SIZE = max_packets
+    LOG_BATCH_LATENCY_MS = max_latency_ms
+
+def configure_flow_logging(enabled=True, idle_timeout=FLOW_IDLE_TIMEOUT, active_timeout=FLOW_ACTIVE_TIMEOUT):
+    """
+    Liga ou desliga o modo de fluxos dos logs, usado pelas threads de captura iniciadas depois.
+
+    No modo de fluxos, cada linha do log é um fluxo (ver flows.FlowTable) em vez de um
+    pacote, gravada quando o fluxo fica inativo por idle_timeout ou dura active_timeout.
+
+    Args:
+        enabled (bool): True grava fluxos; False grava um registro por pacote.
+        idle_timeout (float): Tempo sem pacotes que encerra um fluxo, em segundos.
+        active_timeout (float): Duração máxima de um fluxo antes de ser gravado, em segundos.
+
+    Raises:
+        ValueError: Se algum dos tempos for inválido.
+    """
+    global FLOW_LOGGING, FLOW_IDLE_TIMEOUT, FLOW_ACTIVE_TIMEOUT
+    # Valida a configuração criando uma tabela de teste
+    FlowTable(idle_timeout, active_timeout)
+    FLOW_LOGGING = enabled
+    FLOW_IDLE_TIMEOUT = idle_timeout
+    FLOW_ACTIVE_TIMEOUT = active_timeout
+
+def configure_evaluation_queue(size=DEFAULT_QUEUE_SIZE, policy=DEFAULT_POLICY, sample_rate=DEFAULT_SAMPLE_RATE):
+    """
+    Ajusta a fila entre a captura e a avaliação usada pelas próximas capturas iniciadas.
+
+    Args:
+        size (int): Capacidade da fila em pacotes (0 desativa a fila).
+        policy (str): Política de transbordo ("drop_newest", "drop_oldest" ou "sample").
+        sample_rate (int): Na política "sample", aceita 1 a cada sample_rate pacotes com a fila cheia.
+
+    Raises:
+        ValueError: Se algum dos valores for inválido.
+    """
+    global EVALUATION_QUEUE_SIZE, EVALUATION_QUEUE_POLICY, EVALUATION_QUEUE_SAMPLE_RATE
+    if size:
+        # Valida a configuração criando uma fila de teste
+        PacketQueue(size, policy, sample_rate)
+    elif size < 0:
+        raise ValueError(f"capacidade da fila inválida: {size}")
+    EVALUATION_QUEUE_SIZE = size
+    EVALUATION_QUEUE_POLICY = policy
+    EVALUATION_QUEUE_SAMPLE_RATE = sample_rate
+
+def get_lock_wait_stats():
+    """
+    Retorna o resumo da espera pelo log_lock nas gravações de lotes, em microssegundos.
+
+    Returns:
+        dict: Ver LatencyHistogram.summary.
+    """
+    return lock_wait_histogram.summary()
+
+#############################
+# FUNÇÕES PARA PROCESSAR PACOTES
+#############################
+
+def packet_direction(src_ip):
+    """
+    Determina a direção de um pacote a partir do endereço IP de origem.
+
+    Args:
+        src_ip (int): Endereço IP de origem como inteiro, ou None.
+
+    Returns:
+        str: "sent" se a origem for da LAN, "received" caso contrário, ou None sem IP.
+    """
+    if src_ip is None:
+        return None  # Caso o pacote não contenha IP, a direção é indefinida
+    for network, length in LAN_NETWORKS:
+        if src_ip & PREFIX_MASKS[length] == network:
+            return "sent"  # Pacote enviado pela LAN (rede local)
+    return "received"  # Pacote recebido pela WAN (rede externa)
+
+def record_handler(record, frame=None, linktype=LINKTYPE_ETHERNET, timestamp=None):
+    """
+    Processa o registro compacto de um pacote, aplica as regras do firewall e registra o resultado nos logs.
+
+    Args:
+        record (PacketRecord): Registro produzido por decoder.decode_frame.
+        frame (bytes): Quadro bruto, guardado para a visualização detalhada (opcional).
+        linktype (int): Tipo de enlace do quadro bruto.
+        timestamp (float): Instante de captura. Se None, usa o instante atual.
+
+    Returns:
+        tuple: O par (action, rule) aplicado ao pacote (ver regras.apply_rules).
+    """
+    header = record.header
+    src_ip, dst_ip, protocol, src_port, dst_port = header
+
+    # Aplica as regras do firewall ao cabeçalho usando as regras mais recentes
+    action, rule = apply_rules_header(header, record.length)
+
+    # Determina se o pacote foi enviado ou recebido
+    direction = packet_direction(src_ip)
 
     #############################
     # CRIAÇÃO DE UMA ENTRADA DE LOG
     #############################
 
-    # Cria uma entrada de log com as informações do pacote capturado
-    log_entry = {
-        "timestamp": time.time(),  # Marca o timestamp atual (em segundos desde a época Unix)
-        "src_ip": packet[IP].src if IP in packet else None,  # Endereço IP de origem
-        "dst_ip": packet[IP].dst if IP in packet else None,  # Endereço IP de destino
-        "protocol": packet[IP].proto if IP in packet else None,  # Protocolo (TCP, UDP, etc.)
-        "src_port": packet[TCP].sport if TCP in packet else (packet[UDP].sport if UDP in packet else None),  # Porta de origem
-        "dst_port": packet[TCP].dport if TCP in packet else (packet[UDP].dport if UDP in packet else None),  # Porta de destino
-        "action": action,  # Ação aplicada ao pacote ("allowed" ou "blocked")
-        "direction": direction,  # Direção do pacote ("sent" ou "received")
-        "rule": rule  # Adiciona a regra que causou a ação (None se permitido)
-    }
+    # Cria uma linha de log com as informações do pacote capturado, na ordem das colunas
+    # de logstore.LOG_COLUMNS (campos ausentes viram 0; a conversão para texto fica para o dashboard)
+    if timestamp is None:
+        timestamp = time.time()
+    log_entry = (
+        timestamp,  # Marca o timestamp atual (em segundos desde a época Unix)
+        src_ip or 0,  # Endereço IP de origem (inteiro)
+        dst_ip or 0,  # Endereço IP de destino (inteiro)
+        src_port or 0,  # Porta de origem
+        dst_port or 0,  # Porta de destino
+        protocol or 0,  # Protocolo (TCP, UDP, etc.)
+        record.length,  # Tamanho do pacote IP em bytes
+        record.tcp_flags or 0,  # Flags TCP (0 se não for TCP)
+        ACTION_CODES[action],  # Ação aplicada ao pacote ("allowed" ou "blocked")
+        DIRECTION_CODES[direction],  # Direção do pacote ("sent", "received" ou None)
+        packet_logs.rule_id(rule, regras.get_snapshot().generation),  # Índice da regra que causou a ação (-1 se nenhuma)
+        1,  # Quantidade de pacotes da linha
+        0.0,  # Duração da linha (um único pacote)
+    )
 
     #############################
-    # ADIÇÃO DO LOG À LISTA COMPARTILHADA
+    # ACÚMULO NO LOTE DA THREAD
     #############################
 
-    # Usa o log_lock para garantir que a adição ao log seja thread-safe
-    with log_lock:
-        packet_logs.append(log_entry)  # Adiciona a entrada de log à lista compartilhada
+    # A entrada vai para o lote da thread; o log compartilhado é atualizado uma vez por lote
+    batch = _thread_batch()
+    batch.add(log_entry, direction, frame, linktype)
+    if batch.due():
+        batch.flush()
+    return action, rule
+
+def packet_handler(packet):
+    """
+    Processa um pacote capturado pela Scapy, convertendo-o no mesmo registro compacto
+    do caminho rápido antes de aplicar as regras.
+
+    A Scapy só chama esta função quando chega um pacote, então um lote parcial é
+    gravado no pacote seguinte à espera máxima (LOG_BATCH_LATENCY_MS).
+
+    Args:
+        packet: O pacote capturado pela Scapy.
+
+    Returns:
+        tuple: O par (action, rule) aplicado ao pacote.
+    """
+    tcp_flags = int(packet[TCP].flags) if TCP in packet else None
+    record = PacketRecord(extract_header(packet), packet_length(packet), tcp_flags)
+    return record_handler(record, timestamp=float(packet.time))
+
+def frame_handler(item):
+    """
+    Decodifica um quadro bruto capturado e o processa (ver record_handler).
+
+    Args:
+        item (tuple): Tupla (timestamp, frame, linktype) com o instante de captura, o
+                      quadro em bytes e o tipo de enlace.
+
+    Returns:
+        tuple: O par (action, rule) aplicado, ou None se o quadro não for IPv4.
+    """
+    timestamp, frame, linktype = item
+    record = decode_frame(frame, linktype)
+    if record is None:
+        return None
+    return record_handler(record, frame, linktype, timestamp)
+
+def decoded_handler(item):
+    """
+    Processa um pacote já decodificado pela thread de captura (ver record_handler).
+
+    Args:
+        item (tuple): Tupla (timestamp, record, frame) com o instante de captura, o registro
+                      do pacote e o quadro Ethernet em bytes (None se não for guardado).
+
+    Returns:
+        tuple: O par (action, rule) aplicado ao pacote.
+    """
+    timestamp, record, frame = item
+    return record_handler(record, frame, LINKTYPE_ETHERNET, timestamp)
+
+#############################
+# ETAPA DE AVALIAÇÃO
+#############################
+
+def _evaluation_loop(packet_queue, handler):
+    """
+    Função executada pela thread de avaliação: retira lotes de pacotes da fila, os
+    processa e contabiliza os descartes da fila em packet_stats["lost_queue"].
+    """
+    reported = 0
+    while True:
+        for item in packet_queue.get_batch(LOG_BATCH_SIZE, LOG_BATCH_LATENCY_MS / 1000 or 0.05):
+            handler(item)
+        dropped = packet_queue.dropped
+        if dropped != reported:
+            _thread_batch().add_drops("queue", dropped - reported)
+            reported = dropped
+        flush_log_batch(force=False)
+
+def start_evaluation_stage(handler, queued=None):
+    """
+    Inicia a etapa de avaliação separada da captura, ligadas por uma fila limitada.
+
+    A thread de captura apenas coloca os pacotes na fila (PacketQueue.put); uma thread
+    de avaliação os retira e chama handler. Se a avaliação ficar para trás, a fila
+    aplica a política de transbordo configurada e os descartes são contados.
+
+    Args:
+        handler (function): Função que processa cada item da fila (ex.: frame_handler).
+        queued (bool): Se False, não usa fila. Se None, usa fila se EVALUATION_QUEUE_SIZE > 0.
+
+    Returns:
+        function: A função que a captura deve chamar para cada pacote (PacketQueue.put,
+                  ou o próprio handler quando não há fila).
+    """
+    if queued is None:
+        queued = EVALUATION_QUEUE_SIZE > 0
+    if not queued:
+        return handler
+    packet_queue = PacketQueue(EVALUATION_QUEUE_SIZE, EVALUATION_QUEUE_POLICY, EVALUATION_QUEUE_SAMPLE_RATE)
+    threading.Thread(target=_evaluation_loop, args=(packet_queue, handler), daemon=True).start()
+    return packet_queue.put
+
+#############################
+# FUNÇÕES PARA CAPTURAR PACOTES
+#############################
+
+def sniff_raw(interface=None, queued=None):
+    """
+    Captura quadros brutos de um socket AF_PACKET e os processa sem dissecá-los com a Scapy.
+
+    Cada quadro é lido em um buffer reutilizado e copiado para a etapa de avaliação;
+    apenas os cabeçalhos IPv4/TCP/UDP são decodificados (decoder.decode_frame) e quadros
+    que não são IPv4 são descartados, como faria o filtro "ip" do modo Scapy. Os
+    descartes do buffer do socket (PACKET_STATISTICS) são somados a packet_stats["lost_kernel"].
+
+    Args:
+        interface (str): Interface de rede a ser capturada. Se None, captura todas.
+        queued (bool): Usa a fila de avaliação (ver start_evaluation_stage).
+    """
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+    if interface is not None:
+        sock.bind((interface, 0))
+
+    # O tempo limite de recepção garante que o lote pendente seja gravado mesmo sem tráfego
+    sock.settimeout(LOG_BATCH_LATENCY_MS / 1000 or None)
+
+    # A etapa de avaliação só é iniciada com o socket pronto; se ele falhar, a captura
+    # passa para a Scapy sem deixar uma thread de avaliação sem uso
+    submit = start_evaluation_stage(frame_handler, queued)
+
+    def update_statistics():
+        _, dropped = socket_statistics(sock)
+        if dropped:
+            _thread_batch().add_drops("kernel", dropped)
+        flush_log_batch(force=False)
+
+    buffer = bytearray(RECV_BUFFER_SIZE)
+    view = memoryview(buffer)
+    received = 0
+    try:
+        while True:
+            try:
+                size = sock.recv_into(buffer)
+            except socket.timeout:
+                update_statistics()
+                continue
+            submit((time.time(), bytes(view[:size]), LINKTYPE_ETHERNET))
+            received += 1
+            if received % RAW_STATISTICS_INTERVAL == 0:
+                update_statistics()
+    finally:
+        flush_log_batch()
+        sock.close()
+
+def sniff_ring(interface=None, block_size=RING_BLOCK_SIZE, block_count=RING_BLOCK_COUNT,
+               block_timeout_ms=RING_BLOCK_TIMEOUT_MS, fanout_group=None, on_wakeup=None, queued=None):
+    """
+    Captura quadros por um anel TPACKET_V3 mapeado em memória, processando um bloco
+    inteiro de quadros a cada despertar, sem uma chamada de sistema por quadro.
+
+    Os cabeçalhos são decodificados direto do anel, antes de o bloco ser devolvido ao
+    kernel, e a etapa de avaliação recebe apenas os registros. Só os quadros que podem
+    ficar guardados para a visualização detalhada (os últimos recent_frames.maxlen de
+    cada bloco, ver data.recent_frames) são copiados para fora do anel.
+
+    A cada bloco, os descartes do kernel (PACKET_STATISTICS) são somados a
+    packet_stats["lost_kernel"] e packet_stats["lost"].
+
+    Args:
+        interface (str): Interface de rede a ser capturada. Se None, captura todas.
+        block_size (int): Tamanho de cada bloco do anel em bytes.
+        block_count (int): Quantidade de blocos do anel.
+        block_timeout_ms (int): Tempo máximo para o kernel entregar um bloco parcialmente cheio.
+        fanout_group (int): Grupo PACKET_FANOUT a que o anel se junta (ver capture.PacketRing).
+        on_wakeup (function): Chamada sem argumentos a cada despertar, com ou sem bloco
+                              pronto (usada pelos processos de captura para enviar os logs).
+        queued (bool): Usa a fila de avaliação (ver start_evaluation_stage).
+    """
+    ring = PacketRing(interface, block_size, block_count, block_timeout_ms, fanout_group=fanout_group)
+    # A etapa de avaliação só é iniciada com o anel pronto (ver sniff_raw)
+    submit = start_evaluation_stage(decoded_handler, queued)
+    try:
+        while True:
+            if ring.wait():
+                for number, (timestamp, frame) in enumerate(ring.read_block()):
+                    record = decode_frame(frame, LINKTYPE_ETHERNET)
+                    if record is None:
+                        continue
+                    # Os quadros anteriores aos últimos do bloco sairiam de recent_frames
+                    # de qualquer forma; só os demais são copiados antes de o bloco ser devolvido
+                    kept = bytes(frame) if number >= ring.block_frames - recent_frames.maxlen else None
+                    submit((timestamp, record, kept))
+                _, dropped = ring.update_statistics()
+                if dropped:
+                    _thread_batch().add_drops("kernel", dropped)
+            # Grava o lote pendente se ele já esperou o suficiente, mesmo sem novos quadros
+            flush_log_batch(force=False)
+            if on_wakeup is not None:
+                on_wakeup()
+    finally:
+        flush_log_batch()
+        ring.close()
 
 #############################
-# FUNÇÃO PARA CAPTURAR PACOTES
+# CAPTURA EM VÁRIOS PROCESSOS (PACKET_FANOUT)
 #############################
 
-def sniff_packets():
+def _drain_worker_output():
+    """
+    Retira os logs, contadores e quadros acumulados no processo de captura atual.
+
+    Returns:
+        tuple: (logs, rollup, hitters, distinct, stats, frames, rule_stats, latency_histogram,
+               lock_wait_histogram), prontos para envio; logs é o par (columns, rules) retornado por
+               PacketLogStore.drain, rollup é o par (newest, buckets) retornado por TrafficRollup.drain,
+               e hitters e distinct são os pares retornados por HeavyHitters.drain e DistinctCounters.drain.
+    """
+    global lock_wait_histogram
+    with log_lock:
+        logs = packet_logs.drain()
+        rollup = traffic_rollup.drain()
+        hitters = heavy_hitters.drain()
+        distinct = distinct_counters.drain()
+        stats = dict(packet_stats)
+        for key in packet_stats:
+            packet_stats[key] = 0
+        frames = list(recent_frames)
+        recent_frames.clear()
+    # Troca os contadores do motor de regras; os anteriores seguem para o processo principal
+    rule_stats, histogram = regras.rule_stats, regras.latency_histogram
+    regras.reset_rule_stats()
+    lock_wait, lock_wait_histogram = lock_wait_histogram, LatencyHistogram()
+    return logs, rollup, hitters, distinct, stats, frames, rule_stats, histogram, lock_wait
+
+def _capture_worker(output, control, interface, fanout_group, ring_options, flow_options):
     """
-    Captura pacotes de rede em tempo real e os processa usando a função packet_handler.
+    Função executada em cada processo de captura: captura a sua parte do tráfego do
+    grupo de fanout, aplica as regras e envia periodicamente os logs e contadores.
+
+    Args:
+        output (Queue): Fila para o processo principal.
+        control (Queue): Fila com as regras publicadas no processo principal, como pares (rules, engine).
+        interface (str): Interface de rede a ser capturada.
+        fanout_group (int): Grupo PACKET_FANOUT compartilhado pelos processos.
+        ring_options (dict): Opções do anel (ver sniff_ring).
+        flow_options (tuple): Configuração do modo de fluxos do processo principal (ver configure_flow_logging).
+    """
+    # O processo novo não herda a configuração feita em tempo de execução no processo principal
+    configure_flow_logging(*flow_options)
+    last_flush = time.monotonic()
+
+    def on_wakeup():
+        nonlocal last_flush
+        # Aplica as regras publicadas no processo principal desde o último despertar
+        try:
+            while True:
+                rules, engine = control.get_nowait()
+                if engine != regras.get_rule_engine():
+                    regras.configure_rule_engine(engine)
+                regras.publish_rules(rules)
+        except queue.Empty:
+            pass
+
+        now = time.monotonic()
+        if now - last_flush >= WORKER_FLUSH_INTERVAL:
+            last_flush = now
+            output.put(_drain_worker_output())
+
+    # Cada processo avalia os quadros na própria thread de captura: o anel do kernel já é
+    # o buffer limitado do processo, e os contadores são trocados com segurança em on_wakeup
+    sniff_ring(interface, fanout_group=fanout_group, on_wakeup=on_wakeup, queued=False, **ring_options)
+
+def _merge_worker_output(logs, rollup, hitters, distinct, stats, frames, rule_stats, histogram, lock_wait):
+    """
+    Incorpora a saída de um processo de captura aos logs e contadores lidos pelo dashboard.
+    """
+    with log_lock:
+        packet_logs.extend(*logs)
+        # As séries usam os índices de regra do processo de captura, traduzidos como os do log
+        traffic_rollup.merge(*rollup, rule_mapping=packet_logs.rule_mapping(logs[1]).tolist())
+        heavy_hitters.merge(*hitters)
+        distinct_counters.merge(*distinct)
+        for key, value in stats.items():
+            packet_stats[key] += value
+        recent_frames.extend(frames)
+    regras.rule_stats.merge(rule_stats)
+    regras.latency_histogram.merge(histogram)
+    lock_wait_histogram.merge(lock_wait)
+
+def sniff_workers(workers=CAPTURE_WORKERS, interface=None, **ring_options):
     """
+    Captura em vários processos que formam um grupo PACKET_FANOUT por hash do fluxo.
+
+    Cada processo tem o seu próprio anel, aplica as regras e acumula logs e contadores
+    localmente; a thread que chama esta função junta essas saídas aos logs e
+    estatísticas compartilhados (data.py) e repassa aos processos cada novo conjunto
+    de regras publicado (ex.: por save_rules).
+
+    Args:
+        workers (int): Quantidade de processos de captura.
+        interface (str): Interface de rede a ser capturada. Se None, captura todas.
+        **ring_options: Opções do anel (block_size, block_count, block_timeout_ms).
+    """
+    # "spawn" cria processos novos, sem herdar locks possivelmente presos por outras threads
+    context = multiprocessing.get_context("spawn")
+    output = context.Queue()
+    fanout_group = os.getpid() & 0xFFFF
+    controls = []
+    processes = []
+    for _ in range(workers):
+        control = context.Queue()
+        process = context.Process(
+            target=_capture_worker,
+            args=(output, control, interface, fanout_group, ring_options,
+                  (FLOW_LOGGING, FLOW_IDLE_TIMEOUT, FLOW_ACTIVE_TIMEOUT)),
+            daemon=True,
+        )
+        process.start()
+        controls.append(control)
+        processes.append(process)
+
+    generation = None
+    try:
+        while any(process.is_alive() for process in processes):
+            # Repassa aos processos as regras publicadas desde a última verificação
+            snapshot = regras.get_snapshot()
+            if snapshot.generation != generation:
+                generation = snapshot.generation
+                for control in controls:
+                    control.put((list(snapshot.rules), regras.get_rule_engine()))
+            try:
+                _merge_worker_output(*output.get(timeout=WORKER_FLUSH_INTERVAL))
+            except queue.Empty:
+                pass
+        # Ex.: sem permissão para sockets brutos; sniff_packets recorre à captura da Scapy
+        raise OSError(f"os {workers} processos de captura terminaram")
+    finally:
+        for process in processes:
+            process.terminate()
+
+def sniff_packets(mode=None, interface=None, workers=None, **ring_options):
+    """
+    Captura pacotes de rede em tempo real e os processa.
+
+    Args:
+        mode (str): Modo de captura ("ring", "raw" ou "scapy"). Se None, usa CAPTURE_MODE.
+        interface (str): Interface de rede a ser capturada. Se None, captura todas.
+        workers (int): Processos de captura no modo "ring". Se None, usa CAPTURE_WORKERS.
+        **ring_options: Opções do anel no modo "ring" (block_size, block_count, block_timeout_ms).
+    """
+    if mode is None:
+        mode = CAPTURE_MODE
+    if workers is None:
+        workers = CAPTURE_WORKERS
+    if mode not in CAPTURE_MODES:
+        raise ValueError(f"modo de captura desconhecido: {mode} (use um de {', '.join(CAPTURE_MODES)})")
+
+    if mode in ("ring", "raw"):
+        try:
+            if mode == "ring" and workers > 1:
+                sniff_workers(workers, interface, **ring_options)
+            elif mode == "ring":
+                sniff_ring(interface, **ring_options)
+            else:
+                sniff_raw(interface)
+            return
+        except (OSError, AttributeError) as e:
+            # Sem AF_PACKET ou sem permissão para sockets brutos, usa a captura da Scapy
+            print(f"Erro ao iniciar a captura rápida, usando a Scapy: {e}")
+
     # Usa a função sniff da biblioteca Scapy para capturar pacotes
     # - filter="ip": Captura apenas pacotes IP
-    # - prn=packet_handler: Chama a função packet_handler para processar cada pacote capturado
     # - store=0: Não armazena os pacotes capturados na memória (apenas processa em tempo real)
-    sniff(filter="ip", prn=packet_handler, store=0)
\ No newline at end of file
+    # - prn: Coloca cada pacote na fila de avaliação (ou chama packet_handler, sem fila)
+    sniff(filter="ip", prn=start_evaluation_stage(packet_handler), store=0, iface=interface)
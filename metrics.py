@@ -0,0 +1,118 @@
+#############################
+# HISTOGRAMA DE LATÊNCIA (ESTILO HDR)
+#############################
+
+# Bits de precisão de cada faixa do histograma: cada potência de 2 é dividida em
+# 2**SUB_BUCKET_BITS sub-faixas lineares (erro relativo máximo de ~3%)
+SUB_BUCKET_BITS = 5
+
+# Maior valor registrado com precisão, em nanossegundos (2**40 ns ≈ 18 minutos)
+MAX_TRACKED_BITS = 40
+
+class LatencyHistogram:
+    """
+    Histograma de latências com faixas log-lineares, no estilo do HdrHistogram.
+
+    Valores pequenos têm uma faixa por valor; a partir daí, cada potência de 2 é
+    dividida em 2**SUB_BUCKET_BITS faixas de mesmo tamanho. O histograma ocupa memória
+    fixa, registrar um valor custa O(1) e os percentis têm erro relativo limitado.
+
+    Attributes:
+        counts (list): Contagem de valores em cada faixa.
+        count (int): Total de valores registrados.
+        total (int): Soma dos valores registrados, em nanossegundos.
+        max_value (int): Maior valor registrado, em nanossegundos.
+    """
+
+    def __init__(self):
+        self.counts = [0] * ((MAX_TRACKED_BITS + 1) << SUB_BUCKET_BITS)
+        self.count = 0
+        self.total = 0
+        self.max_value = 0
+
+    @staticmethod
+    def _bucket(value):
+        """
+        Retorna o índice da faixa de um valor.
+        """
+        shift = value.bit_length() - (SUB_BUCKET_BITS + 1)
+        if shift <= 0:
+            return value
+        if shift > MAX_TRACKED_BITS - SUB_BUCKET_BITS - 1:
+            shift = MAX_TRACKED_BITS - SUB_BUCKET_BITS - 1
+            value = min(value, (1 << MAX_TRACKED_BITS) - 1)
+        return (shift << SUB_BUCKET_BITS) + (value >> shift)
+
+    @staticmethod
+    def _bucket_value(bucket):
+        """
+        Retorna o menor valor representado por uma faixa.
+        """
+        if bucket < (2 << SUB_BUCKET_BITS):
+            return bucket
+        shift = (bucket >> SUB_BUCKET_BITS) - 1
+        return (bucket - (shift << SUB_BUCKET_BITS)) << shift
+
+    def record(self, value):
+        """
+        Registra um valor de latência.
+
+        Args:
+            value (int): Latência em nanossegundos.
+        """
+        self.counts[self._bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max_value:
+            self.max_value = value
+
+    def merge(self, other):
+        """
+        Soma as contagens de outro histograma a este.
+
+        Args:
+            other (LatencyHistogram): Histograma a ser somado.
+        """
+        for bucket, bucket_count in enumerate(other.counts):
+            if bucket_count:
+                self.counts[bucket] += bucket_count
+        self.count += other.count
+        self.total += other.total
+        self.max_value = max(self.max_value, other.max_value)
+
+    def percentile(self, percent):
+        """
+        Retorna o valor aproximado do percentil informado.
+
+        Args:
+            percent (float): Percentil desejado (0 a 100).
+
+        Returns:
+            int: Latência em nanossegundos (0 se o histograma estiver vazio).
+        """
+        if self.count == 0:
+            return 0
+        target = max(1, int(round(self.count * percent / 100.0)))
+        cumulative = 0
+        for bucket, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return min(self._bucket_value(bucket), self.max_value)
+        return self.max_value
+
+    def summary(self):
+        """
+        Retorna um resumo do histograma, em microssegundos.
+
+        Returns:
+            dict: Quantidade de amostras, média, p50, p90, p99, p99.9 e máximo.
+        """
+        return {
+            "count": self.count,
+            "mean_us": (self.total / self.count / 1000.0) if self.count else 0.0,
+            "p50_us": self.percentile(50) / 1000.0,
+            "p90_us": self.percentile(90) / 1000.0,
+            "p99_us": self.percentile(99) / 1000.0,
+            "p999_us": self.percentile(99.9) / 1000.0,
+            "max_us": self.max_value / 1000.0,
+        }
@@ -0,0 +1,125 @@
+# Importa deque para o buffer circular entre a captura e a avaliação
+from collections import deque
+
+# Importa threading para acordar a etapa de avaliação quando chegam pacotes
+import threading
+
+#############################
+# POLÍTICAS DE TRANSBORDO
+#############################
+
+# Políticas aplicadas quando a fila está cheia:
+# - "drop_newest": descarta o pacote que acabou de chegar
+# - "drop_oldest": descarta o pacote mais antigo da fila para abrir espaço ao novo
+# - "sample": aceita 1 a cada sample_rate pacotes que chegam com a fila cheia (no lugar
+#   do mais antigo) e descarta os demais, mantendo uma amostra do tráfego recente
+OVERFLOW_POLICIES = ("drop_newest", "drop_oldest", "sample")
+
+# Capacidade padrão da fila, em pacotes
+DEFAULT_QUEUE_SIZE = 65536
+
+# Política padrão de transbordo
+DEFAULT_POLICY = "drop_newest"
+
+# Taxa de amostragem padrão da política "sample"
+DEFAULT_SAMPLE_RATE = 10
+
+#############################
+# FILA LIMITADA ENTRE AS ETAPAS
+#############################
+
+class PacketQueue:
+    """
+    Fila limitada entre a etapa de captura (produtora) e a de avaliação (consumidora).
+
+    Foi feita para um único produtor e um único consumidor: append e popleft do deque
+    são atômicos, então nenhuma das pontas usa lock. Quando a fila está cheia, a
+    política de transbordo decide qual pacote é descartado, e todo descarte é contado.
+
+    Attributes:
+        capacity (int): Quantidade máxima de pacotes na fila.
+        policy (str): Política de transbordo (ver OVERFLOW_POLICIES).
+        sample_rate (int): Taxa de amostragem da política "sample".
+        accepted (int): Pacotes colocados na fila.
+        dropped (int): Pacotes descartados por transbordo (novos ou antigos, conforme a política).
+    """
+
+    def __init__(self, capacity=DEFAULT_QUEUE_SIZE, policy=DEFAULT_POLICY, sample_rate=DEFAULT_SAMPLE_RATE):
+        """
+        Raises:
+            ValueError: Se a capacidade, a política ou a taxa de amostragem forem inválidas.
+        """
+        if capacity < 1:
+            raise ValueError(f"capacidade da fila inválida: {capacity}")
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"política de transbordo desconhecida: {policy} (use uma de {', '.join(OVERFLOW_POLICIES)})")
+        if sample_rate < 1:
+            raise ValueError(f"taxa de amostragem inválida: {sample_rate}")
+        self.capacity = capacity
+        self.policy = policy
+        self.sample_rate = sample_rate
+        self.accepted = 0
+        self.dropped = 0
+        self._items = deque()
+        self._overflows = 0
+        self._ready = threading.Event()
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item):
+        """
+        Coloca um pacote na fila, aplicando a política de transbordo se ela estiver cheia.
+
+        Args:
+            item: O pacote (ou quadro) a ser avaliado.
+
+        Returns:
+            bool: True se o pacote entrou na fila.
+        """
+        items = self._items
+        if len(items) >= self.capacity:
+            if self.policy == "drop_newest":
+                self.dropped += 1
+                return False
+            if self.policy == "sample":
+                self._overflows += 1
+                if self._overflows % self.sample_rate:
+                    self.dropped += 1
+                    return False
+            # "drop_oldest" e pacotes amostrados ocupam o lugar do mais antigo
+            try:
+                items.popleft()
+                self.dropped += 1
+            except IndexError:
+                pass  # O consumidor esvaziou a fila nesse meio tempo
+        items.append(item)
+        self.accepted += 1
+        self._ready.set()
+        return True
+
+    def get_batch(self, max_items, timeout):
+        """
+        Retira até max_items pacotes da fila, esperando até timeout segundos se ela estiver vazia.
+
+        Args:
+            max_items (int): Quantidade máxima de pacotes retirados.
+            timeout (float): Espera máxima, em segundos.
+
+        Returns:
+            list: Os pacotes retirados, na ordem de chegada (vazia se o tempo acabar).
+        """
+        items = self._items
+        if not items:
+            self._ready.clear()
+            # Confere de novo: o produtor pode ter colocado um pacote antes do clear
+            if not items:
+                self._ready.wait(timeout)
+        batch = []
+        popleft = items.popleft
+        try:
+            for _ in range(max_items):
+                batch.append(popleft())
+        except IndexError:
+            pass
+        return batch
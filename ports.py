@@ -0,0 +1,200 @@
+# Importa bisect para localizar portas em listas ordenadas de limites
+from bisect import bisect_right
+
+#############################
+# INTERPRETAÇÃO DE PORTAS
+#############################
+
+# Maior número de porta TCP/UDP válido
+MAX_PORT = 65535
+
+# Quantidade máxima de portas por regra do módulo multiport do iptables (intervalos contam 2)
+MULTIPORT_LIMIT = 15
+
+def _parse_port(value):
+    """
+    Converte um valor em número de porta, validando o intervalo 0-65535.
+
+    Raises:
+        ValueError: Se o valor não for um número de porta válido.
+    """
+    port = int(str(value).strip())
+    if not 0 <= port <= MAX_PORT:
+        raise ValueError(f"porta fora do intervalo 0-{MAX_PORT}: {port}")
+    return port
+
+def parse_ports(spec):
+    """
+    Interpreta uma especificação de portas de uma regra.
+
+    Formatos aceitos:
+        - Número inteiro ou string numérica (ex.: 80, "80").
+        - Intervalo com "-" ou ":" (ex.: "1024-65535", "6000:7000").
+        - Lista separada por vírgulas (ex.: "80,443,8000-8100").
+        - Lista JSON de qualquer um dos formatos acima (ex.: [80, 443, "8000-8100"]).
+
+    Args:
+        spec: Especificação de portas.
+
+    Returns:
+        list: Lista ordenada de intervalos (inicio, fim) inclusivos, sem sobreposições.
+
+    Raises:
+        ValueError: Se alguma porta ou intervalo for inválido.
+    """
+    if isinstance(spec, bool):
+        raise ValueError(f"porta inválida: {spec}")
+    if isinstance(spec, (list, tuple)):
+        parts = list(spec)
+    else:
+        parts = [part for part in str(spec).split(",") if part.strip()]
+    if not parts:
+        raise ValueError(f"especificação de portas vazia: {spec!r}")
+
+    intervals = []
+    for part in parts:
+        if isinstance(part, (list, tuple)):
+            intervals.extend(parse_ports(part))
+            continue
+        text = str(part).strip().replace(":", "-")
+        if "-" in text:
+            start_text, end_text = text.split("-", 1)
+            start, end = _parse_port(start_text), _parse_port(end_text)
+            if start > end:
+                raise ValueError(f"intervalo de portas invertido: {part}")
+        else:
+            start = end = _parse_port(text)
+        intervals.append((start, end))
+
+    # Ordena e funde intervalos sobrepostos ou adjacentes
+    intervals.sort()
+    merged = [intervals[0]]
+    for start, end in intervals[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def ports_contain(intervals, port):
+    """
+    Testa se uma porta está em uma lista de intervalos, com uma busca binária.
+
+    Args:
+        intervals (list): Intervalos (inicio, fim) retornados por parse_ports.
+        port (int): Número da porta.
+
+    Returns:
+        bool: True se algum intervalo contém a porta.
+    """
+    # Último intervalo que começa até a porta (fim MAX_PORT + 1 ordena depois de qualquer intervalo)
+    position = bisect_right(intervals, (port, MAX_PORT + 1)) - 1
+    return position >= 0 and port <= intervals[position][1]
+
+def format_ports(spec):
+    """
+    Formata uma especificação de portas na notação textual usada pelo formulário de regras.
+
+    Args:
+        spec: Especificação de portas (ver parse_ports).
+
+    Returns:
+        str: Portas separadas por vírgula, com intervalos como "inicio-fim" (ex.: "80,443,1024-2048").
+    """
+    return ",".join(
+        str(start) if start == end else f"{start}-{end}" for start, end in parse_ports(spec)
+    )
+
+def iptables_port_options(spec, direction):
+    """
+    Traduz uma especificação de portas para opções do iptables.
+
+    Uma única porta ou intervalo vira "--dport a" / "--dport a:b". Listas usam o módulo
+    multiport ("-m multiport --dports 80,443,1000:2000") e, se excederem o limite de
+    15 portas do módulo, são divididas em várias opções (uma regra do iptables para cada).
+
+    Args:
+        spec: Especificação de portas (ver parse_ports).
+        direction (str): "src" para porta de origem ou "dst" para porta de destino.
+
+    Returns:
+        list: Lista de listas de argumentos; cada uma gera uma regra do iptables.
+
+    Raises:
+        ValueError: Se a especificação for inválida.
+    """
+    prefix = "s" if direction == "src" else "d"
+    intervals = parse_ports(spec)
+    if len(intervals) == 1:
+        start, end = intervals[0]
+        value = str(start) if start == end else f"{start}:{end}"
+        return [[f"--{prefix}port", value]]
+
+    options = []
+    chunk = []
+    chunk_size = 0
+    for start, end in intervals:
+        cost = 1 if start == end else 2
+        if chunk_size + cost > MULTIPORT_LIMIT:
+            options.append(chunk)
+            chunk, chunk_size = [], 0
+        chunk.append(str(start) if start == end else f"{start}:{end}")
+        chunk_size += cost
+    options.append(chunk)
+    return [["-m", "multiport", f"--{prefix}ports", ",".join(chunk)] for chunk in options]
+
+#############################
+# SEGMENTOS ELEMENTARES DE PORTAS
+#############################
+
+class PortSegments:
+    """
+    Divide o espaço de portas em segmentos elementares a partir dos limites de todos
+    os intervalos usados pelas regras. Dentro de um segmento, todas as portas são
+    cobertas exatamente pelas mesmas regras, então o índice do segmento pode ser
+    usado como chave nas tabelas hash. Localizar a porta de um pacote custa uma
+    busca binária (O(log n) no número de limites).
+
+    Attributes:
+        boundaries (list): Limites ordenados; o segmento de uma porta é bisect_right(boundaries, porta).
+    """
+
+    def __init__(self, interval_lists):
+        """
+        Args:
+            interval_lists (iterable): Listas de intervalos (inicio, fim) retornadas por parse_ports.
+        """
+        boundaries = set()
+        for intervals in interval_lists:
+            for start, end in intervals:
+                boundaries.add(start)
+                boundaries.add(end + 1)
+        self.boundaries = sorted(boundaries)
+
+    def segment(self, port):
+        """
+        Retorna o índice do segmento que contém a porta.
+
+        Args:
+            port (int): Número da porta.
+
+        Returns:
+            int: Índice do segmento.
+        """
+        return bisect_right(self.boundaries, port)
+
+    def segments_for(self, intervals):
+        """
+        Retorna os índices de todos os segmentos cobertos por uma lista de intervalos.
+
+        Args:
+            intervals (list): Intervalos (inicio, fim) retornados por parse_ports.
+
+        Returns:
+            list: Índices dos segmentos cobertos.
+        """
+        segments = []
+        for start, end in intervals:
+            segments.extend(range(self.segment(start), self.segment(end) + 1))
+        return segments
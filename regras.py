@@ -1,66 +1,1238 @@
 # Importa a biblioteca JSON para manipular o arquivo de regras (rules.json)
 import json
 
+# Importa copy para isolar os snapshots de regras das listas editadas pela interface
+import copy
+
 # Importa as camadas IP, TCP e UDP da biblioteca Scapy para verificar pacotes
 from scapy.all import IP, TCP, UDP
 
-# Importa as variáveis compartilhadas para logs e sincronização
-from data import log_lock, packet_logs
+# Importa as funções para interpretar prefixos CIDR e a árvore de prefixos
+from cidr import PREFIX_MASKS, PrefixTrie, ip_to_int, parse_cidr
+
+# Importa as funções para interpretar intervalos e listas de portas
+from ports import PortSegments, parse_ports, ports_contain
+
+# Importa product para expandir regras com várias portas em várias chaves
+from itertools import product
+
+# Importa OrderedDict para o cache LRU de veredictos
+from collections import OrderedDict
+
+# Importa time para controlar a expiração das entradas do cache
+import time
+
+# Importa random para gerar cabeçalhos de conferência da função gerada
+import random
 
-# Cria um lock para sincronizar o acesso às regras
+# Importa NumPy para a avaliação vetorizada de lotes de pacotes
+import numpy as np
+
+# Importa o histograma de latência usado nas estatísticas das regras
+from metrics import LatencyHistogram
+
+# Cria um lock para serializar as atualizações das regras (load_rules/save_rules).
+# A leitura das regras pela thread de captura não usa lock: ela lê o snapshot publicado.
 import threading
 rules_lock = threading.Lock()
 
-# Variável global para armazenar as regras carregadas
-_rules = []
+# Snapshot imutável das regras em uso (ver RuleSet). É substituído por inteiro a cada
+# atualização, no estilo RCU: leitores pegam a referência atual sem lock, e quem já
+# está avaliando um pacote continua usando o snapshot antigo até terminar.
+_snapshot = None
+
+# Contador de geração do conjunto de regras, incrementado a cada load_rules/save_rules.
+# O cache de veredictos descarta entradas calculadas com uma geração anterior.
+_generation = 0
+
+# Motor de avaliação usado nos novos snapshots (ver ENGINES e configure_rule_engine)
+_engine = "indexed"
+
+# Função para publicar um novo snapshot das regras
+def publish_rules(rules):
+    """
+    Compila as regras em um novo snapshot e o publica atomicamente, sem gravar o
+    rules.json (útil para avaliar um conjunto de regras candidato, ex.: benchmark).
+
+    Args:
+        rules (list): Lista de regras.
+
+    Returns:
+        RuleSet: O snapshot publicado.
+    """
+    global _snapshot, _generation
+    with rules_lock:
+        _generation += 1
+        # Os acertos já observados orientam a ordem de avaliação do novo snapshot
+        hits = [rule_stats.get(rule_key(rule))["hits"] for rule in rules]
+        snapshot = RuleSet(rules, _generation, _engine, hits)
+        # A atribuição de uma referência é atômica; leitores veem o snapshot antigo ou o novo
+        _snapshot = snapshot
+    if snapshot.engine == "codegen":
+        # O plano de avaliação compara pares de regras; é calculado fora do lock e da captura
+        threading.Thread(target=_optimize_snapshot, args=(snapshot,), daemon=True).start()
+    return snapshot
+
+# Função para calcular o plano de avaliação de um snapshot publicado
+def _optimize_snapshot(snapshot):
+    """
+    Calcula o plano de avaliação do snapshot (ver RuleSet.optimize), se ele ainda estiver publicado.
+
+    Args:
+        snapshot (RuleSet): Snapshot publicado por publish_rules.
+    """
+    if _snapshot is snapshot:
+        snapshot.optimize()
+
+# Função para escolher o motor de avaliação das regras
+def configure_rule_engine(engine):
+    """
+    Define o motor de avaliação das regras e republica o snapshot atual com ele.
+
+    Args:
+        engine (str): "indexed" (tabelas hash indexadas) ou "codegen" (função Python gerada,
+                      com o motor indexado como alternativa se a geração falhar).
+
+    Raises:
+        ValueError: Se o motor não for conhecido.
+    """
+    global _engine
+    if engine not in ENGINES:
+        raise ValueError(f"motor de regras desconhecido: {engine}")
+    _engine = engine
+    publish_rules(_snapshot.rules)
+
+# Função para obter o motor de avaliação configurado
+def get_rule_engine():
+    """
+    Retorna o motor de avaliação configurado para os novos snapshots.
+
+    Returns:
+        str: "indexed" ou "codegen" (ver configure_rule_engine).
+    """
+    return _engine
 
 # Função para carregar as regras do firewall a partir do arquivo rules.json
 def load_rules():
     """
-    Carrega as regras do firewall de um arquivo JSON e atualiza a variável global _rules.
+    Carrega as regras do firewall de um arquivo JSON e publica um novo snapshot.
 
     Returns:
         list: Uma lista de regras, onde cada regra é um dicionário contendo
               os critérios de bloqueio ou permissão.
     """
-    global _rules
     try:
         with open("rules.json", "r") as f:
-            with rules_lock:
-                _rules = json.load(f)
-        return _rules
+            rules = json.load(f)
+        publish_rules(rules)
     except Exception as e:
         print(f"Erro ao carregar regras: {e}")
-        return _rules
+    return get_rules()
+
+# Função para obter o snapshot atual das regras
+def get_snapshot():
+    """
+    Retorna o snapshot de regras publicado, sem usar lock.
+
+    Returns:
+        RuleSet: O snapshot atual (não deve ser modificado).
+    """
+    return _snapshot
 
 # Função para obter as regras atuais
 def get_rules():
     """
-    Retorna as regras atualmente carregadas.
+    Retorna uma cópia das regras atualmente carregadas.
+
+    A cópia pode ser editada livremente (ex.: pela interface) e depois passada para
+    save_rules, que publica um novo snapshot; o snapshot em uso nunca é alterado.
 
     Returns:
         list: Lista de regras carregadas.
     """
-    with rules_lock:
-        return _rules
+    return copy.deepcopy(list(_snapshot.rules))
 
 # Função para salvar as regras no arquivo rules.json
 def save_rules(rules):
     """
-    Salva as regras no arquivo rules.json e atualiza a variável global _rules.
+    Salva as regras no arquivo rules.json e publica um novo snapshot.
 
     Args:
         rules: Lista de regras a ser salva.
     """
-    global _rules
     try:
         with open("rules.json", "w") as f:
             json.dump(rules, f, indent=4)
-        with rules_lock:
-            _rules = rules
+        publish_rules(rules)
     except Exception as e:
         print(f"Erro ao salvar regras: {e}")
 
+#############################
+# COMPILAÇÃO DAS REGRAS
+#############################
+
+# Mapeia o nome do protocolo para o número usado no cabeçalho IP (ex.: "tcp" -> 6)
+PROTOCOL_MAP = {"tcp": 6, "udp": 17, "icmp": 1}
+
+# Campos de correspondência, na ordem em que aparecem no cabeçalho extraído do pacote
+HEADER_FIELDS = ("src_ip", "dst_ip", "protocol", "src_port", "dst_port")
+
+# Posições dos campos de endereço IP, que aceitam prefixos CIDR
+IP_FIELD_POSITIONS = (0, 1)
+
+# Posições dos campos de porta, que aceitam intervalos e listas
+PORT_FIELD_POSITIONS = (3, 4)
+
+# Resultado vazio de consulta na árvore de prefixos (nenhum prefixo corresponde)
+_NO_PREFIXES = {}
+
+def _compile_rule(rule):
+    """
+    Converte uma regra em uma tupla no mesmo formato do cabeçalho extraído do pacote.
+
+    Args:
+        rule (dict): Regra do firewall.
+
+    Returns:
+        tuple: Um par (shape, values), onde:
+               - shape (tuple): (positions, src_len, dst_len), com as posições de HEADER_FIELDS
+                 presentes na regra e o tamanho do prefixo dos IPs (None se ausentes).
+               - values (tuple): Valores esperados para cada posição (IPs como rede inteira
+                 e portas como listas de intervalos).
+               Retorna None se a regra nunca pode corresponder (ex.: protocolo desconhecido).
+
+    Raises:
+        ValueError: Se uma porta, intervalo de portas ou IP/prefixo for inválido.
+    """
+    positions = []
+    values = []
+    prefix_lengths = [None, None]
+    for position, field in enumerate(HEADER_FIELDS):
+        if field not in rule:
+            continue
+        if field == "protocol":
+            value = PROTOCOL_MAP.get(rule["protocol"].lower(), None)
+            if value is None:
+                return None
+        elif position in PORT_FIELD_POSITIONS:
+            # Portas aceitam número, intervalo ("1024-65535") ou lista ([80, 443])
+            value = parse_ports(rule[field])
+        else:
+            # Endereços aceitam notação CIDR (ex.: "10.0.0.0/8"); um IP simples equivale a /32
+            value, prefix_lengths[position] = parse_cidr(rule[field])
+        positions.append(position)
+        values.append(value)
+    return (tuple(positions), prefix_lengths[0], prefix_lengths[1]), tuple(values)
+
+def _parse_rules(rules):
+    """
+    Interpreta as regras de bloqueio de uma lista, descartando as inválidas.
+
+    Args:
+        rules (list): Lista de regras.
+
+    Returns:
+        list: Lista de tuplas (index, shape, values), na ordem das regras (ver _compile_rule).
+    """
+    parsed = []
+    for index, rule in enumerate(rules):
+        # Apenas regras de bloqueio são avaliadas, como na varredura linear original
+        if rule.get("action") != "block":
+            continue
+        try:
+            compiled = _compile_rule(rule)
+        except (ValueError, TypeError, AttributeError) as e:
+            print(f"Erro ao compilar regra {index}: {e}")
+            continue
+        if compiled is not None:
+            parsed.append((index, compiled[0], compiled[1]))
+    return parsed
+
+class CompiledRules:
+    """
+    Conjunto de regras compilado em tabelas hash, uma para cada "formato" de regra
+    (combinação de campos presentes e tamanhos de prefixo dos IPs). O custo de uma
+    consulta depende do número de formatos distintos, e não do número de regras.
+
+    Os prefixos de IP de origem e destino ficam em árvores de prefixos: uma única
+    descida de no máximo 32 bits por endereço descobre quais prefixos contêm o
+    pacote, e os formatos cujo prefixo não aparece nesse caminho são descartados.
+
+    As portas são mapeadas para segmentos elementares (ver PortSegments) com uma
+    busca binária; uma regra com intervalo ou lista de portas é registrada uma vez
+    para cada segmento que cobre. Se a regra tem porta de origem e de destino, só a
+    de destino entra na chave (o produto dos segmentos das duas cresceria com o
+    quadrado do número de regras): a entrada da tabela guarda as regras candidatas,
+    em ordem, e a porta de origem é conferida em cada uma (ver ports_contain).
+
+    Attributes:
+        rules (list): Lista original de regras (a regra retornada é sempre o dict original).
+        shapes (list): Lista de tuplas (min_index, positions, src_len, dst_len, table, src_checked),
+                       ordenada por min_index, onde table mapeia os valores dos campos em
+                       positions para o índice da primeira regra ou, se src_checked, para a
+                       lista de candidatas (index, intervalos da porta de origem).
+        src_trie (PrefixTrie): Prefixos de IP de origem usados pelas regras.
+        dst_trie (PrefixTrie): Prefixos de IP de destino usados pelas regras.
+        src_ports (PortSegments): Segmentos de portas de origem usados pelas regras.
+        dst_ports (PortSegments): Segmentos de portas de destino usados pelas regras.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.src_trie = PrefixTrie()
+        self.dst_trie = PrefixTrie()
+
+        # Primeira passagem: interpreta as regras de bloqueio
+        parsed = _parse_rules(rules)
+
+        # Os segmentos de portas dependem dos limites de todos os intervalos usados
+        port_segments = []
+        for position in PORT_FIELD_POSITIONS:
+            port_segments.append(PortSegments(
+                values[positions.index(position)]
+                for _, (positions, _, _), values in parsed
+                if position in positions
+            ))
+        self.src_ports, self.dst_ports = port_segments
+
+        # Segunda passagem: registra cada regra nas tabelas do seu formato
+        tables = {}
+        for index, shape, values in parsed:
+            positions = shape[0]
+            # Com as duas portas na regra, a porta de origem fica fora da chave
+            src_intervals = None
+            key_options = []
+            for position, value in zip(positions, values):
+                if position in IP_FIELD_POSITIONS:
+                    # Registra o prefixo de IP na árvore correspondente
+                    trie = self.src_trie if position == 0 else self.dst_trie
+                    trie.insert(value, shape[1 + position])
+                    key_options.append((value,))
+                elif position == PORT_FIELD_POSITIONS[0] and PORT_FIELD_POSITIONS[1] in positions:
+                    src_intervals = value
+                elif position in PORT_FIELD_POSITIONS:
+                    segments = port_segments[PORT_FIELD_POSITIONS.index(position)]
+                    key_options.append(segments.segments_for(value))
+                else:
+                    key_options.append((value,))
+            table = tables.setdefault(shape, {})
+            for key in product(*key_options):
+                if src_intervals is None:
+                    # Mantém apenas a primeira regra para cada chave (semântica de primeira correspondência)
+                    table.setdefault(key, index)
+                else:
+                    # As candidatas ficam na ordem das regras; a primeira cuja porta de origem corresponde vence
+                    table.setdefault(key, []).append((index, src_intervals))
+
+        self.shapes = []
+        for (positions, src_len, dst_len), table in tables.items():
+            src_checked = PORT_FIELD_POSITIONS[0] in positions and PORT_FIELD_POSITIONS[1] in positions
+            if src_checked:
+                positions = tuple(position for position in positions if position != PORT_FIELD_POSITIONS[0])
+                min_index = min(candidates[0][0] for candidates in table.values())
+            else:
+                min_index = min(table.values())
+            self.shapes.append((min_index, positions, src_len, dst_len, table, src_checked))
+        self.shapes.sort(key=lambda shape: shape[0])
+
+    def match(self, header):
+        """
+        Procura a primeira regra de bloqueio que corresponde ao cabeçalho.
+
+        Args:
+            header (tuple): Cabeçalho do pacote no formato de HEADER_FIELDS (IPs como inteiros).
+
+        Returns:
+            int: Índice da regra correspondente, ou None se nenhuma regra corresponder.
+        """
+        src_ip, dst_ip, proto, src_port, dst_port = header
+
+        # Descobre, com uma descida em cada árvore, quais prefixos contêm os endereços
+        src_prefixes = self.src_trie.lookup(src_ip) if src_ip is not None and self.src_trie.size else _NO_PREFIXES
+        dst_prefixes = self.dst_trie.lookup(dst_ip) if dst_ip is not None and self.dst_trie.size else _NO_PREFIXES
+
+        # Localiza os segmentos das portas com uma busca binária em cada campo
+        src_segment = self.src_ports.segment(src_port) if src_port is not None else None
+        dst_segment = self.dst_ports.segment(dst_port) if dst_port is not None else None
+
+        best = None
+        for min_index, positions, src_len, dst_len, table, src_checked in self.shapes:
+            # As tabelas estão ordenadas pelo menor índice; nenhuma outra pode vencer
+            if best is not None and min_index > best:
+                break
+            src_network = dst_network = None
+            if src_len is not None:
+                src_network = src_prefixes.get(src_len)
+                if src_network is None:
+                    continue
+            if dst_len is not None:
+                dst_network = dst_prefixes.get(dst_len)
+                if dst_network is None:
+                    continue
+            row = (src_network, dst_network, proto, src_segment, dst_segment)
+            index = table.get(tuple(row[position] for position in positions))
+            if src_checked and index is not None:
+                candidates, index = index, None
+                if src_port is not None:
+                    for candidate, src_intervals in candidates:
+                        if best is not None and candidate > best:
+                            break
+                        if ports_contain(src_intervals, src_port):
+                            index = candidate
+                            break
+            if index is not None and (best is None or index < best):
+                best = index
+        return best
+
+def compile_rules(rules):
+    """
+    Compila uma lista de regras para consulta indexada.
+
+    Args:
+        rules (list): Lista de regras.
+
+    Returns:
+        CompiledRules: As regras compiladas.
+    """
+    return CompiledRules(rules)
+
+#############################
+# FUNÇÃO DE CORRESPONDÊNCIA GERADA (CODEGEN)
+#############################
+
+# Motores de avaliação disponíveis: tabelas indexadas ou função Python gerada
+ENGINES = ("indexed", "codegen")
+
+# Motor usado por padrão nos snapshots publicados
+DEFAULT_ENGINE = "indexed"
+
+# Acima desta quantidade de regras, o código gerado fica grande demais e o motor
+# indexado é usado no lugar
+CODEGEN_MAX_RULES = 2000
+
+# Quantidade de cabeçalhos usados para conferir a função gerada contra o motor indexado
+CODEGEN_CHECK_SAMPLES = 256
+
+# Nomes das variáveis locais da função gerada, na ordem de HEADER_FIELDS
+_CODEGEN_NAMES = ("src_ip", "dst_ip", "proto", "src_port", "dst_port")
+
+def _codegen_condition(position, value, prefix_length, constants):
+    """
+    Gera a expressão Python que testa um campo do cabeçalho contra o valor da regra.
+
+    Args:
+        position (int): Posição do campo em HEADER_FIELDS.
+        value: Valor compilado da regra (rede inteira, protocolo ou intervalos de portas).
+        prefix_length (int): Tamanho do prefixo, para campos de IP.
+        constants (dict): Constantes não literais da função (conjuntos de portas), preenchidas aqui.
+
+    Returns:
+        str: A expressão, com as constantes inlinadas.
+    """
+    name = _CODEGEN_NAMES[position]
+    if position in IP_FIELD_POSITIONS:
+        if prefix_length == 32:
+            return f"{name} == {value}"
+        if prefix_length == 0:
+            return f"{name} is not None"
+        return f"{name} is not None and {name} & {PREFIX_MASKS[prefix_length]} == {value}"
+    if position in PORT_FIELD_POSITIONS:
+        singles = [start for start, end in value if start == end]
+        ranges = [f"{start} <= {name} <= {end}" for start, end in value if start != end]
+        tests = list(ranges)
+        if len(singles) == 1:
+            tests.append(f"{name} == {singles[0]}")
+        elif singles:
+            constant = f"_ports_{len(constants)}"
+            constants[constant] = frozenset(singles)
+            tests.append(f"{name} in {constant}")
+        if len(tests) == 1 and not ranges:
+            return tests[0]
+        return f"{name} is not None and ({' or '.join(tests)})"
+    return f"{name} == {value}"
+
+def generate_matcher_source(rules, order=None):
+    """
+    Gera o código-fonte de uma função de correspondência em linha reta para as regras.
+
+    A função extrai cada campo do cabeçalho uma única vez e testa as regras de
+    bloqueio na ordem, com os valores das regras inlinados como constantes.
+
+    Args:
+        rules (list): Lista de regras.
+        order (list): Índices das regras de bloqueio na ordem de avaliação (ver
+                      plan_evaluation). Se None, usa a ordem da lista.
+
+    Returns:
+        tuple: Um par (source, constants) com o código da função "match" e as constantes
+               que ela referencia.
+    """
+    constants = {}
+    lines = [
+        "def match(header):",
+        f"    {', '.join(_CODEGEN_NAMES)} = header",
+    ]
+    for index, shape, values in _ordered_rules(_parse_rules(rules), order):
+        positions = shape[0]
+        conditions = [
+            _codegen_condition(position, value, shape[1 + position] if position in IP_FIELD_POSITIONS else None, constants)
+            for position, value in zip(positions, values)
+        ]
+        if not conditions:
+            # Regra sem critérios: corresponde a qualquer pacote, e as seguintes nunca são alcançadas
+            lines.append(f"    return {index}")
+            break
+        lines.append(f"    if {' and '.join(f'({condition})' for condition in conditions)}:")
+        lines.append(f"        return {index}")
+    else:
+        lines.append("    return None")
+    return "\n".join(lines) + "\n", constants
+
+def _ordered_rules(parsed, order):
+    """
+    Reordena as regras interpretadas segundo uma ordem de avaliação.
+
+    Args:
+        parsed (list): Tuplas (index, shape, values) retornadas por _parse_rules.
+        order (list): Índices das regras na ordem de avaliação, ou None para manter a ordem.
+
+    Returns:
+        list: As tuplas de parsed cujos índices estão em order, na ordem de order.
+    """
+    if order is None:
+        return parsed
+    by_index = {entry[0]: entry for entry in parsed}
+    return [by_index[index] for index in order if index in by_index]
+
+def _sample_headers(compiled, count, seed=0):
+    """
+    Gera cabeçalhos de teste próximos dos valores usados pelas regras (bordas de
+    prefixos e de intervalos de portas), para conferir motores entre si.
+
+    Args:
+        compiled (CompiledRules): Regras compiladas.
+        count (int): Quantidade de cabeçalhos.
+        seed (int): Semente do gerador aleatório.
+
+    Returns:
+        list: Cabeçalhos no formato de HEADER_FIELDS.
+    """
+    generator = random.Random(seed)
+    src_candidates = [None, 0, 0xFFFFFFFF]
+    dst_candidates = [None, 0, 0xFFFFFFFF]
+    protocols = [None] + sorted(set(PROTOCOL_MAP.values())) + [47]
+    for min_index, positions, src_len, dst_len, table, src_checked in compiled.shapes:
+        for key in list(table)[:8]:
+            row = dict(zip(positions, key))
+            for position, length, candidates in ((0, src_len, src_candidates), (1, dst_len, dst_candidates)):
+                if position in row:
+                    network = row[position]
+                    candidates.extend((network, network | (~PREFIX_MASKS[length] & 0xFFFFFFFF), (network - 1) & 0xFFFFFFFF))
+    src_ports = [None, 0, 65535] + [port for boundary in compiled.src_ports.boundaries for port in (boundary - 1, boundary)]
+    dst_ports = [None, 0, 65535] + [port for boundary in compiled.dst_ports.boundaries for port in (boundary - 1, boundary)]
+    return [
+        (
+            generator.choice(src_candidates),
+            generator.choice(dst_candidates),
+            generator.choice(protocols),
+            generator.choice(src_ports),
+            generator.choice(dst_ports),
+        )
+        for _ in range(count)
+    ]
+
+def compile_matcher(rules, compiled=None, order=None):
+    """
+    Gera e compila a função de correspondência das regras com compile()/exec.
+
+    A função gerada é conferida contra o motor indexado em cabeçalhos de teste; se
+    houver divergência, ou se a geração falhar, retorna None para que o chamador use
+    o motor indexado.
+
+    Args:
+        rules (list): Lista de regras.
+        compiled (CompiledRules): Regras já compiladas para a conferência (opcional).
+        order (list): Ordem de avaliação das regras de bloqueio (ver plan_evaluation).
+
+    Returns:
+        function: A função match(header) gerada, ou None.
+    """
+    if compiled is None:
+        compiled = compile_rules(rules)
+    try:
+        source, constants = generate_matcher_source(rules, order)
+        namespace = dict(constants)
+        exec(compile(source, "<regras-geradas>", "exec"), namespace)
+        matcher = namespace["match"]
+        matcher.source = source
+    except Exception as e:
+        print(f"Erro ao gerar função de correspondência: {e}")
+        return None
+
+    # Confere a função gerada contra o motor indexado antes de usá-la
+    for header in _sample_headers(compiled, CODEGEN_CHECK_SAMPLES):
+        if matcher(header) != compiled.match(header):
+            print(f"Função de correspondência gerada diverge do motor indexado para {header}; usando o motor indexado")
+            return None
+    return matcher
+
+#############################
+# OTIMIZAÇÃO DA ORDEM DAS REGRAS
+#############################
+
+# Acima desta quantidade de regras, a otimização (que compara pares de regras) não é feita
+OPTIMIZE_MAX_RULES = 5000
+
+# Quantidade de cabeçalhos usados para medir o custo de avaliação antes e depois da otimização
+OPTIMIZE_COST_SAMPLES = 2000
+
+def _rule_fields(rule):
+    """
+    Interpreta os critérios de uma regra (de bloqueio ou não) para comparação entre regras.
+
+    Args:
+        rule (dict): Regra do firewall.
+
+    Returns:
+        dict: Mapeia a posição de cada campo em HEADER_FIELDS para (valor, tamanho do prefixo),
+              ou None se a regra for inválida ou nunca puder corresponder.
+    """
+    try:
+        compiled = _compile_rule(rule)
+    except (ValueError, TypeError, AttributeError):
+        return None
+    if compiled is None:
+        return None
+    (positions, src_len, dst_len), values = compiled
+    lengths = (src_len, dst_len)
+    return {
+        position: (value, lengths[position] if position in IP_FIELD_POSITIONS else None)
+        for position, value in zip(positions, values)
+    }
+
+def _field_covers(position, outer, inner):
+    """
+    Indica se todos os valores aceitos pelo critério inner também são aceitos por outer.
+    """
+    (outer_value, outer_len), (inner_value, inner_len) = outer, inner
+    if position in IP_FIELD_POSITIONS:
+        return inner_len >= outer_len and (inner_value & PREFIX_MASKS[outer_len]) == outer_value
+    if position in PORT_FIELD_POSITIONS:
+        return all(any(start <= low and high <= end for start, end in outer_value) for low, high in inner_value)
+    return outer_value == inner_value
+
+def _field_overlaps(position, first, second):
+    """
+    Indica se existe algum valor aceito pelos dois critérios.
+    """
+    (first_value, first_len), (second_value, second_len) = first, second
+    if position in IP_FIELD_POSITIONS:
+        mask = PREFIX_MASKS[min(first_len, second_len)]
+        return (first_value & mask) == (second_value & mask)
+    if position in PORT_FIELD_POSITIONS:
+        return any(
+            first_start <= second_end and second_start <= first_end
+            for first_start, first_end in first_value
+            for second_start, second_end in second_value
+        )
+    return first_value == second_value
+
+def rule_covers(outer, inner):
+    """
+    Indica se todo pacote que corresponde à regra inner também corresponde à regra outer.
+
+    Args:
+        outer (dict): Critérios da regra mais abrangente (ver _rule_fields).
+        inner (dict): Critérios da regra mais específica.
+
+    Returns:
+        bool: True se outer cobre inner.
+    """
+    return all(
+        position in inner and _field_covers(position, criterion, inner[position])
+        for position, criterion in outer.items()
+    )
+
+def rules_intersect(first, second):
+    """
+    Indica se algum pacote pode corresponder às duas regras ao mesmo tempo.
+
+    Args:
+        first (dict): Critérios da primeira regra (ver _rule_fields), ou None se inválida.
+        second (dict): Critérios da segunda regra, ou None se inválida.
+
+    Returns:
+        bool: True se as regras se sobrepõem. Regras inválidas são tratadas como
+              sobrepostas a todas, por segurança.
+    """
+    if first is None or second is None:
+        return True
+    return all(
+        _field_overlaps(position, criterion, second[position])
+        for position, criterion in first.items()
+        if position in second
+    )
+
+def _representative_header(fields):
+    """
+    Monta um cabeçalho que corresponde aos critérios de uma regra.
+    """
+    header = [0, 0, PROTOCOL_MAP["tcp"], 0, 0]
+    for position, (value, _) in fields.items():
+        if position in PORT_FIELD_POSITIONS:
+            header[position] = value[0][0]
+        else:
+            header[position] = value
+    return tuple(header)
+
+def _evaluation_cost(rules, order, hits, total):
+    """
+    Estima e mede o custo de avaliar as regras em primeira correspondência, na ordem informada.
+
+    Args:
+        rules (list): Lista de regras.
+        order (list): Índices das regras de bloqueio na ordem de avaliação.
+        hits (list): Acertos de cada regra (mesma ordem de rules).
+        total (int): Total de pacotes avaliados no período dos acertos.
+
+    Returns:
+        dict: "rules_per_packet" (média de regras testadas por pacote, ponderada pelos
+              acertos; None sem tráfego) e "ns_per_packet" (tempo medido com a função
+              gerada sobre cabeçalhos amostrados conforme os acertos; None se a geração falhar).
+    """
+    matched = sum(hits[index] for index in order)
+    misses = max(total - matched, 0)
+    rules_per_packet = None
+    if total:
+        weighted = sum(hits[index] * (position + 1) for position, index in enumerate(order))
+        rules_per_packet = (weighted + misses * len(order)) / total
+
+    # Amostra cabeçalhos das regras proporcionalmente aos acertos (ao menos um por regra)
+    samples = []
+    weight_total = matched or 1
+    for index in order:
+        fields = _rule_fields(rules[index])
+        if fields is None:
+            continue
+        repeat = max(1, OPTIMIZE_COST_SAMPLES * hits[index] // weight_total)
+        samples.extend([_representative_header(fields)] * repeat)
+    samples = samples[:OPTIMIZE_COST_SAMPLES] or [(0, 0, 0, 0, 0)]
+
+    ns_per_packet = None
+    try:
+        source, constants = generate_matcher_source(rules, order)
+        namespace = dict(constants)
+        exec(compile(source, "<regras-geradas>", "exec"), namespace)
+        matcher = namespace["match"]
+        # Repete a amostra e guarda a melhor de três medições para reduzir o ruído
+        repeats = max(1, OPTIMIZE_COST_SAMPLES * 10 // len(samples))
+        best = None
+        for _ in range(3):
+            start = time.perf_counter_ns()
+            for _ in range(repeats):
+                for header in samples:
+                    matcher(header)
+            elapsed = time.perf_counter_ns() - start
+            best = elapsed if best is None else min(best, elapsed)
+        ns_per_packet = best / (repeats * len(samples))
+    except Exception as e:
+        print(f"Erro ao medir custo de avaliação: {e}")
+    return {"rules_per_packet": rules_per_packet, "ns_per_packet": ns_per_packet}
+
+def plan_evaluation(rules, hits=None, total=0, measure=False):
+    """
+    Calcula uma ordem de avaliação otimizada para as regras, preservando o veredicto
+    e a regra reportada para qualquer pacote.
+
+    - Regras de bloqueio sombreadas (cobertas por uma regra de bloqueio anterior)
+      nunca são a primeira correspondência e são removidas.
+    - Regras de bloqueio cobertas por uma regra de bloqueio posterior são
+      reportadas como redundantes (removê-las muda apenas a regra reportada).
+    - Regras são movidas para frente por frequência de acertos, mas nunca passam
+      por uma regra com a qual se sobrepõem; assim, a primeira regra que corresponde
+      a um pacote continua a mesma.
+
+    Args:
+        rules (list): Lista de regras.
+        hits (list): Acertos de cada regra (mesma ordem de rules). Se None, não reordena.
+        total (int): Total de pacotes avaliados no período dos acertos.
+        measure (bool): Se True, mede o custo de avaliação antes e depois.
+
+    Returns:
+        tuple: Um par (order, report), onde:
+               - order (list): Índices de todas as regras mantidas (inclusive as de
+                 permissão), na nova ordem.
+               - report (dict): "removed", "redundant", "moved" e, se measure, "cost_before"
+                 e "cost_after".
+    """
+    report = {"removed": [], "redundant": [], "moved": []}
+    if len(rules) > OPTIMIZE_MAX_RULES:
+        report["skipped"] = f"mais de {OPTIMIZE_MAX_RULES} regras"
+        return list(range(len(rules))), report
+    if hits is None:
+        hits = [0] * len(rules)
+
+    fields = [_rule_fields(rule) for rule in rules]
+    blocks = [index for index, rule in enumerate(rules) if rule.get("action") == "block" and fields[index] is not None]
+
+    # Detecta regras sombreadas (cobertas por uma anterior) e redundantes (cobertas por uma posterior)
+    removed = set()
+    for position, index in enumerate(blocks):
+        shadow = next((earlier for earlier in blocks[:position] if earlier not in removed and rule_covers(fields[earlier], fields[index])), None)
+        if shadow is not None:
+            removed.add(index)
+            report["removed"].append({"index": index, "rule": rules[index], "covered_by": shadow})
+            continue
+        later = next((following for following in blocks[position + 1:] if rule_covers(fields[following], fields[index])), None)
+        if later is not None:
+            report["redundant"].append({"index": index, "rule": rules[index], "covered_by": later})
+
+    # Reordena por frequência de acertos (ordenação por inserção estável, sem
+    # ultrapassar regras sobrepostas)
+    order = []
+    for index in range(len(rules)):
+        if index in removed:
+            continue
+        position = len(order)
+        while (
+            position > 0
+            and hits[order[position - 1]] < hits[index]
+            and not rules_intersect(fields[order[position - 1]], fields[index])
+        ):
+            position -= 1
+        order.insert(position, index)
+
+    old_positions = {index: position for position, index in enumerate(sorted(order))}
+    for new_position, index in enumerate(order):
+        old_position = old_positions[index]
+        if new_position != old_position:
+            report["moved"].append({"index": index, "rule": rules[index], "from": old_position, "to": new_position, "hits": hits[index]})
+
+    if measure:
+        block_set = set(blocks)
+        new_block_order = [index for index in order if index in block_set]
+        report["cost_before"] = _evaluation_cost(rules, blocks, hits, total)
+        report["cost_after"] = _evaluation_cost(rules, new_block_order, hits, total)
+    return order, report
+
+#############################
+# SNAPSHOT IMUTÁVEL DAS REGRAS
+#############################
+
+class RuleSet:
+    """
+    Snapshot imutável e pré-compilado de um conjunto de regras.
+
+    Um RuleSet nunca é alterado depois de criado: qualquer mudança nas regras cria
+    um novo RuleSet, publicado por publish_rules. Por isso a thread de captura pode
+    usá-lo sem lock, mesmo enquanto a interface edita as regras. A única troca feita
+    depois da publicação é a da função gerada pela versão reordenada (ver optimize),
+    que corresponde exatamente às mesmas regras.
+
+    Attributes:
+        rules (tuple): Cópia das regras no momento da publicação.
+        generation (int): Geração do conjunto de regras (ver _generation).
+        compiled (CompiledRules): Regras compiladas para consulta indexada.
+        engine (str): Motor efetivamente em uso ("indexed" ou "codegen").
+        matcher (function): Função match(header) do motor em uso.
+        rule_keys (tuple): Chave de estatísticas de cada regra (ver rule_key).
+        hits (list): Acertos de cada regra na publicação, usados pelo plano de avaliação.
+        plan (tuple): Índices das regras de bloqueio na ordem de avaliação otimizada
+                      (ver plan_evaluation), usada pelos motores que avaliam regra a regra.
+                      Calculado só quando é usado (ver optimize).
+        optimization (dict): Relatório da otimização do plano.
+    """
+
+    __slots__ = ("rules", "generation", "compiled", "engine", "matcher", "rule_keys", "hits", "_plan", "_optimization")
+
+    def __init__(self, rules, generation=0, engine=DEFAULT_ENGINE, hits=None):
+        # Copia as regras para que alterações na lista do chamador não afetem o snapshot
+        self.rules = tuple(copy.deepcopy(list(rules)))
+        self.generation = generation
+        self.rule_keys = tuple(rule_key(rule) for rule in self.rules)
+        self.compiled = compile_rules(self.rules)
+        self.engine = "indexed"
+        self.matcher = self.compiled.match
+        self.hits = hits
+        self._plan = None
+        self._optimization = None
+
+        # O motor gerado é opcional; em caso de falha, o motor indexado continua em uso.
+        # A função é gerada na ordem das regras e trocada pela versão na ordem do plano
+        # quando ele for calculado (ver optimize)
+        if engine == "codegen" and len(self.rules) <= CODEGEN_MAX_RULES:
+            matcher = compile_matcher(self.rules, self.compiled)
+            if matcher is not None:
+                self.engine = "codegen"
+                self.matcher = matcher
+
+    def optimize(self):
+        """
+        Calcula o plano de avaliação: remove regras sombreadas e reordena as demais pela
+        frequência de acertos (ver plan_evaluation). No motor codegen, a função gerada é
+        trocada pela versão na ordem do plano, que dá sempre o mesmo resultado.
+
+        O cálculo compara pares de regras, então não é feito na publicação: roda em
+        segundo plano para o motor codegen e sob demanda para os demais (ver plan).
+        """
+        with _plan_lock:
+            if self._plan is not None:
+                return
+            order, optimization = plan_evaluation(self.rules, self.hits)
+            plan = tuple(index for index in order if self.rules[index].get("action") == "block")
+            if self.engine == "codegen":
+                matcher = compile_matcher(self.rules, self.compiled, plan)
+                if matcher is not None:
+                    self.matcher = matcher
+            self._optimization = optimization
+            self._plan = plan
+
+    @property
+    def plan(self):
+        if self._plan is None:
+            self.optimize()
+        return self._plan
+
+    @property
+    def optimization(self):
+        if self._plan is None:
+            self.optimize()
+        return self._optimization
+
+    def match(self, header):
+        """
+        Procura a primeira regra de bloqueio que corresponde ao cabeçalho.
+
+        Args:
+            header (tuple): Cabeçalho do pacote no formato de HEADER_FIELDS.
+
+        Returns:
+            int: Índice da regra correspondente, ou None se nenhuma regra corresponder.
+        """
+        return self.matcher(header)
+
+# Serializa o cálculo dos planos de avaliação (ver RuleSet.optimize)
+_plan_lock = threading.Lock()
+
+# Publica um conjunto vazio até a primeira chamada de load_rules
+_snapshot = RuleSet([])
+
+#############################
+# CACHE DE VEREDICTOS POR FLUXO
+#############################
+
+# Quantidade máxima padrão de fluxos no cache (0 desativa o cache)
+DEFAULT_CACHE_SIZE = 65536
+
+# Tempo de vida padrão, em segundos, de um veredicto no cache
+DEFAULT_CACHE_TTL = 30.0
+
+class VerdictCache:
+    """
+    Cache LRU limitado de veredictos, indexado pela 5-tupla do fluxo
+    (src_ip, dst_ip, protocol, src_port, dst_port).
+
+    Pacotes do mesmo fluxo recebem sempre o mesmo veredicto enquanto o conjunto de
+    regras não muda, então o resultado de CompiledRules.match pode ser reaproveitado.
+    O cache inteiro é descartado quando a geração das regras muda, e cada entrada
+    expira após ttl segundos.
+
+    O cache não usa lock: lookup supõe um único consumidor por processo, a thread que
+    chama apply_rules_header (a thread de avaliação da fila, a própria thread de
+    captura quando não há fila ou o laço do replay). Uma segunda thread avaliando
+    pacotes ao mesmo tempo corromperia a sequência move_to_end/popitem do OrderedDict.
+
+    Attributes:
+        max_entries (int): Quantidade máxima de fluxos armazenados.
+        ttl (float): Tempo de vida de uma entrada, em segundos.
+        generation (int): Geração das regras usada para calcular as entradas atuais.
+        hits (int): Consultas atendidas pelo cache.
+        misses (int): Consultas que precisaram avaliar as regras.
+        evictions (int): Entradas removidas por falta de espaço.
+        expirations (int): Entradas removidas por terem expirado.
+        invalidations (int): Vezes em que o cache foi descartado por mudança de geração.
+    """
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation = None
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def lookup(self, ruleset, header):
+        """
+        Retorna o índice da regra correspondente ao fluxo, consultando o cache antes das regras.
+
+        Args:
+            ruleset (RuleSet): Snapshot de regras em uso.
+            header (tuple): Cabeçalho do pacote no formato de HEADER_FIELDS.
+
+        Returns:
+            int: Índice da regra correspondente, ou None se nenhuma regra corresponder.
+        """
+        if self.max_entries <= 0:
+            return ruleset.matcher(header)
+
+        # Descarta todas as entradas se as regras mudaram desde que foram calculadas
+        if ruleset.generation != self.generation:
+            if self.entries:
+                self.invalidations += 1
+                self.entries = OrderedDict()
+            self.generation = ruleset.generation
+
+        now = time.monotonic()
+        entry = self.entries.get(header)
+        if entry is not None:
+            expires_at, index = entry
+            if expires_at > now:
+                self.hits += 1
+                self.entries.move_to_end(header)
+                return index
+            del self.entries[header]
+            self.expirations += 1
+
+        self.misses += 1
+        index = ruleset.matcher(header)
+        self.entries[header] = (now + self.ttl, index)
+        # Remove o fluxo usado há mais tempo quando o limite é excedido
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return index
+
+    def stats(self):
+        """
+        Retorna os contadores do cache.
+
+        Returns:
+            dict: Contadores de acertos, falhas, remoções e o tamanho atual do cache.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "size": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "generation": self.generation,
+        }
+
+# Cache de veredictos usado por apply_rules com as regras carregadas
+verdict_cache = VerdictCache()
+
+# Função para configurar o tamanho e o tempo de vida do cache de veredictos
+def configure_verdict_cache(max_entries=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+    """
+    Substitui o cache de veredictos por um novo cache vazio com os limites informados.
+
+    Args:
+        max_entries (int): Quantidade máxima de fluxos (0 desativa o cache).
+        ttl (float): Tempo de vida de cada veredicto, em segundos.
+    """
+    global verdict_cache
+    verdict_cache = VerdictCache(max_entries, ttl)
+
+# Função para obter os contadores do cache de veredictos
+def get_cache_stats():
+    """
+    Retorna os contadores do cache de veredictos.
+
+    Returns:
+        dict: Ver VerdictCache.stats.
+    """
+    return verdict_cache.stats()
+
+#############################
+# ESTATÍSTICAS DAS REGRAS
+#############################
+
+def rule_key(rule):
+    """
+    Retorna a chave usada para acumular as estatísticas de uma regra.
+
+    A chave depende apenas do conteúdo da regra, então as estatísticas sobrevivem à
+    publicação de novos snapshots e à reordenação das regras.
+
+    Args:
+        rule (dict): Regra do firewall.
+
+    Returns:
+        str: O conteúdo da regra serializado em JSON com chaves ordenadas.
+    """
+    return json.dumps(rule, sort_keys=True, default=str)
+
+class RuleStats:
+    """
+    Contadores por regra: quantidade de acertos, momento do último acerto, bytes
+    correspondidos e tempo total de avaliação dos pacotes que a regra bloqueou.
+    Atualizado apenas pela thread que chama apply_rules_header (ver VerdictCache);
+    a interface lê uma cópia.
+
+    Attributes:
+        entries (dict): Mapeia a chave da regra (ver rule_key) para [hits, last_hit, bytes, total_ns].
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def record(self, key, length, elapsed_ns, now):
+        """
+        Registra um acerto de uma regra.
+
+        Args:
+            key (str): Chave da regra.
+            length (int): Tamanho do pacote em bytes.
+            elapsed_ns (int): Tempo de avaliação do pacote, em nanossegundos.
+            now (float): Timestamp do acerto (segundos desde a época Unix).
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = [0, None, 0, 0]
+        entry[0] += 1
+        entry[1] = now
+        entry[2] += length
+        entry[3] += elapsed_ns
+
+    def merge(self, other):
+        """
+        Soma os contadores de outro RuleStats a este (ex.: de outro processo de captura).
+
+        Args:
+            other (RuleStats): Contadores a serem somados.
+        """
+        for key, (hits, last_hit, matched_bytes, total_ns) in other.entries.items():
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = [0, None, 0, 0]
+            entry[0] += hits
+            if last_hit is not None and (entry[1] is None or last_hit > entry[1]):
+                entry[1] = last_hit
+            entry[2] += matched_bytes
+            entry[3] += total_ns
+
+    def get(self, key):
+        """
+        Retorna os contadores de uma regra.
+
+        Args:
+            key (str): Chave da regra.
+
+        Returns:
+            dict: Acertos, último acerto, bytes e latência média em microssegundos.
+        """
+        hits, last_hit, matched_bytes, total_ns = self.entries.get(key, (0, None, 0, 0))
+        return {
+            "hits": hits,
+            "last_hit": last_hit,
+            "bytes": matched_bytes,
+            "mean_latency_us": (total_ns / hits / 1000.0) if hits else None,
+        }
+
+# Contadores por regra e histograma de latência de apply_rules
+rule_stats = RuleStats()
+latency_histogram = LatencyHistogram()
+
+# Função para obter as estatísticas de uma lista de regras
+def get_rule_stats(rules=None):
+    """
+    Retorna as estatísticas de cada regra, na ordem da lista informada.
+
+    Args:
+        rules (list): Lista de regras. Se None, usa as regras carregadas.
+
+    Returns:
+        list: Um dict por regra (ver RuleStats.get).
+    """
+    if rules is None:
+        rules = _snapshot.rules
+    return [rule_stats.get(rule_key(rule)) for rule in rules]
+
+# Função para obter o resumo do histograma de latência
+def get_latency_stats():
+    """
+    Retorna o resumo do histograma de latência de apply_rules, em microssegundos.
+
+    Returns:
+        dict: Ver LatencyHistogram.summary.
+    """
+    return latency_histogram.summary()
+
+# Função para zerar as estatísticas das regras e o histograma de latência
+def reset_rule_stats():
+    """
+    Zera os contadores por regra e o histograma de latência.
+    """
+    global rule_stats, latency_histogram
+    rule_stats = RuleStats()
+    latency_histogram = LatencyHistogram()
+
+# Função para otimizar a lista de regras sob demanda
+def optimize_rules(rules=None):
+    """
+    Otimiza uma lista de regras com base nos acertos observados: remove regras de
+    bloqueio sombreadas e reordena as demais por frequência, sem mudar o veredicto
+    nem a regra reportada para nenhum pacote (ver plan_evaluation).
+
+    Args:
+        rules (list): Lista de regras. Se None, usa uma cópia das regras carregadas.
+
+    Returns:
+        tuple: Um par (optimized, report), onde optimized é a nova lista de regras
+               (pronta para save_rules) e report é o relatório da otimização, com o
+               custo de avaliação medido antes e depois.
+    """
+    if rules is None:
+        rules = get_rules()
+    hits = [stats["hits"] for stats in get_rule_stats(rules)]
+    order, report = plan_evaluation(rules, hits, latency_histogram.count, measure=True)
+    return [rules[index] for index in order], report
+
+# Função para extrair os campos usados pelas regras de um pacote capturado
+def extract_header(packet):
+    """
+    Extrai uma única vez os campos do pacote usados na avaliação das regras.
+
+    Args:
+        packet: O pacote capturado pela Scapy.
+
+    Returns:
+        tuple: (src_ip, dst_ip, protocol, src_port, dst_port), com os IPs convertidos
+               para inteiros. Campos ausentes são None.
+    """
+    src_ip = dst_ip = proto = src_port = dst_port = None
+    if IP in packet:
+        ip_layer = packet[IP]
+        src_ip, dst_ip, proto = ip_to_int(ip_layer.src), ip_to_int(ip_layer.dst), ip_layer.proto
+    if TCP in packet:
+        src_port, dst_port = packet[TCP].sport, packet[TCP].dport
+    elif UDP in packet:
+        src_port, dst_port = packet[UDP].sport, packet[UDP].dport
+    return src_ip, dst_ip, proto, src_port, dst_port
+
+# Função para obter o tamanho de um pacote sem reconstruí-lo
+def packet_length(packet):
+    """
+    Retorna o tamanho do pacote em bytes, lido do campo de tamanho do cabeçalho IP.
+
+    Args:
+        packet: O pacote capturado pela Scapy.
+
+    Returns:
+        int: Tamanho do pacote IP, ou o tamanho do quadro se não houver IP.
+    """
+    if IP in packet:
+        ip_layer = packet[IP]
+        # Pacotes montados localmente (não capturados) ainda não têm o campo preenchido
+        return ip_layer.len if ip_layer.len is not None else len(ip_layer)
+    return len(packet)
+
 # Função para aplicar as regras do firewall a um pacote capturado
 def apply_rules(packet, rules=None):
     """
@@ -68,7 +1240,8 @@ def apply_rules(packet, rules=None):
 
     Args:
         packet: O pacote capturado pela Scapy.
-        rules: Lista de regras a serem aplicadas. Se None, usa as regras carregadas.
+        rules: Lista de regras a serem aplicadas. Se None, usa o snapshot publicado
+               (já compilado em load_rules/save_rules), sem usar lock.
 
     Returns:
         tuple: Um par (action, rule), onde:
@@ -76,56 +1249,186 @@ def apply_rules(packet, rules=None):
                - rule (dict): A regra que causou o bloqueio, ou None se permitido.
     """
     if rules is None:
-        rules = get_rules()
+        # A latência registrada inclui a extração dos campos pela Scapy
+        start = time.perf_counter_ns()
+        return apply_rules_header(extract_header(packet), packet_length(packet), start)
 
-    # Itera sobre todas as regras
-    for rule in rules:
-        # Verifica se a ação da regra é "block" (bloquear)
-        if rule["action"] == "block":
-            # Flag para verificar se todos os critérios da regra são atendidos
-            match = True
-
-            # Verifica o IP de origem, se especificado na regra
-            if "src_ip" in rule:
-                if not (IP in packet and packet[IP].src == rule["src_ip"]):
-                    match = False
-
-            # Verifica o IP de destino, se especificado na regra
-            if "dst_ip" in rule:
-                if not (IP in packet and packet[IP].dst == rule["dst_ip"]):
-                    match = False
-
-            # Verifica o protocolo, se especificado na regra
-            if "protocol" in rule:
-                # Mapeia o nome do protocolo para o número (ex.: "tcp" -> 6)
-                protocol_map = {"tcp": 6, "udp": 17, "icmp": 1}
-                expected_proto = protocol_map.get(rule["protocol"].lower(), None)
-                if not (IP in packet and expected_proto is not None and packet[IP].proto == expected_proto):
-                    match = False
-
-            # Verifica a porta de origem, se especificada na regra
-            if "src_port" in rule:
-                src_port = None
-                if TCP in packet:
-                    src_port = packet[TCP].sport
-                elif UDP in packet:
-                    src_port = packet[UDP].sport
-                if src_port is None or src_port != int(rule["src_port"]):
-                    match = False
-
-            # Verifica a porta de destino, se especificada na regra
-            if "dst_port" in rule:
-                dst_port = None
-                if TCP in packet:
-                    dst_port = packet[TCP].dport
-                elif UDP in packet:
-                    dst_port = packet[UDP].dport
-                if dst_port is None or dst_port != int(rule["dst_port"]):
-                    match = False
-
-            # Se todos os critérios da regra forem atendidos, bloqueia o pacote
-            if match:
-                return "blocked", rule
+    header = extract_header(packet)
+    # Regras avulsas não passam pelo cache, pois não têm geração própria
+    ruleset = compile_rules(rules)
+    index = ruleset.match(header)
+    if index is not None:
+        return "blocked", ruleset.rules[index]
 
     # Se nenhuma regra bloquear o pacote, ele é permitido
-    return "allowed", None
\ No newline at end of file
+    return "allowed", None
+
+# Função para aplicar as regras publicadas a um cabeçalho já extraído
+def apply_rules_header(header, length=0, start=None):
+    """
+    Aplica as regras publicadas a um cabeçalho já extraído, passando pelo cache de
+    veredictos e registrando a latência e os contadores por regra, como apply_rules.
+
+    É o ponto de entrada do caminho rápido de captura, em que o cabeçalho vem do
+    decodificador de bytes (decoder.decode_frame) e não de um pacote da Scapy.
+
+    Args:
+        header (tuple): (src_ip, dst_ip, protocol, src_port, dst_port), com IPs inteiros.
+        length (int): Tamanho do pacote em bytes (contabilizado na regra que bloquear).
+        start (int): Instante inicial da medição (time.perf_counter_ns). Se None, mede
+                     apenas a avaliação.
+
+    Returns:
+        tuple: Um par (action, rule), como em apply_rules.
+    """
+    if start is None:
+        start = time.perf_counter_ns()
+    # Lê a referência do snapshot uma única vez; ele não muda durante a avaliação
+    ruleset = _snapshot
+    # Consulta o cache de veredictos do fluxo antes das tabelas compiladas
+    index = verdict_cache.lookup(ruleset, header)
+
+    # Registra a latência da avaliação e, se houve bloqueio, os contadores da regra
+    elapsed = time.perf_counter_ns() - start
+    latency_histogram.record(elapsed)
+    if index is None:
+        return "allowed", None
+
+    rule_stats.record(ruleset.rule_keys[index], length, elapsed, time.time())
+    return "blocked", ruleset.rules[index]
+
+#############################
+# AVALIAÇÃO VETORIZADA EM LOTE
+#############################
+
+# Protocolos que possuem portas de origem e destino (TCP e UDP)
+_PORT_PROTOCOLS = (PROTOCOL_MAP["tcp"], PROTOCOL_MAP["udp"])
+
+def _batch_condition(position, value, prefix_length, columns):
+    """
+    Calcula a máscara booleana de um critério de regra sobre as colunas do lote.
+
+    Args:
+        position (int): Posição do campo em HEADER_FIELDS.
+        value: Valor compilado da regra (rede inteira, protocolo ou intervalos de portas).
+        prefix_length (int): Tamanho do prefixo, para campos de IP.
+        columns (tuple): Colunas (src_ip, dst_ip, protocol, src_port, dst_port, has_ports).
+
+    Returns:
+        numpy.ndarray: Máscara booleana das linhas que atendem ao critério.
+    """
+    column = columns[position]
+    if position in IP_FIELD_POSITIONS:
+        return (column & np.uint32(PREFIX_MASKS[prefix_length])) == np.uint32(value)
+    if position in PORT_FIELD_POSITIONS:
+        mask = np.zeros(len(column), dtype=bool)
+        singles = [start for start, end in value if start == end]
+        for start, end in value:
+            if start != end:
+                mask |= (column >= start) & (column <= end)
+        if singles:
+            mask |= np.isin(column, singles)
+        # Portas só existem em pacotes TCP/UDP
+        return mask & columns[5]
+    return column == value
+
+def apply_rules_batch(src_ip, dst_ip, protocol, src_port, dst_port, rules=None):
+    """
+    Aplica as regras do firewall a um lote de pacotes representado por colunas NumPy.
+
+    Cada regra de bloqueio vira um conjunto de máscaras vetorizadas, avaliado apenas
+    sobre as linhas ainda sem veredicto; a primeira regra que marca uma linha é a
+    regra registrada para ela (mesma semântica de primeira correspondência de
+    apply_rules). Útil para reprocessar logs ou capturas com um novo rules.json.
+
+    As portas só são consideradas em linhas TCP (6) ou UDP (17); nas demais, o valor
+    das colunas de porta é ignorado.
+
+    Args:
+        src_ip: Array de IPs de origem como inteiros (uint32).
+        dst_ip: Array de IPs de destino como inteiros (uint32).
+        protocol: Array de números de protocolo (uint8).
+        src_port: Array de portas de origem (uint16).
+        dst_port: Array de portas de destino (uint16).
+        rules: Lista de regras a serem aplicadas. Se None, usa o snapshot publicado.
+
+    Returns:
+        tuple: Um par (verdicts, rule_indices), onde:
+               - verdicts (numpy.ndarray): uint8, 1 para "blocked" e 0 para "allowed".
+               - rule_indices (numpy.ndarray): int32, índice da regra correspondente ou -1.
+    """
+    order = None
+    if rules is None:
+        ruleset = _snapshot
+        rules, order = ruleset.rules, ruleset.plan
+
+    src_ip = np.asarray(src_ip, dtype=np.uint32)
+    dst_ip = np.asarray(dst_ip, dtype=np.uint32)
+    protocol = np.asarray(protocol, dtype=np.uint8)
+    src_port = np.asarray(src_port, dtype=np.int32)
+    dst_port = np.asarray(dst_port, dtype=np.int32)
+    has_ports = np.isin(protocol, _PORT_PROTOCOLS)
+
+    count = len(protocol)
+    verdicts = np.zeros(count, dtype=np.uint8)
+    rule_indices = np.full(count, -1, dtype=np.int32)
+    columns = (src_ip, dst_ip, protocol, src_port, dst_port, has_ports)
+
+    # Linhas ainda sem veredicto; cada regra só é avaliada sobre elas
+    undecided = np.ones(count, dtype=bool)
+    remaining = count
+    for index, shape, values in _ordered_rules(_parse_rules(rules), order):
+        if remaining == 0:
+            break
+        # Avalia primeiro os critérios mais seletivos (prefixos longos, portas, protocolo)
+        conditions = sorted(
+            zip(shape[0], values),
+            key=lambda item: (-shape[1 + item[0]] if item[0] in IP_FIELD_POSITIONS else 0, item[0] == 2),
+        )
+        if not conditions:
+            matched = np.flatnonzero(undecided)
+        else:
+            # O primeiro critério varre as colunas inteiras; os demais, só as linhas candidatas
+            position, value = conditions[0]
+            prefix_length = shape[1 + position] if position in IP_FIELD_POSITIONS else None
+            matched = np.flatnonzero(_batch_condition(position, value, prefix_length, columns) & undecided)
+            for position, value in conditions[1:]:
+                if len(matched) == 0:
+                    break
+                prefix_length = shape[1 + position] if position in IP_FIELD_POSITIONS else None
+                candidates = tuple(column[matched] for column in columns)
+                matched = matched[_batch_condition(position, value, prefix_length, candidates)]
+        if len(matched):
+            verdicts[matched] = 1
+            rule_indices[matched] = index
+            undecided[matched] = False
+            remaining -= len(matched)
+
+    return verdicts, rule_indices
+
+def logs_to_columns(logs):
+    """
+    Converte entradas de log em dicts (ex.: lidas de um CSV exportado) nas colunas usadas
+    por apply_rules_batch. As colunas de data.packet_logs (ver PacketLogStore.snapshot)
+    já estão nesse formato.
+
+    Args:
+        logs (list): Lista de entradas de log.
+
+    Returns:
+        dict: Colunas "src_ip", "dst_ip", "protocol", "src_port" e "dst_port" como arrays NumPy.
+              Campos ausentes viram 0.
+    """
+    def ip_column(key):
+        return np.fromiter((ip_to_int(entry[key]) if entry.get(key) else 0 for entry in logs), dtype=np.uint32, count=len(logs))
+
+    def int_column(key, dtype):
+        return np.fromiter((entry.get(key) or 0 for entry in logs), dtype=dtype, count=len(logs))
+
+    return {
+        "src_ip": ip_column("src_ip"),
+        "dst_ip": ip_column("dst_ip"),
+        "protocol": int_column("protocol", np.uint8),
+        "src_port": int_column("src_port", np.uint16),
+        "dst_port": int_column("dst_port", np.uint16),
+    }
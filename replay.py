@@ -0,0 +1,276 @@
+# Importa argparse para ler as opções de linha de comando da reprodução
+import argparse
+
+# Importa json para ler regras candidatas e emitir o relatório
+import json
+
+# Importa mmap para ler o arquivo de captura sem carregá-lo inteiro na memória
+import mmap
+
+# Importa struct para ler os cabeçalhos do pcap e do pcapng
+import struct
+
+# Importa sys para escrever o progresso na saída de erro (a saída padrão recebe o JSON)
+import sys
+
+# Importa time para medir a vazão e reproduzir o ritmo original da captura
+import time
+
+# Importa as variáveis compartilhadas com as estatísticas e os logs dos pacotes
+from data import log_lock, packet_stats
+
+# Importa o motor de regras e o mesmo processamento de quadros da captura ao vivo
+import regras
+from main import frame_handler, flush_log_batch, configure_flow_logging
+
+#############################
+# FORMATOS DE ARQUIVO
+#############################
+
+# Números mágicos do pcap clássico: (ordem de bytes, divisor da fração do timestamp)
+PCAP_MAGICS = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e6),  # microssegundos, little-endian
+    b"\xa1\xb2\xc3\xd4": (">", 1e6),  # microssegundos, big-endian
+    b"\x4d\x3c\xb2\xa1": ("<", 1e9),  # nanossegundos, little-endian
+    b"\xa1\xb2\x3c\x4d": (">", 1e9),  # nanossegundos, big-endian
+}
+
+# Tipos de bloco do pcapng usados
+PCAPNG_SECTION_HEADER = 0x0A0D0D0A
+PCAPNG_INTERFACE_DESCRIPTION = 0x00000001
+PCAPNG_SIMPLE_PACKET = 0x00000003
+PCAPNG_ENHANCED_PACKET = 0x00000006
+
+# Marcador de ordem de bytes do bloco de seção do pcapng
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+# Opção de resolução do timestamp da interface (if_tsresol)
+PCAPNG_OPTION_TSRESOL = 9
+
+# Intervalo de pacotes entre as mensagens de progresso
+PROGRESS_INTERVAL = 100000
+
+#############################
+# LEITURA DE ARQUIVOS DE CAPTURA
+#############################
+
+def _read_pcap(contents):
+    """
+    Percorre os pacotes de um arquivo pcap clássico.
+
+    Yields:
+        tuple: (timestamp, frame, linktype), com o quadro como memoryview sobre o arquivo.
+    """
+    order, fraction = PCAP_MAGICS[bytes(contents[:4])]
+    linktype = struct.unpack_from(order + "I", contents, 20)[0] & 0x0FFFFFFF
+    record_header = struct.Struct(order + "IIII")
+    position = 24
+    end = len(contents)
+    while position + 16 <= end:
+        seconds, subseconds, captured, _ = record_header.unpack_from(contents, position)
+        position += 16
+        if position + captured > end:
+            break  # Último pacote truncado
+        yield seconds + subseconds / fraction, contents[position:position + captured], linktype
+        position += captured
+
+def _tsresol_divisor(options, order):
+    """
+    Retorna o divisor do timestamp de uma interface pcapng a partir das suas opções.
+    """
+    position = 0
+    while position + 4 <= len(options):
+        code, length = struct.unpack_from(order + "HH", options, position)
+        if code == 0:
+            break
+        if code == PCAPNG_OPTION_TSRESOL and length >= 1:
+            value = options[position + 4]
+            # Bit mais significativo indica potência de 2; caso contrário, potência de 10
+            return float(2 ** (value & 0x7F)) if value & 0x80 else float(10 ** value)
+        position += 4 + ((length + 3) & ~3)
+    return 1e6
+
+def _read_pcapng(contents):
+    """
+    Percorre os pacotes de um arquivo pcapng (várias seções e interfaces).
+
+    Yields:
+        tuple: (timestamp, frame, linktype), com o quadro como memoryview sobre o arquivo.
+               Pacotes de blocos simples (sem timestamp) recebem o timestamp 0.
+    """
+    position = 0
+    end = len(contents)
+    order = "<"
+    interfaces = []
+    while position + 12 <= end:
+        block_type = struct.unpack_from(order + "I", contents, position)[0]
+        if block_type == PCAPNG_SECTION_HEADER:
+            # Cada seção define a sua ordem de bytes e a sua lista de interfaces
+            magic = struct.unpack_from("<I", contents, position + 8)[0]
+            order = "<" if magic == PCAPNG_BYTE_ORDER_MAGIC else ">"
+            interfaces = []
+        block_length = struct.unpack_from(order + "I", contents, position + 4)[0]
+        if block_length < 12 or position + block_length > end:
+            break  # Bloco corrompido ou truncado
+        body = position + 8
+        if block_type == PCAPNG_INTERFACE_DESCRIPTION:
+            linktype = struct.unpack_from(order + "H", contents, body)[0]
+            options = bytes(contents[body + 8:position + block_length - 4])
+            interfaces.append((linktype, _tsresol_divisor(options, order)))
+        elif block_type == PCAPNG_ENHANCED_PACKET:
+            interface, high, low, captured, _ = struct.unpack_from(order + "IIIII", contents, body)
+            linktype, divisor = interfaces[interface]
+            start = body + 20
+            yield ((high << 32) | low) / divisor, contents[start:start + captured], linktype
+        elif block_type == PCAPNG_SIMPLE_PACKET and interfaces:
+            original = struct.unpack_from(order + "I", contents, body)[0]
+            captured = min(original, block_length - 16)
+            yield 0.0, contents[body + 4:body + 4 + captured], interfaces[0][0]
+        position += block_length
+
+def read_capture(path):
+    """
+    Percorre os pacotes de um arquivo pcap ou pcapng mapeado em memória.
+
+    Os quadros são memoryviews sobre o arquivo, válidos até o próximo pacote ser
+    pedido; quem precisar guardar um quadro deve copiá-lo (bytes(frame)).
+
+    Args:
+        path (str): Caminho do arquivo de captura.
+
+    Yields:
+        tuple: (timestamp, frame, linktype) de cada pacote, na ordem do arquivo.
+
+    Raises:
+        ValueError: Se o arquivo não for pcap nem pcapng.
+    """
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            contents = memoryview(mapped)
+            magic = bytes(contents[:4])
+            if magic in PCAP_MAGICS:
+                packets = _read_pcap(contents)
+            elif len(contents) >= 4 and struct.unpack_from("<I", contents)[0] == PCAPNG_SECTION_HEADER:
+                packets = _read_pcapng(contents)
+            else:
+                contents.release()
+                raise ValueError(f"formato de captura desconhecido: {path}")
+            try:
+                for timestamp, frame, linktype in packets:
+                    try:
+                        yield timestamp, frame, linktype
+                    finally:
+                        # Libera o quadro para que o mapeamento possa ser fechado depois
+                        frame.release()
+            finally:
+                packets.close()
+                contents.release()
+
+#############################
+# REPRODUÇÃO
+#############################
+
+def replay_capture(path, speed=None, limit=None, progress=False):
+    """
+    Reproduz um arquivo de captura pelo mesmo processamento da captura ao vivo
+    (decodificação, regras publicadas, estatísticas e logs), sem precisar de
+    permissões de captura.
+
+    Args:
+        path (str): Caminho do arquivo pcap ou pcapng.
+        speed (float): Velocidade relativa ao ritmo original (1.0 = tempo real, 2.0 = duas
+                       vezes mais rápido). Se None ou 0, reproduz o mais rápido possível.
+        limit (int): Quantidade máxima de pacotes reproduzidos. Se None, reproduz o arquivo inteiro.
+        progress (bool): Escreve o progresso na saída de erro.
+
+    Returns:
+        dict: Relatório com vazão, veredictos, estatísticas dos pacotes e acertos por regra.
+    """
+    verdicts = {"allowed": 0, "blocked": 0}
+    packets = skipped = total_bytes = 0
+    first_timestamp = None
+    clock = time.perf_counter
+    start = clock()
+
+    for timestamp, frame, linktype in read_capture(path):
+        if limit is not None and packets >= limit:
+            break
+        if speed:
+            # Espera até o instante do pacote na escala de tempo da reprodução
+            if first_timestamp is None:
+                first_timestamp = timestamp
+            delay = (timestamp - first_timestamp) / speed - (clock() - start)
+            if delay > 0:
+                time.sleep(delay)
+        packets += 1
+        total_bytes += len(frame)
+        # Copia o quadro: ele pode ficar guardado para a visualização detalhada
+        result = frame_handler((timestamp, bytes(frame), linktype))
+        if result is None:
+            skipped += 1
+        else:
+            verdicts[result[0]] += 1
+        if progress and packets % PROGRESS_INTERVAL == 0:
+            print(f"{packets} pacotes reproduzidos", file=sys.stderr)
+
+    flush_log_batch()
+    elapsed = clock() - start
+    with log_lock:
+        stats = dict(packet_stats)
+
+    snapshot = regras.get_snapshot()
+    rule_stats = regras.get_rule_stats(list(snapshot.rules))
+    return {
+        "file": path,
+        "speed": speed or None,
+        "packets": packets,
+        "skipped": skipped,
+        "bytes": total_bytes,
+        "elapsed_s": elapsed,
+        "pps": packets / elapsed if elapsed else 0.0,
+        "mbps": total_bytes * 8 / elapsed / 1e6 if elapsed else 0.0,
+        "verdicts": verdicts,
+        "packet_stats": stats,
+        "latency": regras.get_latency_stats(),
+        "rules": [
+            {"rule": rule, "hits": rule_hits["hits"], "bytes": rule_hits["bytes"]}
+            for rule, rule_hits in zip(snapshot.rules, rule_stats)
+        ],
+    }
+
+def main():
+    """
+    Lê as opções de linha de comando, reproduz o arquivo e grava o relatório em JSON.
+    """
+    parser = argparse.ArgumentParser(description="Reprodução de capturas pcap/pcapng pelo motor de regras")
+    parser.add_argument("capture", help="Arquivo pcap ou pcapng")
+    parser.add_argument("--rules", help="Arquivo JSON com as regras candidatas (padrão: rules.json)")
+    parser.add_argument("--speed", type=float, default=0, help="Velocidade relativa ao ritmo original (0 = o mais rápido possível)")
+    parser.add_argument("--limit", type=int, help="Quantidade máxima de pacotes reproduzidos")
+    parser.add_argument("--output", default="-", help="Arquivo JSON de saída ('-' para a saída padrão)")
+    parser.add_argument("--flows", action="store_true", help="Grava um registro por fluxo em vez de um por pacote")
+    args = parser.parse_args()
+
+    if args.flows:
+        configure_flow_logging()
+
+    if args.rules:
+        # Publica as regras candidatas sem alterar o rules.json
+        with open(args.rules, "r") as f:
+            regras.publish_rules(json.load(f))
+
+    report = replay_capture(args.capture, args.speed, args.limit, progress=True)
+    print(
+        f"{report['packets']} pacotes em {report['elapsed_s']:.2f} s ({report['pps']:.0f} pps) | "
+        f"permitidos {report['verdicts']['allowed']} | bloqueados {report['verdicts']['blocked']}",
+        file=sys.stderr,
+    )
+    output = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(output)
+    else:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+if __name__ == "__main__":
+    main()
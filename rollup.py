@@ -0,0 +1,243 @@
+# Importa as posições das colunas nas linhas de log, usadas para agregar um lote
+from logstore import LOG_COLUMN_NAMES
+
+#############################
+# CONFIGURAÇÃO DAS SÉRIES AGREGADAS
+#############################
+
+# Níveis de agregação: (resolução em segundos, retenção em segundos). Cada pacote é
+# somado em todos os níveis ao mesmo tempo; os níveis mais grossos guardam mais tempo
+ROLLUP_TIERS = (
+    (1, 15 * 60),  # 1 s durante 15 minutos
+    (10, 6 * 3600),  # 10 s durante 6 horas
+    (60, 2 * 86400),  # 1 min durante 2 dias
+    (3600, 30 * 86400),  # 1 h durante 30 dias
+)
+
+# Campos da chave de cada contador, na ordem da tupla
+ROLLUP_KEY_FIELDS = ("direction", "protocol", "action", "rule_id")
+
+# Posições dos campos usados na agregação dentro das linhas de log (ver logstore.LOG_COLUMNS)
+_TIMESTAMP = LOG_COLUMN_NAMES.index("timestamp")
+_LENGTH = LOG_COLUMN_NAMES.index("length")
+_KEY_POSITIONS = tuple(LOG_COLUMN_NAMES.index(field) for field in ROLLUP_KEY_FIELDS)
+
+#############################
+# AGREGAÇÃO DE LOTES
+#############################
+
+def rollup_counts(rows):
+    """
+    Agrega as linhas de um lote de log em contadores por segundo.
+
+    Feita fora do log_lock pela thread de captura; o resultado é somado às séries
+    compartilhadas por TrafficRollup.update.
+
+    Args:
+        rows (list): Tuplas com os campos na ordem de logstore.LOG_COLUMN_NAMES.
+
+    Returns:
+        dict: {(second, direction, protocol, action, rule_id): [packets, bytes]}.
+    """
+    direction, protocol, action, rule_id = _KEY_POSITIONS
+    counts = {}
+    for row in rows:
+        key = (int(row[_TIMESTAMP]), row[direction], row[protocol], row[action], row[rule_id])
+        entry = counts.get(key)
+        if entry is None:
+            counts[key] = [1, row[_LENGTH]]
+        else:
+            entry[0] += 1
+            entry[1] += row[_LENGTH]
+    return counts
+
+#############################
+# SÉRIES TEMPORAIS AGREGADAS
+#############################
+
+class TrafficRollup:
+    """
+    Contadores de pacotes e bytes por intervalo de tempo, mantidos incrementalmente.
+
+    Cada nível (ver ROLLUP_TIERS) guarda, para cada intervalo, um contador por chave
+    (direção, protocolo, ação, regra). Os níveis são atualizados juntos a cada lote,
+    então uma consulta lê apenas os pontos da janela pedida, no nível mais grosso que
+    ainda respeita o passo pedido, sem percorrer os pacotes. Intervalos mais antigos
+    que a retenção do nível são descartados, medida a partir do segundo mais recente
+    já registrado (assim, capturas antigas reproduzidas também são agregadas).
+
+    Attributes:
+        tiers (tuple): Pares (resolução, retenção) dos níveis, em segundos.
+        buckets (list): Para cada nível, {início do intervalo: {chave: [packets, bytes]}}.
+        newest (int): Segundo mais recente já registrado.
+    """
+
+    def __init__(self, tiers=ROLLUP_TIERS):
+        self.tiers = tiers
+        self.buckets = [{} for _ in tiers]
+        self.newest = 0
+        self._pruned = [0] * len(tiers)
+
+    def update(self, counts):
+        """
+        Soma contadores por segundo (ver rollup_counts) a todos os níveis.
+
+        Args:
+            counts (dict): {(second, direction, protocol, action, rule_id): [packets, bytes]}.
+        """
+        if not counts:
+            return
+        self.newest = max(self.newest, max(key[0] for key in counts))
+        for tier, (resolution, retention) in enumerate(self.tiers):
+            buckets = self.buckets[tier]
+            cutoff = self.newest - retention
+            for (second, *key), (packets, size) in counts.items():
+                if second < cutoff:
+                    continue
+                key = tuple(key)
+                bucket = buckets.setdefault(second - second % resolution, {})
+                entry = bucket.get(key)
+                if entry is None:
+                    bucket[key] = [packets, size]
+                else:
+                    entry[0] += packets
+                    entry[1] += size
+            self._prune(tier, cutoff)
+
+    def _prune(self, tier, cutoff):
+        """
+        Descarta os intervalos de um nível que saíram da retenção.
+        """
+        resolution = self.tiers[tier][0]
+        if cutoff - self._pruned[tier] < resolution:
+            return  # Nenhum intervalo inteiro saiu da retenção desde a última limpeza
+        buckets = self.buckets[tier]
+        for start in [start for start in buckets if start + resolution <= cutoff]:
+            del buckets[start]
+        self._pruned[tier] = cutoff
+
+    def drain(self):
+        """
+        Retira todos os contadores, deixando as séries vazias.
+
+        Usado pelos processos de captura para enviar as séries ao processo principal.
+
+        Returns:
+            tuple: Um par (newest, buckets), com os intervalos de cada nível, pronto para merge.
+        """
+        buckets = self.buckets
+        self.buckets = [{} for _ in self.tiers]
+        return self.newest, buckets
+
+    def merge(self, newest, buckets, rule_mapping=None):
+        """
+        Soma as séries retiradas de outro TrafficRollup (ver drain), com os mesmos níveis.
+
+        Args:
+            newest (int): Segundo mais recente registrado pelo outro TrafficRollup.
+            buckets (list): Intervalos de cada nível.
+            rule_mapping (list): Tradução dos índices de regra do outro log para os deste
+                                 (o índice -1 usa a última posição). Se None, mantém os índices.
+        """
+        self.newest = max(self.newest, newest)
+        for tier, (resolution, retention) in enumerate(self.tiers):
+            cutoff = self.newest - retention
+            target = self.buckets[tier]
+            for start, counters in buckets[tier].items():
+                if start + resolution <= cutoff:
+                    continue
+                bucket = target.setdefault(start, {})
+                for key, (packets, size) in counters.items():
+                    if rule_mapping is not None:
+                        key = key[:3] + (rule_mapping[key[3]],)
+                    entry = bucket.get(key)
+                    if entry is None:
+                        bucket[key] = [packets, size]
+                    else:
+                        entry[0] += packets
+                        entry[1] += size
+            self._prune(tier, cutoff)
+
+    def clear(self):
+        """
+        Descarta todos os contadores.
+        """
+        self.buckets = [{} for _ in self.tiers]
+        self.newest = 0
+        self._pruned = [0] * len(self.tiers)
+
+    def _tier(self, start, step):
+        """
+        Escolhe o nível de uma consulta: o mais grosso cuja resolução divide o passo e
+        cuja retenção cobre o início; sem nenhum assim, o mais fino que cobre o início.
+        """
+        covering = [tier for tier, (_, retention) in enumerate(self.tiers)
+                    if start is None or start >= self.newest - retention]
+        if not covering:
+            return len(self.tiers) - 1
+        dividing = [tier for tier in covering if step is None or step % self.tiers[tier][0] == 0]
+        return dividing[-1] if dividing else covering[0]
+
+    def _select(self, tier, start, end, where):
+        """
+        Percorre os contadores de um nível dentro da janela que atendem aos filtros.
+
+        Yields:
+            tuple: (início do intervalo, chave, packets, bytes).
+        """
+        resolution = self.tiers[tier][0]
+        positions = [(ROLLUP_KEY_FIELDS.index(field), value) for field, value in (where or {}).items()]
+        for bucket_start, counters in self.buckets[tier].items():
+            # Inclui os intervalos que cruzam as bordas da janela
+            if start is not None and bucket_start + resolution <= start:
+                continue
+            if end is not None and bucket_start > end:
+                continue
+            for key, (packets, size) in counters.items():
+                if all(key[position] == value for position, value in positions):
+                    yield bucket_start, key, packets, size
+
+    def series(self, start, end=None, step=1, where=None):
+        """
+        Retorna a série de pacotes e bytes de uma janela, agrupada em intervalos de step segundos.
+
+        Args:
+            start (float): Início da janela (segundos desde a época Unix).
+            end (float): Fim da janela. Se None, vai até o intervalo mais recente.
+            step (int): Tamanho de cada ponto, em segundos. Se for menor que a resolução do
+                        nível disponível para a janela, os pontos ficam com essa resolução.
+            where (dict): Filtros por campo da chave (ex.: {"action": 1}).
+
+        Returns:
+            list: Tuplas (início do intervalo, packets, bytes), em ordem de tempo.
+        """
+        tier = self._tier(start, step)
+        step = max(step, self.tiers[tier][0])
+        points = {}
+        for bucket_start, _, packets, size in self._select(tier, start, end, where):
+            point = points.setdefault(bucket_start - bucket_start % step, [0, 0])
+            point[0] += packets
+            point[1] += size
+        return [(point_start, packets, size) for point_start, (packets, size) in sorted(points.items())]
+
+    def totals(self, field, start=None, end=None, where=None):
+        """
+        Retorna os totais de pacotes e bytes de uma janela, agrupados por um campo da chave.
+
+        Args:
+            field (str): Campo de agrupamento (ver ROLLUP_KEY_FIELDS).
+            start (float): Início da janela. Se None, usa toda a retenção do nível mais grosso.
+            end (float): Fim da janela. Se None, vai até o intervalo mais recente.
+            where (dict): Filtros por campo da chave.
+
+        Returns:
+            dict: {valor do campo: [packets, bytes]}.
+        """
+        position = ROLLUP_KEY_FIELDS.index(field)
+        tier = self._tier(start, None)
+        totals = {}
+        for _, key, packets, size in self._select(tier, start, end, where):
+            total = totals.setdefault(key[position], [0, 0])
+            total[0] += packets
+            total[1] += size
+        return totals
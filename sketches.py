@@ -0,0 +1,820 @@
+# Importa math para dimensionar os sketches a partir dos limites de erro
+import math
+
+# Importa itemgetter para ler as colunas das linhas de log em C
+from operator import itemgetter
+
+# Importa NumPy para os resumos, as tabelas do Count-Min e a contagem vetorizada dos lotes
+import numpy as np
+
+# Importa as posições das colunas nas linhas de log, usadas para contar um lote
+from logstore import LOG_COLUMN_NAMES, ACTION_CODES
+
+#############################
+# CONFIGURAÇÃO DOS SKETCHES
+#############################
+
+# Dimensões acompanhadas: IPs de origem, IPs de destino, portas de destino e origens bloqueadas
+HEAVY_HITTER_DIMENSIONS = ("src_ip", "dst_ip", "dst_port", "blocked_src")
+
+# Erro máximo das contagens, como fração dos pacotes da janela (Space-Saving e Count-Min)
+HEAVY_HITTER_EPSILON = 0.005
+
+# Probabilidade de uma estimativa do Count-Min passar do erro máximo
+HEAVY_HITTER_DELTA = 0.01
+
+# Níveis das janelas: (duração de cada intervalo, quantidade de intervalos), em segundos.
+# Cada nível guarda um par de sketches por intervalo; a janela consultada junta os
+# intervalos que a cobrem, no nível mais fino que alcança toda a janela
+HEAVY_HITTER_TIERS = (
+    (10, 31),  # intervalos de 10 s, cobrindo 5 minutos
+    (60, 61),  # intervalos de 1 min, cobrindo 1 hora
+)
+
+# Janelas oferecidas ao dashboard, em segundos
+HEAVY_HITTER_WINDOWS = {
+    "Último minuto": 60,
+    "Últimos 5 minutos": 300,
+    "Última hora": 3600,
+}
+
+# Lotes acumulados antes de serem somados aos sketches; somar vários lotes de uma vez
+# divide o custo das operações do NumPy, e as consultas somam antes os lotes pendentes
+HEAVY_HITTER_FOLD_BATCHES = 32
+
+# Semente dos hashes do Count-Min; é a mesma em todos os processos para que as tabelas possam ser somadas
+COUNT_MIN_SEED = 0x5EED
+
+# Dimensões com contagem de valores distintos: IPs de origem, IPs de destino e portas de destino
+DISTINCT_DIMENSIONS = ("src_ip", "dst_ip", "dst_port")
+
+# Precisão dos HyperLogLog: 2**12 registradores de 1 byte (4 KB), com erro padrão de 1,04 / 64 (1,6%)
+DISTINCT_PRECISION = 12
+
+# Duração de cada intervalo das contagens de distintos, em segundos
+DISTINCT_BUCKET_SECONDS = 60
+
+# Tempo, em segundos, pelo qual os intervalos são guardados (medido a partir do mais recente)
+DISTINCT_RETENTION = 3600
+
+# Posições dos campos usados na contagem dentro das linhas de log (ver logstore.LOG_COLUMNS)
+_TIMESTAMP = itemgetter(LOG_COLUMN_NAMES.index("timestamp"))
+_SRC_IP = itemgetter(LOG_COLUMN_NAMES.index("src_ip"))
+_DST_IP = itemgetter(LOG_COLUMN_NAMES.index("dst_ip"))
+_DST_PORT = itemgetter(LOG_COLUMN_NAMES.index("dst_port"))
+_ACTION = itemgetter(LOG_COLUMN_NAMES.index("action"))
+_DIRECTION = itemgetter(LOG_COLUMN_NAMES.index("direction"))
+
+# Código da ação das origens bloqueadas
+_BLOCKED = ACTION_CODES["blocked"]
+
+#############################
+# CONTAGEM DOS LOTES
+#############################
+
+def _count(values):
+    """
+    Conta as ocorrências de cada valor de um array.
+
+    Returns:
+        tuple: Um par (valores distintos, contagens), como arrays.
+    """
+    return np.unique(values, return_counts=True)
+
+def batch_columns(rows):
+    """
+    Lê as colunas usadas pelos sketches de um lote de pacotes para arrays.
+
+    Feita uma vez por lote, fora do log_lock; o resultado é usado por
+    heavy_hitter_counts e distinct_counts, que contam em NumPy, sem laço em Python
+    por pacote.
+
+    Args:
+        rows (list): Linhas de log dos pacotes, na ordem de logstore.LOG_COLUMN_NAMES.
+
+    Returns:
+        dict: {coluna: ndarray} (IPs e portas como uint64), ou None se o lote estiver vazio.
+    """
+    if not rows:
+        return None
+    count = len(rows)
+    return {
+        "timestamp": np.fromiter(map(_TIMESTAMP, rows), dtype=np.float64, count=count),
+        "src_ip": np.fromiter(map(_SRC_IP, rows), dtype=np.uint64, count=count),
+        "dst_ip": np.fromiter(map(_DST_IP, rows), dtype=np.uint64, count=count),
+        "dst_port": np.fromiter(map(_DST_PORT, rows), dtype=np.uint64, count=count),
+        "action": np.fromiter(map(_ACTION, rows), dtype=np.uint8, count=count),
+        "direction": np.fromiter(map(_DIRECTION, rows), dtype=np.uint8, count=count),
+    }
+
+def heavy_hitter_counts(columns, slot_seconds=HEAVY_HITTER_TIERS[0][0]):
+    """
+    Conta os valores de cada dimensão de um lote de pacotes, por intervalo de tempo.
+
+    Feita fora do log_lock pela thread de captura; o resultado é somado aos sketches
+    compartilhados por HeavyHitters.update.
+
+    Args:
+        columns (dict): Colunas do lote (ver batch_columns), ou None.
+        slot_seconds (int): Duração do intervalo mais fino dos sketches.
+
+    Returns:
+        dict: {início do intervalo: {dimensão: (valores, contagens)}}.
+    """
+    if columns is None:
+        return {}
+    slots = (columns["timestamp"] // slot_seconds).astype(np.int64)
+    src, dst, ports = columns["src_ip"], columns["dst_ip"], columns["dst_port"]
+    blocked = columns["action"] == _BLOCKED
+
+    counts = {}
+    # Um lote normalmente cabe em um único intervalo e é contado sem máscaras
+    first, last = int(slots.min()), int(slots.max())
+    for slot in ([first] if first == last else np.unique(slots).tolist()):
+        mask = slice(None) if first == last else slots == slot
+        slot_ports = ports[mask]
+        counts[slot * slot_seconds] = {
+            "src_ip": _count(src[mask]),
+            "dst_ip": _count(dst[mask]),
+            "dst_port": _count(slot_ports[slot_ports != 0]),  # Porta 0: protocolo sem portas
+            "blocked_src": _count(src[mask][blocked[mask]]),
+        }
+    return counts
+
+#############################
+# SPACE-SAVING
+#############################
+
+class SpaceSaving:
+    """
+    Resumo Space-Saving dos valores mais frequentes de um fluxo, com memória fixa.
+
+    Mantém no máximo capacity contadores, cada um com uma contagem e um erro máximo.
+    Um valor ausente do resumo cheio pode ter ocorrido até a menor contagem do resumo
+    (floor) vezes, então entra com essa contagem como erro; ao passar da capacidade,
+    ficam os maiores contadores. Assim, cada contagem passa do valor real em no máximo
+    total / capacity, e todo valor com frequência maior que isso está no resumo.
+
+    Os lotes são somados de uma vez (a contagem exata de um lote é um resumo sem erro),
+    e dois resumos podem ser somados da mesma forma (merge), como os de vários processos
+    ou de vários intervalos de uma janela.
+
+    Attributes:
+        capacity (int): Quantidade máxima de contadores.
+        keys (ndarray): Valores acompanhados.
+        counts (ndarray): Contagem (limite superior) de cada valor.
+        errors (ndarray): Erro máximo de cada contagem.
+        total (int): Total de ocorrências registradas.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.errors = np.empty(0, dtype=np.int64)
+        self.total = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def floor(self):
+        """
+        Retorna a maior contagem possível de um valor fora do resumo (0 se ainda há espaço).
+        """
+        if len(self.keys) < self.capacity:
+            return 0
+        return int(self.counts.min())
+
+    def _absorb(self, keys, counts, errors, floor):
+        """
+        Soma contadores de outro resumo (valores distintos) cujo floor é floor.
+        """
+        mine = self.floor()
+        size = len(self.keys)
+        unique, inverse = np.unique(np.concatenate((self.keys, keys)), return_inverse=True)
+        length = len(unique)
+        combined = np.bincount(inverse, weights=np.concatenate((self.counts, counts)), minlength=length)
+        combined_errors = np.bincount(inverse, weights=np.concatenate((self.errors, errors)), minlength=length)
+        # Cada valor ausente de um dos lados recebe o floor daquele lado, como contagem e como erro
+        if mine:
+            missing = np.bincount(inverse[:size], minlength=length) == 0
+            combined[missing] += mine
+            combined_errors[missing] += mine
+        if floor:
+            missing = np.bincount(inverse[size:], minlength=length) == 0
+            combined[missing] += floor
+            combined_errors[missing] += floor
+        if length > self.capacity:
+            kept = np.argpartition(combined, length - self.capacity)[length - self.capacity:]
+            unique, combined, combined_errors = unique[kept], combined[kept], combined_errors[kept]
+        self.keys = unique
+        self.counts = combined.astype(np.int64)
+        self.errors = combined_errors.astype(np.int64)
+
+    def update(self, keys, counts):
+        """
+        Registra as contagens exatas de vários valores distintos (ex.: de um lote).
+
+        Args:
+            keys (ndarray): Valores distintos.
+            counts (ndarray): Contagem de cada valor.
+        """
+        if not len(keys):
+            return
+        self._absorb(np.asarray(keys, dtype=np.uint64), counts, np.zeros(len(keys), dtype=np.int64), 0)
+        self.total += int(counts.sum())
+
+    def merge(self, other):
+        """
+        Soma outro resumo a este, mantendo os capacity maiores contadores.
+
+        Args:
+            other (SpaceSaving): Resumo com a mesma capacidade.
+        """
+        if not len(other):
+            return
+        self._absorb(other.keys, other.counts, other.errors, other.floor())
+        self.total += other.total
+
+    def top(self, k):
+        """
+        Retorna os k valores de maior contagem.
+
+        Returns:
+            list: Tuplas (valor, contagem, erro), da maior para a menor contagem.
+        """
+        order = np.argsort(-self.counts, kind="stable")[:k]
+        return list(zip(self.keys[order].tolist(), self.counts[order].tolist(), self.errors[order].tolist()))
+
+#############################
+# COUNT-MIN
+#############################
+
+class CountMinSketch:
+    """
+    Sketch Count-Min: estima a contagem de qualquer valor inteiro com memória fixa.
+
+    Cada valor soma a sua contagem em uma posição de cada linha da tabela (hash
+    multiplicativo de 64 bits); a estimativa é o mínimo entre as linhas. Ela nunca
+    é menor que a contagem real e, com probabilidade 1 - delta, passa dela em no
+    máximo epsilon * total. Tabelas com as mesmas dimensões são somadas no merge.
+
+    Attributes:
+        width (int): Posições por linha (potência de 2, pelo menos e / epsilon).
+        depth (int): Quantidade de linhas (ln(1 / delta), arredondado para cima).
+        table (ndarray): Contagens, com forma (depth, width).
+        total (int): Total de ocorrências registradas.
+    """
+
+    def __init__(self, epsilon=HEAVY_HITTER_EPSILON, delta=HEAVY_HITTER_DELTA):
+        """
+        Args:
+            epsilon (float): Erro máximo, como fração do total.
+            delta (float): Probabilidade de passar do erro máximo.
+
+        Raises:
+            ValueError: Se epsilon ou delta não estiverem entre 0 e 1.
+        """
+        if not 0 < epsilon < 1 or not 0 < delta < 1:
+            raise ValueError(f"limites de erro inválidos: epsilon {epsilon}, delta {delta}")
+        self._bits = max(1, math.ceil(math.log2(math.e / epsilon)))
+        self.width = 1 << self._bits
+        self.depth = max(1, math.ceil(math.log(1 / delta)))
+        rng = np.random.default_rng(COUNT_MIN_SEED)
+        # Multiplicadores ímpares do hash multiplicativo (a * x mod 2**64) >> (64 - bits)
+        self._multipliers = (rng.integers(1, 1 << 62, size=(self.depth, 1), dtype=np.uint64) << np.uint64(1)) | np.uint64(1)
+        # Contagens de 32 bits: um intervalo de 1 min precisaria de mais de 35 milhões de pacotes/s para transbordar
+        self.table = np.zeros((self.depth, self.width), dtype=np.int32)
+        self.total = 0
+        # Início de cada linha na tabela achatada
+        self._offsets = np.arange(self.depth, dtype=np.intp)[:, None] * self.width
+
+    def _positions(self, keys):
+        """
+        Retorna a posição de cada valor em cada linha, com forma (depth, len(keys)).
+        """
+        return ((self._multipliers * keys) >> np.uint64(64 - self._bits)).astype(np.intp)
+
+    def update(self, keys, counts):
+        """
+        Registra as contagens de vários valores de uma vez.
+
+        Args:
+            keys (ndarray): Valores (inteiros não negativos, convertidos para uint64).
+            counts (ndarray): Contagem de cada valor.
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        counts = np.asarray(counts, dtype=np.int64)
+        # Soma todas as linhas com uma única contagem sobre a tabela achatada
+        positions = self._positions(keys) + self._offsets
+        added = np.bincount(positions.ravel(), weights=np.tile(counts, self.depth), minlength=self.table.size)
+        self.table += added.reshape(self.table.shape).astype(np.int32)
+        self.total += int(counts.sum())
+
+    def estimate(self, keys):
+        """
+        Estima a contagem de vários valores.
+
+        Returns:
+            ndarray: A estimativa (limite superior) de cada valor.
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        positions = self._positions(keys)
+        return self.table[np.arange(self.depth)[:, None], positions].min(axis=0)
+
+    def merge(self, other):
+        """
+        Soma outro sketch com as mesmas dimensões a este.
+        """
+        self.table += other.table
+        self.total += other.total
+
+#############################
+# JANELAS DESLIZANTES
+#############################
+
+class SketchWindow:
+    """
+    Anel de intervalos de tempo, cada um com um resumo Space-Saving e um Count-Min.
+
+    Um intervalo é reaproveitado (zerado) quando o anel dá a volta; consultar uma
+    janela junta os resumos dos intervalos que a cobrem e refina a contagem de cada
+    candidato com a soma das estimativas do Count-Min, que é mais justa.
+
+    Attributes:
+        slot_seconds (int): Duração de cada intervalo.
+        starts (list): Início de cada intervalo do anel (None se ainda não usado).
+        summaries (list): Resumo Space-Saving de cada intervalo.
+        sketches (list): Count-Min de cada intervalo.
+        touched (set): Intervalos alterados desde o último drain.
+    """
+
+    def __init__(self, slot_seconds, slots, epsilon=HEAVY_HITTER_EPSILON, delta=HEAVY_HITTER_DELTA):
+        self.slot_seconds = slot_seconds
+        self.epsilon = epsilon
+        self.delta = delta
+        self.starts = [None] * slots
+        self.summaries = [SpaceSaving(math.ceil(1 / epsilon)) for _ in range(slots)]
+        self.sketches = [CountMinSketch(epsilon, delta) for _ in range(slots)]
+        self.touched = set()
+
+    def _slot(self, start):
+        """
+        Retorna a posição do anel de um intervalo, zerando-a se ela guardava um intervalo
+        mais antigo, ou None se o intervalo já saiu do anel.
+        """
+        index = (start // self.slot_seconds) % len(self.starts)
+        current = self.starts[index]
+        if current != start:
+            if current is not None and current > start:
+                return None
+            self.starts[index] = start
+            self.summaries[index] = SpaceSaving(self.summaries[index].capacity)
+            self.sketches[index].table.fill(0)
+            self.sketches[index].total = 0
+        return index
+
+    def update(self, start, keys, counts):
+        """
+        Soma as contagens exatas de um intervalo.
+
+        Args:
+            start (int): Início do intervalo (múltiplo de slot_seconds).
+            keys (ndarray): Valores distintos.
+            counts (ndarray): Contagem de cada valor.
+        """
+        if not len(keys):
+            return
+        index = self._slot(start)
+        if index is None:
+            return
+        self.summaries[index].update(keys, counts)
+        self.sketches[index].update(keys, counts)
+        self.touched.add(index)
+
+    def drain(self):
+        """
+        Retira os intervalos alterados desde a última chamada, deixando-os vazios.
+
+        Returns:
+            list: Tuplas (início, resumo, sketch), prontas para merge.
+        """
+        drained = []
+        for index in self.touched:
+            drained.append((self.starts[index], self.summaries[index], self.sketches[index]))
+            self.summaries[index] = SpaceSaving(self.summaries[index].capacity)
+            self.sketches[index] = CountMinSketch(self.epsilon, self.delta)
+        self.touched = set()
+        return drained
+
+    def merge(self, drained):
+        """
+        Soma intervalos retirados de outra janela com a mesma configuração (ver drain).
+        """
+        for start, summary, sketch in drained:
+            index = self._slot(start)
+            if index is None:
+                continue
+            self.summaries[index].merge(summary)
+            self.sketches[index].merge(sketch)
+            self.touched.add(index)
+
+    def top(self, start, end, k):
+        """
+        Retorna os k valores mais frequentes dos intervalos que cruzam [start, end].
+
+        Returns:
+            tuple: Um par (top, total), com as tuplas (valor, contagem, mínimo garantido)
+                   da maior para a menor contagem e o total de ocorrências da janela.
+        """
+        merged = None
+        sketches = []
+        for index, slot_start in enumerate(self.starts):
+            if slot_start is None or slot_start + self.slot_seconds <= start or slot_start > end:
+                continue
+            summary = self.summaries[index]
+            if merged is None:
+                merged = SpaceSaving(summary.capacity)
+            merged.merge(summary)
+            sketches.append(self.sketches[index])
+        if merged is None or not len(merged):
+            return [], 0
+        estimates = sum(sketch.estimate(merged.keys) for sketch in sketches)
+        # As duas contagens passam do valor real; a menor delas é a mais precisa
+        refined = np.minimum(merged.counts, estimates)
+        order = np.argsort(-refined, kind="stable")[:k]
+        ranked = zip(merged.keys[order].tolist(), refined[order].tolist(),
+                     (merged.counts - merged.errors)[order].tolist())
+        return list(ranked), merged.total
+
+class HeavyHitters:
+    """
+    Maiores emissores e destinos do tráfego (ver HEAVY_HITTER_DIMENSIONS), em janelas
+    deslizantes, com memória fixa e erro limitado (ver HEAVY_HITTER_EPSILON).
+
+    Cada dimensão tem uma SketchWindow por nível de HEAVY_HITTER_TIERS. As contagens
+    dos lotes ficam pendentes até HEAVY_HITTER_FOLD_BATCHES lotes (ou até a próxima
+    consulta) e são somadas aos sketches de uma vez. O relógio é o timestamp dos
+    pacotes, então capturas reproduzidas também são contadas.
+
+    Attributes:
+        windows (dict): {dimensão: [SketchWindow de cada nível]}.
+        pending (list): Contagens dos lotes ainda não somados (ver heavy_hitter_counts).
+        newest (int): Início do intervalo mais recente já registrado.
+    """
+
+    def __init__(self, epsilon=HEAVY_HITTER_EPSILON, delta=HEAVY_HITTER_DELTA, tiers=HEAVY_HITTER_TIERS):
+        self.epsilon = epsilon
+        self.delta = delta
+        self.tiers = tiers
+        self.windows = {
+            dimension: [SketchWindow(slot_seconds, slots, epsilon, delta) for slot_seconds, slots in tiers]
+            for dimension in HEAVY_HITTER_DIMENSIONS
+        }
+        self.pending = []
+        self.newest = 0
+
+    def update(self, counts):
+        """
+        Registra as contagens de um lote (ver heavy_hitter_counts).
+        """
+        if not counts:
+            return
+        self.newest = max(self.newest, max(counts))
+        self.pending.append(counts)
+        if len(self.pending) >= HEAVY_HITTER_FOLD_BATCHES:
+            self.fold()
+
+    def fold(self):
+        """
+        Soma as contagens pendentes a todos os níveis, juntando antes os lotes de cada intervalo.
+        """
+        slots = {}
+        for counts in self.pending:
+            for start, dimensions in counts.items():
+                slot = slots.setdefault(start, {dimension: [] for dimension in dimensions})
+                for dimension, pair in dimensions.items():
+                    slot[dimension].append(pair)
+        self.pending = []
+        for start, dimensions in slots.items():
+            for dimension, pairs in dimensions.items():
+                if len(pairs) == 1:
+                    keys, values = pairs[0]
+                else:
+                    keys, inverse = np.unique(np.concatenate([keys for keys, _ in pairs]), return_inverse=True)
+                    values = np.bincount(inverse, weights=np.concatenate([values for _, values in pairs]),
+                                         minlength=len(keys)).astype(np.int64)
+                for window in self.windows[dimension]:
+                    window.update(start - start % window.slot_seconds, keys, values)
+
+    def drain(self):
+        """
+        Retira os intervalos alterados desde a última chamada (usado pelos processos de captura).
+
+        Returns:
+            tuple: Um par (newest, windows), com os intervalos retirados de cada janela, pronto para merge.
+        """
+        self.fold()
+        return self.newest, {dimension: [window.drain() for window in windows]
+                             for dimension, windows in self.windows.items()}
+
+    def merge(self, newest, drained):
+        """
+        Soma os intervalos retirados de outro HeavyHitters com a mesma configuração.
+        """
+        self.fold()
+        self.newest = max(self.newest, newest)
+        for dimension, windows in drained.items():
+            for window, slots in zip(self.windows[dimension], windows):
+                window.merge(slots)
+
+    def clear(self):
+        """
+        Descarta todas as contagens.
+        """
+        self.__init__(self.epsilon, self.delta, self.tiers)  # Recria as janelas vazias
+
+    def top(self, dimension, window_seconds, k=5, now=None):
+        """
+        Retorna os k valores mais frequentes de uma dimensão na janela mais recente.
+
+        A janela é arredondada para os intervalos do nível usado (o nível mais fino que
+        cobre toda a janela), então pode incluir até um intervalo a mais.
+
+        Args:
+            dimension (str): Dimensão (ver HEAVY_HITTER_DIMENSIONS).
+            window_seconds (int): Tamanho da janela, em segundos.
+            k (int): Quantidade de valores.
+            now (float): Fim da janela. Se None, usa o intervalo mais recente registrado.
+
+        Returns:
+            tuple: Um par (top, total), com as tuplas (valor, contagem, mínimo garantido)
+                   da maior para a menor contagem e o total de ocorrências da janela.
+        """
+        # Soma os lotes pendentes, então a consulta também precisa do log_lock
+        self.fold()
+        if now is None:
+            now = self.newest + self.tiers[0][0]
+        windows = self.windows[dimension]
+        chosen = windows[-1]
+        for window, (slot_seconds, slots) in zip(windows, self.tiers):
+            if (slots - 1) * slot_seconds >= window_seconds:
+                chosen = window
+                break
+        return chosen.top(now - window_seconds, now, k)
+
+#############################
+# HYPERLOGLOG
+#############################
+
+def _hash64(values):
+    """
+    Embaralha valores inteiros em hashes de 64 bits (finalizador do SplitMix64).
+    """
+    z = np.asarray(values, dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+def _ranks(values, precision):
+    """
+    Converte valores inteiros no registrador e na posição do primeiro bit 1 de cada hash.
+
+    Returns:
+        tuple: Um par (registradores, posições), como arrays.
+    """
+    hashes = _hash64(values)
+    bits = 64 - precision
+    index = (hashes >> np.uint64(bits)).astype(np.intp)
+    rest = hashes & np.uint64((1 << bits) - 1)
+    # Posição do primeiro bit 1 do restante: 1 para o bit mais alto e bits + 1 se não houver.
+    # O expoente do float64 dá essa posição (frexp(0) dá 0); o restante tem no máximo 60 bits,
+    # e a conversão só erra a poucos ulps de uma potência de 2
+    _, exponent = np.frexp(rest.astype(np.float64))
+    rank = bits + 1 - exponent
+    return index, rank.astype(np.uint8)
+
+class HyperLogLog:
+    """
+    Contador HyperLogLog: estima quantos valores distintos foram vistos, com memória fixa.
+
+    Cada valor é levado por um hash de 64 bits a um dos 2**precision registradores,
+    que guarda a maior posição do primeiro bit 1 do restante do hash. O erro padrão
+    da estimativa é 1,04 / sqrt(2**precision). Dois contadores com a mesma precisão
+    são somados (união dos conjuntos) pelo máximo de cada registrador, então os
+    contadores de vários intervalos ou processos podem ser juntados sem perda.
+
+    Attributes:
+        precision (int): Bits do hash usados para escolher o registrador.
+        registers (ndarray): Registradores (uint8).
+    """
+
+    def __init__(self, precision=DISTINCT_PRECISION, registers=None):
+        """
+        Args:
+            precision (int): Bits do hash usados para escolher o registrador (4 a 16).
+            registers (ndarray): Registradores já preenchidos (ex.: por distinct_counts). Se None, zerados.
+
+        Raises:
+            ValueError: Se a precisão estiver fora do intervalo aceito.
+        """
+        if not 4 <= precision <= 16:
+            raise ValueError(f"precisão do HyperLogLog inválida: {precision}")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8) if registers is None else registers
+
+    def update(self, values):
+        """
+        Registra vários valores inteiros (não negativos) de uma vez.
+        """
+        if len(values):
+            self.add_ranks(*_ranks(values, self.precision))
+
+    def add_ranks(self, index, rank):
+        """
+        Registra valores já convertidos em registradores e posições (ver _ranks).
+        """
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        """
+        Soma (une) outro contador com a mesma precisão a este.
+        """
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        """
+        Estima a quantidade de valores distintos registrados.
+
+        Returns:
+            int: Estimativa, com correção por contagem linear para conjuntos pequenos.
+        """
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / float(np.ldexp(1.0, -self.registers.astype(np.int32)).sum())
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return round(m * np.log(m / zeros))
+        return round(raw)
+
+def distinct_counts(columns, bucket_seconds=DISTINCT_BUCKET_SECONDS, precision=DISTINCT_PRECISION):
+    """
+    Monta contadores HyperLogLog de um lote de pacotes, por intervalo, dimensão e direção.
+
+    Feita fora do log_lock pela thread de captura; sob o lock, DistinctCounters.update
+    só soma os registradores (um máximo de 4 KB por contador).
+
+    Args:
+        columns (dict): Colunas do lote (ver batch_columns), ou None.
+        bucket_seconds (int): Duração de cada intervalo.
+        precision (int): Precisão dos contadores.
+
+    Returns:
+        dict: {(início do intervalo, dimensão, código da direção): HyperLogLog}.
+    """
+    if columns is None:
+        return {}
+    buckets = (columns["timestamp"] // bucket_seconds).astype(np.int64)
+    directions = columns["direction"]
+    # Chave de cada linha: intervalo e direção juntos (a direção ocupa o byte mais baixo)
+    groups, inverse = np.unique(buckets * 256 + directions, return_inverse=True)
+    size = 1 << precision
+    counters = {}
+    for dimension in DISTINCT_DIMENSIONS:
+        values, rows = columns[dimension], inverse
+        if dimension == "dst_port":
+            ported = values != 0  # Porta 0: protocolo sem portas
+            values, rows = values[ported], rows[ported]
+        # Preenche os registradores de todos os grupos do lote com uma única operação,
+        # cada grupo em uma linha da matriz
+        index, rank = _ranks(values, precision)
+        registers = np.zeros((len(groups), size), dtype=np.uint8)
+        np.maximum.at(registers.reshape(-1), rows * size + index, rank)
+        for position in np.unique(rows).tolist():
+            bucket, direction = divmod(int(groups[position]), 256)
+            counters[bucket * bucket_seconds, dimension, direction] = HyperLogLog(precision, registers[position])
+    return counters
+
+class DistinctCounters:
+    """
+    Contagens de IPs de origem, IPs de destino e portas de destino distintos (ver
+    DISTINCT_DIMENSIONS), por intervalo de tempo e direção, com um HyperLogLog cada.
+
+    Os intervalos mais antigos que a retenção são descartados, medida a partir do
+    intervalo mais recente já registrado (como em rollup.TrafficRollup). Uma consulta
+    une os contadores dos intervalos e direções pedidos, então o total de uma janela
+    não conta duas vezes um valor visto em vários intervalos.
+
+    Attributes:
+        buckets (dict): {início do intervalo: {(dimensão, código da direção): HyperLogLog}}.
+        newest (int): Início do intervalo mais recente já registrado.
+    """
+
+    def __init__(self, bucket_seconds=DISTINCT_BUCKET_SECONDS, retention=DISTINCT_RETENTION,
+                 precision=DISTINCT_PRECISION):
+        self.bucket_seconds = bucket_seconds
+        self.retention = retention
+        self.precision = precision
+        self.buckets = {}
+        self.newest = 0
+
+    def update(self, counters):
+        """
+        Soma contadores de um lote (ver distinct_counts).
+
+        Args:
+            counters (dict): {(início do intervalo, dimensão, código da direção): HyperLogLog}.
+        """
+        if not counters:
+            return
+        self.newest = max(self.newest, max(key[0] for key in counters))
+        cutoff = self.newest - self.retention
+        for (start, dimension, direction), counter in counters.items():
+            if start < cutoff:
+                continue
+            bucket = self.buckets.setdefault(start, {})
+            current = bucket.get((dimension, direction))
+            if current is None:
+                bucket[dimension, direction] = counter
+            else:
+                current.merge(counter)
+        self._prune(cutoff)
+
+    def _prune(self, cutoff):
+        """
+        Descarta os intervalos que saíram da retenção.
+        """
+        for start in [start for start in self.buckets if start < cutoff]:
+            del self.buckets[start]
+
+    def drain(self):
+        """
+        Retira todos os contadores (usado pelos processos de captura).
+
+        Returns:
+            tuple: Um par (newest, buckets), pronto para merge.
+        """
+        buckets = self.buckets
+        self.buckets = {}
+        return self.newest, buckets
+
+    def merge(self, newest, buckets):
+        """
+        Soma os contadores retirados de outro DistinctCounters (ver drain), com a mesma configuração.
+        """
+        self.newest = max(self.newest, newest)
+        self.update({(start, dimension, direction): counter
+                     for start, counters in buckets.items()
+                     for (dimension, direction), counter in counters.items()})
+
+    def clear(self):
+        """
+        Descarta todos os contadores.
+        """
+        self.buckets = {}
+        self.newest = 0
+
+    def _union(self, dimension, counters, direction):
+        """
+        Une os contadores de uma dimensão em um intervalo (todas as direções se direction for None).
+        """
+        union = HyperLogLog(self.precision)
+        for (name, code), counter in counters.items():
+            if name == dimension and (direction is None or code == direction):
+                union.merge(counter)
+        return union
+
+    def distinct(self, dimension, start=None, end=None, direction=None):
+        """
+        Estima quantos valores distintos de uma dimensão apareceram em uma janela.
+
+        Args:
+            dimension (str): Dimensão (ver DISTINCT_DIMENSIONS).
+            start (float): Início da janela. Se None, usa toda a retenção.
+            end (float): Fim da janela. Se None, vai até o intervalo mais recente.
+            direction (int): Código da direção (ver logstore.DIRECTIONS). Se None, todas.
+
+        Returns:
+            int: Estimativa de valores distintos nos intervalos que cruzam a janela.
+        """
+        union = HyperLogLog(self.precision)
+        for bucket_start, counters in self.buckets.items():
+            if start is not None and bucket_start + self.bucket_seconds <= start:
+                continue
+            if end is not None and bucket_start > end:
+                continue
+            union.merge(self._union(dimension, counters, direction))
+        return union.estimate()
+
+    def series(self, dimension, start=None, end=None, direction=None):
+        """
+        Retorna a estimativa de valores distintos de cada intervalo de uma janela.
+
+        Returns:
+            list: Tuplas (início do intervalo, distintos), em ordem de tempo.
+        """
+        return [
+            (bucket_start, self._union(dimension, counters, direction).estimate())
+            for bucket_start, counters in sorted(self.buckets.items())
+            if (start is None or bucket_start + self.bucket_seconds > start) and (end is None or bucket_start <= end)
+        ]
@@ -0,0 +1,5 @@
+# Importa sys e os para que os testes encontrem os módulos do projeto (layout plano, sem pacote)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,215 @@
+# Importa ipaddress para a referência linear, independente da árvore de prefixos (cidr.py)
+import ipaddress
+
+# Importa random para gerar regras e cabeçalhos aleatórios reproduzíveis
+import random
+
+# Importa time para medir o tempo de compilação das regras
+import time
+
+# Importa pytest para parametrizar as sementes
+import pytest
+
+# Importa as camadas da Scapy para montar os pacotes passados a apply_rules
+from scapy.all import IP, TCP, UDP
+
+import regras
+from ports import parse_ports
+
+#############################
+# GERAÇÃO DE REGRAS E CABEÇALHOS
+#############################
+
+# Redes usadas nas regras e nos cabeçalhos, próximas umas das outras para que haja correspondências
+NETWORKS = ("10.0.0.0", "10.0.1.0", "10.1.0.0", "192.168.0.0", "192.168.10.0")
+
+# Portas usadas nas regras e nos cabeçalhos (inclui bordas de intervalos)
+PORTS = (0, 1, 22, 53, 80, 443, 1023, 1024, 8000, 8080, 8100, 65535)
+
+# Protocolos das regras (gre é desconhecido: a regra nunca corresponde)
+RULE_PROTOCOLS = ("tcp", "udp", "icmp", "TCP", "gre")
+
+# Protocolos dos cabeçalhos (47 = GRE, sem portas)
+HEADER_PROTOCOLS = (6, 17, 1, 47)
+
+def random_ip(generator):
+    """
+    Sorteia um endereço em uma das redes de teste, com o último octeto nas bordas ou no meio.
+    """
+    network = int(ipaddress.IPv4Address(generator.choice(NETWORKS)))
+    return network + generator.choice((0, 1, 127, 128, 255, generator.randrange(256)))
+
+def random_address_spec(generator):
+    """
+    Sorteia o critério de IP de uma regra: IP simples ou prefixo CIDR (inclusive /0 e /32).
+    """
+    address = str(ipaddress.IPv4Address(random_ip(generator)))
+    if generator.random() < 0.3:
+        return address
+    length = generator.choice((0, 8, 16, 23, 24, 25, 31, 32))
+    return str(ipaddress.IPv4Network(f"{address}/{length}", strict=False))
+
+def random_port_spec(generator):
+    """
+    Sorteia o critério de porta de uma regra: número, intervalo ou lista, em texto ou JSON.
+    """
+    low, high = sorted(generator.sample(PORTS, 2))
+    return generator.choice((
+        generator.choice(PORTS),
+        str(generator.choice(PORTS)),
+        f"{low}-{high}",
+        f"{low}:{high}",
+        f"{generator.choice(PORTS)},{low}-{high}",
+        [generator.choice(PORTS), f"{low}-{high}"],
+    ))
+
+def random_rule(generator):
+    """
+    Sorteia uma regra; cada critério pode faltar (curinga).
+    """
+    rule = {"action": "block" if generator.random() < 0.85 else "allow"}
+    if generator.random() < 0.6:
+        rule["src_ip"] = random_address_spec(generator)
+    if generator.random() < 0.5:
+        rule["dst_ip"] = random_address_spec(generator)
+    if generator.random() < 0.5:
+        rule["protocol"] = generator.choice(RULE_PROTOCOLS)
+    if generator.random() < 0.4:
+        rule["src_port"] = random_port_spec(generator)
+    if generator.random() < 0.5:
+        rule["dst_port"] = random_port_spec(generator)
+    # Regras sem nenhum critério bloqueiam tudo; ficam raras para não esconder as demais
+    if len(rule) == 1 and generator.random() < 0.9:
+        rule["dst_port"] = random_port_spec(generator)
+    return rule
+
+def random_header(generator):
+    """
+    Sorteia um cabeçalho no formato de regras.HEADER_FIELDS. As portas só existem em
+    TCP e UDP; nos demais protocolos são None.
+    """
+    protocol = generator.choice(HEADER_PROTOCOLS)
+    if protocol in (6, 17):
+        src_port, dst_port = generator.choice(PORTS), generator.choice(PORTS)
+    else:
+        src_port = dst_port = None
+    return random_ip(generator), random_ip(generator), protocol, src_port, dst_port
+
+#############################
+# REFERÊNCIA LINEAR
+#############################
+
+def reference_match(rules, header):
+    """
+    Varre as regras em ordem, como o apply_rules original, e retorna o índice da
+    primeira regra de bloqueio que corresponde ao cabeçalho, ou None.
+    """
+    src_ip, dst_ip, protocol, src_port, dst_port = header
+    for index, rule in enumerate(rules):
+        if rule.get("action") != "block":
+            continue
+        # Protocolo desconhecido: a regra nunca corresponde
+        if "protocol" in rule and (protocol is None or regras.PROTOCOL_MAP.get(rule["protocol"].lower()) != protocol):
+            continue
+        matched = True
+        for field, value in (("src_ip", src_ip), ("dst_ip", dst_ip)):
+            if field in rule and (value is None or ipaddress.IPv4Address(value) not in ipaddress.IPv4Network(rule[field], strict=False)):
+                matched = False
+        for field, value in (("src_port", src_port), ("dst_port", dst_port)):
+            if field in rule and (value is None or not any(start <= value <= end for start, end in parse_ports(rule[field]))):
+                matched = False
+        if matched:
+            return index
+    return None
+
+def build_packet(header):
+    """
+    Monta o pacote Scapy correspondente a um cabeçalho.
+    """
+    src_ip, dst_ip, protocol, src_port, dst_port = header
+    packet = IP(src=str(ipaddress.IPv4Address(src_ip)), dst=str(ipaddress.IPv4Address(dst_ip)), proto=protocol)
+    if protocol == 6:
+        packet = packet / TCP(sport=src_port, dport=dst_port)
+    elif protocol == 17:
+        packet = packet / UDP(sport=src_port, dport=dst_port)
+    return IP(bytes(packet))
+
+#############################
+# TESTES DIFERENCIAIS
+#############################
+
+@pytest.mark.parametrize("seed", range(20))
+def test_engines_match_linear_reference(seed):
+    generator = random.Random(seed)
+    rules = [random_rule(generator) for _ in range(generator.randint(1, 60))]
+    headers = [random_header(generator) for _ in range(400)]
+    expected = [reference_match(rules, header) for header in headers]
+
+    compiled = regras.compile_rules(rules)
+    matcher = regras.compile_matcher(rules, compiled)
+    assert matcher is not None
+    ruleset = regras.RuleSet(rules, engine="codegen")
+    assert ruleset.engine == "codegen"
+    # A função gerada na ordem do plano (regras sombreadas removidas e reordenação)
+    ruleset.optimize()
+
+    for header, index in zip(headers, expected):
+        assert compiled.match(header) == index, header
+        assert matcher(header) == index, header
+        assert ruleset.match(header) == index, header
+
+    src_ip, dst_ip, protocol, src_port, dst_port = (
+        [0 if value is None else value for value in column] for column in zip(*headers)
+    )
+    verdicts, rule_indices = regras.apply_rules_batch(src_ip, dst_ip, protocol, src_port, dst_port, rules)
+    assert rule_indices.tolist() == [-1 if index is None else index for index in expected]
+    assert verdicts.tolist() == [0 if index is None else 1 for index in expected]
+
+@pytest.mark.parametrize("seed", range(5))
+def test_apply_rules_matches_linear_reference(seed):
+    generator = random.Random(1000 + seed)
+    rules = [random_rule(generator) for _ in range(generator.randint(1, 40))]
+    for _ in range(100):
+        header = random_header(generator)
+        index = reference_match(rules, header)
+        action, rule = regras.apply_rules(build_packet(header), rules)
+        assert action == ("allowed" if index is None else "blocked"), header
+        assert rule is (None if index is None else rules[index]), header
+
+@pytest.mark.parametrize("seed", range(5))
+def test_missing_fields_match_no_rule_that_needs_them(seed):
+    generator = random.Random(2000 + seed)
+    rules = [random_rule(generator) for _ in range(generator.randint(1, 60))]
+    compiled = regras.compile_rules(rules)
+    matcher = regras.compile_matcher(rules, compiled)
+    for _ in range(300):
+        # Pacotes sem IP ou sem portas (ex.: fragmentos) só correspondem a regras sem esses critérios
+        header = list(random_header(generator))
+        for position in range(5):
+            if generator.random() < 0.2:
+                header[position] = None
+        header = tuple(header)
+        index = reference_match(rules, header)
+        assert compiled.match(header) == index, header
+        assert matcher(header) == index, header
+
+#############################
+# TEMPO DE COMPILAÇÃO
+#############################
+
+def test_two_port_range_rules_compile_quickly():
+    generator = random.Random(3000)
+    rules = []
+    for _ in range(1000):
+        src_low, src_high = sorted(generator.sample(range(65536), 2))
+        dst_low, dst_high = sorted(generator.sample(range(65536), 2))
+        rules.append({"action": "block", "protocol": "tcp", "src_port": f"{src_low}-{src_high}", "dst_port": f"{dst_low}-{dst_high}"})
+
+    # O produto dos segmentos das duas portas levava minutos com 1.000 regras
+    start = time.perf_counter()
+    compiled = regras.compile_rules(rules)
+    assert time.perf_counter() - start < 10
+
+    for _ in range(2000):
+        header = (0, 0, 6, generator.randrange(65536), generator.randrange(65536))
+        assert compiled.match(header) == reference_match(rules, header), header